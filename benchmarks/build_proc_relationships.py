@@ -0,0 +1,81 @@
+"""Benchmark `Pipen.build_proc_relationships()` with large pipelines
+
+Usage:
+    python benchmarks/build_proc_relationships.py [-n 1000 5000 10000]
+
+Three shapes of pipelines are built for each size:
+
+- chain: proc0 -> proc1 -> ... -> procN
+- fanout: proc0 -> (proc1, proc2, ..., procN)
+- layered: layers of 100 processes, each requiring 2 processes from the
+  previous layer, like the pipelines generated from process groups
+"""
+import argparse
+import time
+from typing import List, Tuple, Type
+
+from pipen import Pipen, Proc
+
+
+def _new_proc(name: str, requires: List[Type[Proc]] = None) -> Type[Proc]:
+    return Proc.from_proc(Proc, name=name, requires=requires)
+
+
+def chain(n: int, prefix: str) -> List[Type[Proc]]:
+    procs = [_new_proc(f"{prefix}0")]
+    for i in range(1, n):
+        procs.append(_new_proc(f"{prefix}{i}", [procs[-1]]))
+    return procs[:1]
+
+
+def fanout(n: int, prefix: str) -> List[Type[Proc]]:
+    start = _new_proc(f"{prefix}0")
+    for i in range(1, n):
+        _new_proc(f"{prefix}{i}", [start])
+    return [start]
+
+
+def layered(n: int, prefix: str, width: int = 100) -> List[Type[Proc]]:
+    width = min(width, n)
+    layer = [_new_proc(f"{prefix}0_{j}") for j in range(width)]
+    starts = layer
+    for i in range(1, n // width):
+        layer = [
+            _new_proc(
+                f"{prefix}{i}_{j}",
+                [layer[j], layer[(j + 1) % width]],
+            )
+            for j in range(width)
+        ]
+    return starts
+
+
+def bench(shape: str, n: int) -> Tuple[int, float]:
+    starts = globals()[shape](n, f"{shape}{n}_")
+    pipeline = Pipen(name=f"{shape}{n}", loglevel="warning")
+    pipeline.set_starts(starts)
+    tic = time.perf_counter()
+    pipeline.build_proc_relationships()
+    return len(pipeline.procs), time.perf_counter() - tic
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "-n",
+        type=int,
+        nargs="+",
+        default=[1000, 5000, 10000],
+        help="The numbers of processes of the pipelines",
+    )
+    args = parser.parse_args()
+
+    print(f"{'shape':<10}{'# procs':>10}{'seconds':>12}")
+    for shape in ("chain", "fanout", "layered"):
+        for n in args.n:
+            n_procs, elapsed = bench(shape, n)
+            print(f"{shape:<10}{n_procs:>10}{elapsed:>12.4f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""Provide FileDigests class that computes the content digests of files
+for content-based job caching (`cache="content"`), and caches them across
+runs so that unchanged files are not hashed again"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import mmap
+import os
+import threading
+from os import PathLike
+from pathlib import Path
+from typing import Dict, Set
+
+import rtoml
+
+from .defaults import FILE_DIGESTS_CHUNK_SIZE, FILE_DIGESTS_MAX_ENTRIES
+
+
+def _hash_file(path: str | PathLike, size: int) -> str:
+    """Compute the digest of the content of a file
+
+    Large files are memory-mapped and hashed in chunks, so that they are
+    not read into memory at once. The hashing releases the GIL, so files
+    can be hashed in threads in parallel.
+
+    Args:
+        path: The path to the file
+        size: The size of the file
+
+    Returns:
+        The hex digest
+    """
+    hasher = hashlib.blake2b(digest_size=16)
+    if size <= FILE_DIGESTS_CHUNK_SIZE:
+        hasher.update(Path(path).read_bytes())
+        return hasher.hexdigest()
+
+    with open(path, "rb") as fh, mmap.mmap(
+        fh.fileno(),
+        0,
+        access=mmap.ACCESS_READ,
+    ) as mapped:
+        view = memoryview(mapped)
+        try:
+            for start in range(0, len(view), FILE_DIGESTS_CHUNK_SIZE):
+                hasher.update(view[start:start + FILE_DIGESTS_CHUNK_SIZE])
+        finally:
+            view.release()
+    return hasher.hexdigest()
+
+
+class FileDigests:
+    """The content digests of files, persisted in a file in the workdir of
+    a pipeline
+
+    The digests are keyed by the device, inode, size and modification time
+    (in nanoseconds) of the files, so that a file is only hashed again when
+    it is modified (or replaced). The digests of the directories are
+    computed from the names and the digests of their contents, up to the
+    given depth, and not cached themselves, since the modification times
+    of directories don't change when the files inside are modified.
+
+    Args:
+        path: The path to the file to persist the digests
+    """
+
+    def __init__(self, path: str | PathLike) -> None:
+        self.path = Path(path)
+        try:
+            self.digests: Dict[str, str] = rtoml.load(self.path).get(
+                "digests",
+                {},
+            )
+        except (FileNotFoundError, rtoml.TomlParsingError):
+            self.digests = {}
+        # The keys used in this run, kept when the digests are pruned
+        self._used: Set[str] = set()
+        self._changed = False
+        # The digests are computed in threads
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(stat: os.stat_result) -> str:
+        """Get the key of a file to cache its digest"""
+        return (
+            f"{stat.st_dev}:{stat.st_ino}:{stat.st_size}:{stat.st_mtime_ns}"
+        )
+
+    def _cached(self, key: str) -> str | None:
+        """Get the cached digest by the key and mark it used"""
+        with self._lock:
+            digest = self.digests.get(key)
+            if digest is not None:
+                self._used.add(key)
+            return digest
+
+    def file_digest(self, path: str | PathLike) -> str:
+        """Get the digest of a file, from the cache if it is not modified
+
+        Args:
+            path: The path to the file
+
+        Returns:
+            The hex digest of the content
+        """
+        stat = os.stat(path)
+        key = self._key(stat)
+        digest = self._cached(key)
+        if digest is None:
+            digest = _hash_file(path, stat.st_size)
+            with self._lock:
+                self.digests[key] = digest
+                self._used.add(key)
+                self._changed = True
+        return digest
+
+    def digest(self, path: str | PathLike, dirsig: int) -> str:
+        """Get the digest of a file or a directory
+
+        Args:
+            path: The path to the file or directory
+            dirsig: The depth of the directory to check the contents.
+                With `0`, only the names in the directory are checked.
+
+        Returns:
+            The hex digest
+        """
+        if not os.path.isdir(path):
+            return self.file_digest(path)
+
+        hasher = hashlib.blake2b(digest_size=16)
+        with os.scandir(str(path)) as entries:
+            names = sorted(entry.name for entry in entries)
+        for name in names:
+            hasher.update(name.encode() + b"\0")
+            if dirsig > 0:
+                hasher.update(
+                    self.digest(os.path.join(path, name), dirsig - 1).encode()
+                )
+        return hasher.hexdigest()
+
+    async def a_digest(self, path: str | PathLike, dirsig: int) -> str:
+        """Get the digest of a file or a directory, hashing the files in the
+        thread pool of the running loop
+
+        Args:
+            path: The path to the file or directory
+            dirsig: The depth of the directory to check the contents
+
+        Returns:
+            The hex digest
+        """
+        if not os.path.isdir(path):
+            # Don't bother the thread pool if the file is not modified
+            digest = self._cached(self._key(os.stat(path)))
+            if digest is not None:
+                return digest
+
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.digest, path, dirsig)
+
+    def save(self) -> None:
+        """Save the digests to the file if any of them is computed
+
+        When there are more than `FILE_DIGESTS_MAX_ENTRIES` digests, only
+        the ones used in this run are kept.
+        """
+        with self._lock:
+            if not self._changed:
+                return
+            if len(self.digests) > FILE_DIGESTS_MAX_ENTRIES:
+                self.digests = {
+                    key: digest
+                    for key, digest in self.digests.items()
+                    if key in self._used
+                }
+            rtoml.dump({"digests": self.digests}, self.path)
+            self._changed = False
@@ -1,7 +1,12 @@
 """Provide JobCaching class that implements caching for jobs"""
 from __future__ import annotations
 
+import asyncio
+import os
+from concurrent.futures import Executor
+from os import PathLike
 from pathlib import Path
+from typing import Any, Dict, List, Mapping, Sequence
 
 import rtoml
 from simpleconf import Config
@@ -13,6 +18,8 @@ from .pluginmgr import plugin
 class JobCaching:
     """Provide caching functionality of jobs"""
 
+    __slots__ = ()
+
     @property
     def signature_file(self) -> Path:
         """Get the path to the signature file
@@ -22,18 +29,150 @@ class JobCaching:
         """
         return self.metadir / "job.signature.toml"
 
-    async def cache(self) -> None:
-        """write signature to signature file"""
-        dirsig = (
+    @property
+    def _proc_cache(self) -> bool | str:
+        """Get the cache option of the process"""
+        return (
+            self.proc.pipeline.config.cache
+            if self.proc.cache is None
+            else self.proc.cache
+        )
+
+    @property
+    def _proc_dirsig(self) -> int:
+        """Get the dirsig option of the process"""
+        return (
             self.proc.pipeline.config.dirsig
             if self.proc.dirsig is None
             else self.proc.dirsig
         )
+
+    @property
+    def _proc_dirsig_manifest(self) -> bool:
+        """Get the dirsig_manifest option of the process"""
+        return (
+            self.proc.pipeline.config.dirsig_manifest
+            if self.proc.dirsig_manifest is None
+            else self.proc.dirsig_manifest
+        )
+
+    def _input_mtime(
+        self,
+        path: str | PathLike,
+        dirsig: int,
+        recorded: Mapping[str, Any] | None,
+        manifests: Dict[str, Any] | None = None,
+    ) -> float:
+        """Get the last modification time of an input file/directory
+
+        With `dirsig_manifest`, the local directories are walked with the
+        manifests recorded in the signature, so that the files in the
+        (sub)directories without entries added, removed or renamed are not
+        stat-ed again.
+
+        Args:
+            path: The path to the file/directory
+            dirsig: The depth of the directories to check the contents
+            recorded: The recorded manifests, keyed by the paths
+            manifests: The dict to save the new manifest in, if given
+
+        Returns:
+            The last modification time
+        """
+        if (
+            not self._proc_dirsig_manifest
+            or dirsig == 0
+            or "://" in str(path)
+            or not os.path.isdir(path)
+        ):
+            return plugin.hooks.get_mtime(self, path, dirsig)
+
+        mtime, manifest = self.proc.stat_cache.get_dir_mtime(
+            path,
+            dirsig,
+            (recorded or {}).get(str(path)),
+        )
+        if manifests is not None:
+            manifests[str(path)] = manifest
+        return mtime
+
+    async def _content_digests(
+        self,
+        paths: List[str | PathLike],
+        dirsig: int,
+    ) -> Dict[str, str]:
+        """Compute the content digests of the files/directories for
+        `cache="content"`
+
+        Paths with protocols are skipped, their modification times are
+        checked only.
+
+        Args:
+            paths: The paths to the files/directories
+            dirsig: The depth of the directories to check the contents
+
+        Returns:
+            A dict with the paths as keys and the digests as values
+        """
+        file_digests = self.proc.pipeline.file_digests
+        local_paths = [str(path) for path in paths if "://" not in str(path)]
+        digests = await asyncio.gather(
+            *(file_digests.a_digest(path, dirsig) for path in local_paths)
+        )
+        return dict(zip(local_paths, digests))
+
+    async def _content_unchanged(
+        self,
+        signature: Any,
+        path: str | PathLike,
+        dirsig: int,
+    ) -> bool:
+        """Check if the content of a newer file/directory is the same as
+        recorded in the signature, with `cache="content"`
+
+        Args:
+            signature: The loaded signature
+            path: The path to the file/directory
+            dirsig: The depth of the directories to check the contents
+
+        Returns:
+            True if the content is recorded and unchanged, otherwise False
+        """
+        if self._proc_cache != "content":
+            return False
+
+        recorded = signature.get("digests", {}).get(str(path))
+        if recorded is None:
+            return False
+
+        digests = await self._content_digests([path], dirsig)
+        return digests.get(str(path)) == recorded
+
+    async def cache(self) -> None:
+        """write signature to signature file
+
+        With `cache="content"`, the content digests of the script, input and
+        output files/directories are also written. With `dirsig_manifest`,
+        the manifests of the input directories are also written.
+        """
+        dirsig = self._proc_dirsig
+        paths: List[str | PathLike] = [self.script_file]
         # Check if mtimes of input is greater than those of output
         try:
             max_mtime = self.script_file.stat().st_mtime
         except FileNotFoundError:
             max_mtime = 0
+            paths = []
+
+        manifests: Dict[str, Any] = {}
+        recorded = None
+        if self._proc_dirsig_manifest and any(
+            intype in (ProcInputType.DIR, ProcInputType.DIRS)
+            for intype in self.proc.input.type.values()
+        ):
+            # The manifests of the last run, to walk the directories faster
+            # if they are not walked in this run yet
+            recorded = (self._load_signature() or {}).get("manifests")
 
         for inkey, intype in self.proc.input.type.items():
             if intype == ProcInputType.VAR:
@@ -44,8 +183,15 @@ class JobCaching:
                 and self.input[inkey] is not None
             ):
                 max_mtime = max(
-                    max_mtime, plugin.hooks.get_mtime(self, self.input[inkey], dirsig)
+                    max_mtime,
+                    self._input_mtime(
+                        self.input[inkey],
+                        dirsig,
+                        recorded,
+                        manifests,
+                    ),
                 )
+                paths.append(self.input[inkey])
 
             if (
                 intype in (ProcInputType.FILES, ProcInputType.DIRS)
@@ -54,8 +200,9 @@ class JobCaching:
                 for file in self.input[inkey]:
                     max_mtime = max(
                         max_mtime,
-                        plugin.hooks.get_mtime(self, file, dirsig),
+                        self._input_mtime(file, dirsig, recorded, manifests),
                     )
+                    paths.append(file)
 
         for outkey, outval in self._output_types.items():
             if outval in (ProcOutputType.FILE, ProcInputType.DIR):
@@ -63,6 +210,7 @@ class JobCaching:
                     max_mtime,
                     plugin.hooks.get_mtime(self, self.output[outkey], dirsig),
                 )
+                paths.append(self.output[outkey])
 
         signature = {
             "input": {
@@ -72,7 +220,14 @@ class JobCaching:
             "output": {"type": self._output_types, "data": self.output},
             "ctime": float("inf") if max_mtime == 0 else max_mtime,
         }
-        rtoml.dump(signature, self.signature_file)
+        if self._proc_cache == "content":
+            signature["digests"] = await self._content_digests(paths, dirsig)
+        if manifests:
+            signature["manifests"] = manifests
+        if self.proc._signatures is not None:
+            self.proc._signatures.record(self.index, signature)
+        else:
+            rtoml.dump(signature, self.signature_file)
 
     async def _clear_output(self) -> None:
         """Clear output if not cached"""
@@ -87,18 +242,30 @@ class JobCaching:
                 outval == ProcOutputType.DIR,
             )
 
-    async def _check_cached(self) -> bool:
+    def _load_signature(self) -> Any:
+        """Load the signature of the job, from the signature store of the
+        process with `signature_store="sqlite"`, otherwise from the
+        signature file
+
+        Returns:
+            The signature, or None if it is not found
+        """
+        if self.proc._signatures is not None:
+            return self.proc._signatures.get(self.index)
+        if not self.signature_file.is_file():
+            return None
+        return Config.load(self.signature_file)
+
+    async def _check_cached(self, signature: Any) -> str | None:
         """Check if the job is cached based on signature
 
+        Args:
+            signature: The loaded signature
+
         Returns:
-            True if the job is cached otherwise False
+            None if the job is cached otherwise the reason why it is not
         """
-        signature = Config.load(self.signature_file)
-        dirsig = (
-            self.proc.pipeline.config.dirsig
-            if self.proc.dirsig is None
-            else self.proc.dirsig
-        )
+        dirsig = self._proc_dirsig
 
         try:
             # check if inputs/outputs are still the same
@@ -108,18 +275,23 @@ class JobCaching:
                 or signature.output.type != self._output_types
                 or signature.output.data != self.output
             ):
-                self.log("debug", "Not cached (input or output is different)")
-                return False
+                return "input or output is different"
 
             # check if any script file is newer
-            if self.script_file.stat().st_mtime > signature.ctime + 1e-3:
-                self.log(
-                    "debug",
-                    "Not cached (script file is newer: %s > %s)",
-                    self.script_file.stat().st_mtime,
-                    signature.ctime,
+            if self._script_changed:
+                return "script is changed"
+
+            if self.script_file.stat().st_mtime > signature.ctime + 1e-3 and (
+                not await self._content_unchanged(
+                    signature,
+                    self.script_file,
+                    dirsig,
+                )
+            ):
+                return (
+                    "script file is newer: "
+                    f"{self.script_file.stat().st_mtime} > {signature.ctime}"
                 )
-                return False
 
             for inkey, intype in self.proc.input.type.items():
 
@@ -128,29 +300,34 @@ class JobCaching:
 
                 if intype in (ProcInputType.FILE, ProcInputType.DIR):
                     if (
-                        plugin.hooks.get_mtime(self, self.input[inkey], dirsig)
+                        self._input_mtime(
+                            self.input[inkey],
+                            dirsig,
+                            signature.get("manifests"),
+                        )
                         > signature.ctime + 1e-3
+                    ) and not await self._content_unchanged(
+                        signature,
+                        self.input[inkey],
+                        dirsig,
                     ):
-                        self.log(
-                            "debug",
-                            "Not cached (Input file is newer: %s)",
-                            inkey,
-                        )
-                        return False
+                        return f"Input file is newer: {inkey}"
 
                 if intype in (ProcInputType.FILES, ProcInputType.DIRS):
                     for file in self.input[inkey]:
                         if (
-                            plugin.hooks.get_mtime(self, file, dirsig)
+                            self._input_mtime(
+                                file,
+                                dirsig,
+                                signature.get("manifests"),
+                            )
                             > signature.ctime + 1e-3
+                        ) and not await self._content_unchanged(
+                            signature,
+                            file,
+                            dirsig,
                         ):
-                            self.log(
-                                "debug",
-                                "Not cached (One of the input files "
-                                "is newer: %s)",
-                                inkey,
-                            )
-                            return False
+                            return f"One of the input files is newer: {inkey}"
 
             for outkey, outval in self._output_types.items():
                 if outval not in (ProcOutputType.FILE, ProcOutputType.DIR):
@@ -162,61 +339,171 @@ class JobCaching:
                     outval == ProcOutputType.DIR,
                 )
                 if not output_exists:
-                    self.log(
-                        "debug",
-                        "Not cached (Output file removed: %s)",
-                        outkey,
+                    return f"Output file removed: {outkey}"
+
+                # The outputs are only checked if they are modified with
+                # cache="content", they are newer than the inputs anyway
+                if (
+                    self._proc_cache == "content"
+                    and plugin.hooks.get_mtime(self, self.output[outkey], dirsig)
+                    > signature.ctime + 1e-3
+                    and not await self._content_unchanged(
+                        signature,
+                        self.output[outkey],
+                        dirsig,
                     )
-                    return False
+                ):
+                    return f"Output file is changed: {outkey}"
 
         except (AttributeError, FileNotFoundError):  # pragma: no cover
             # meaning signature is incomplete
             # or any file is deleted
-            return False
-        return True
+            return "signature is incomplete or file is deleted"
+        return None
+
+    def _prefetch(
+        self,
+        inputs: Sequence[str | PathLike],
+        outputs: Sequence[str | PathLike],
+    ) -> Any:
+        """Do the blocking work of checking if the job is cached, in a
+        thread
+
+        The signature is loaded, and the local input and output files are
+        stat-ed with the stat cache of the run, so that the hooks of the
+        core plugin get the results from the cache when the job is checked
+        in the running loop. No hooks are called here, as the plugins may
+        hold resources bound to the running loop. The errors are left to
+        the check.
+
+        Args:
+            inputs: The input files/directories
+            outputs: The output files/directories
+
+        Returns:
+            The signature, or None if it is not found
+        """
+        signature = self._load_signature()
+        if signature is None:
+            return None
+
+        dirsig = self._proc_dirsig
+        stat_cache = self.proc.stat_cache
+        manifests = signature.get("manifests") or {}
+        for path in inputs:
+            if "://" in str(path):
+                continue
+            try:
+                if (
+                    self._proc_dirsig_manifest
+                    and dirsig > 0
+                    and os.path.isdir(path)
+                ):
+                    stat_cache.get_dir_mtime(
+                        path,
+                        dirsig,
+                        manifests.get(str(path)),
+                    )
+                else:
+                    stat_cache.get_mtime(path, dirsig)
+            except OSError:
+                pass
+
+        for path in outputs:
+            if "://" in str(path) or not stat_cache.exists(path):
+                continue
+            if self._proc_cache == "content":
+                try:
+                    stat_cache.get_mtime(path, dirsig)
+                except OSError:
+                    pass
+        return signature
+
+    async def not_cached_reason(
+        self,
+        executor: Executor | None = None,
+    ) -> str | None:
+        """Check if a job is cached, without writing the signature or
+        clearing the output
+
+        Args:
+            executor: The executor to do the blocking work in (see
+                `_prefetch()`). If not given, all the work is done in the
+                running loop.
+
+        Returns:
+            None if the job is cached otherwise the reason why it is not
+        """
+        proc_cache = self._proc_cache
+        if not proc_cache:
+            return "proc.cache is False"
+        if await self.rc != 0:
+            return "job.rc != 0"
+        if proc_cache == "force":
+            return None
+
+        if executor is None:
+            signature = self._load_signature()
+        else:
+            inputs: List[str | PathLike] = []
+            for inkey, intype in self.proc.input.type.items():
+                value = self.input[inkey]
+                if intype == ProcInputType.VAR or value is None:
+                    continue
+                if intype in (ProcInputType.FILES, ProcInputType.DIRS):
+                    inputs.extend(value)
+                else:
+                    inputs.append(value)
+            outputs = [
+                self.output[outkey]
+                for outkey, outtype in self._output_types.items()
+                if outtype in (ProcOutputType.FILE, ProcOutputType.DIR)
+            ]
+            signature = await asyncio.get_running_loop().run_in_executor(
+                executor,
+                self._prefetch,
+                inputs,
+                outputs,
+            )
+
+        if signature is None:
+            return "signature file not found"
+        return await self._check_cached(signature)
 
     @property
     async def cached(self) -> bool:
         """Check if a job is cached
 
+        The signature is written for force-cached jobs, and the output is
+        cleared if the job is not cached.
+
         Returns:
             True if the job is cached otherwise False
         """
-        out = True
-        proc_cache = (
-            self.proc.pipeline.config.cache
-            if self.proc.cache is None
-            else self.proc.cache
-        )
-        if not proc_cache:
-            self.log(
-                "debug",
-                "Not cached (proc.cache is False)",
-            )
-            out = False
-        elif await self.rc != 0:
-            self.log(
-                "debug",
-                "Not cached (job.rc != 0)",
-            )
-            out = False
-        elif proc_cache == "force":
+        return await self._settle_cached(await self.not_cached_reason())
+
+    async def _settle_cached(self, reason: str | None) -> bool:
+        """Act on the result of `not_cached_reason()`
+
+        The signature is written for force-cached jobs, and the output is
+        cleared if the job is not cached. Separated from `cached`, so that
+        the jobs can be checked concurrently (see `Proc._put_jobs()`),
+        while the changes are made in order.
+
+        Args:
+            reason: The reason why the job is not cached, None if cached
+
+        Returns:
+            True if the job is cached otherwise False
+        """
+        if reason is None and self._proc_cache == "force":
             try:
                 await self.cache()
             except FileNotFoundError:  # pragma: no cover
-                out = False
-            else:
-                out = True
-        elif not self.signature_file.is_file():
-            self.log(
-                "debug",
-                "Not cached (signature file not found)",
-            )
-            out = False
-        else:
-            out = await self._check_cached()
+                reason = "output file not found for force-caching"
 
-        if not out:
+        if reason is not None:
+            self.log("debug", "Not cached (%s)", reason)
             await self._clear_output()
 
-        return out
+        return reason is None
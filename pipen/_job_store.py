@@ -0,0 +1,242 @@
+"""Provide JobStore class that keeps the data of all jobs of a process in
+columns, with the jobs as views on it"""
+from __future__ import annotations
+
+from array import array
+from os import PathLike
+from pathlib import Path
+from typing import Any, Dict, List
+
+from xqute.defaults import JobStatus
+
+# The kinds of the commands of the jobs, see `JobStore.get_cmd()`
+_CMD_INIT = 0
+_CMD_NONE = 1
+_CMD_SCRIPT = 2
+_CMD_OTHER = 3
+# Marks the values not computed in the columns
+MISSING = object()
+
+
+class JobStore:
+    """The data of the jobs of a process, kept in columns (struct-of-arrays)
+
+    The states managed by xqute (status, return code, trial count, etc) are
+    kept in typed arrays, and the inputs and outputs of the jobs in lists
+    by keys, so that a job only costs tens of bytes here, and the `Job`
+    objects are thin views holding only the index and the store. The
+    values that can be computed from the process (metadirs, output
+    directories, commands) are computed when accessed instead of being
+    kept for each job.
+
+    Args:
+        workdir: The workdir of the process, where the metadirs of the
+            jobs are
+        size: The number of jobs
+    """
+
+    __slots__ = (
+        "workdir",
+        "size",
+        "status",
+        "prev_status",
+        "rc",
+        "trial_count",
+        "error_retry",
+        "num_retries",
+        "jids",
+        "metadirs",
+        "cmd_kinds",
+        "cmd_prefix",
+        "cmds",
+        "export_dir",
+        "outdir_made",
+        "script_changed",
+        "bundles",
+        "records",
+        "inputs",
+        "outputs",
+        "output_types",
+    )
+
+    def __init__(self, workdir: str | PathLike, size: int) -> None:
+        self.workdir = Path(workdir)
+        self.size = size
+        self.status = array("b", [JobStatus.INIT]) * size
+        self.prev_status = array("b", [JobStatus.INIT]) * size
+        self.rc = array("i", [-1]) * size
+        self.trial_count = array("I", [0]) * size
+        # -1 for None (the options of xqute are used)
+        self.error_retry = array("b", [-1]) * size
+        self.num_retries = array("i", [-1]) * size
+        self.jids: List[int | str | None] = [None] * size
+        # The metadirs not in the workdir of the process, rarely used
+        self.metadirs: Dict[int, Path] = {}
+        # The commands, as `cmd_prefix` + [script file] for most jobs
+        self.cmd_kinds = bytearray(size)
+        self.cmd_prefix: List[str] = []
+        self.cmds: Dict[int, Any] = {}
+        # Where the output directories are exported, None for the metadirs
+        self.export_dir: Path | None = None
+        self.outdir_made = bytearray(size)
+        self.script_changed = bytearray(size)
+        # The jobs submitted together with a job (see `bundle_size`)
+        self.bundles: Dict[int, List[Any]] = {}
+        # The input data, and the inputs of the jobs with the paths
+        # normalized, computed when accessed
+        self.records: Dict[str, List[Any]] = {}
+        self.inputs: Dict[str, List[Any]] = {}
+        self.outputs: Dict[str, List[Any]] = {}
+        self.output_types: Dict[str, str] = {}
+
+    def metadir(self, index: int) -> Path:
+        """Get the metadir of a job
+
+        Args:
+            index: The index of the job
+
+        Returns:
+            The metadir
+        """
+        metadir = self.metadirs.get(index)
+        if metadir is not None:
+            return metadir  # pragma: no cover
+        return self.workdir / str(index)
+
+    def set_metadir(self, index: int, metadir: str | PathLike) -> None:
+        """Set the metadir of a job, only kept if it is not the default one
+
+        Args:
+            index: The index of the job
+            metadir: The metadir
+        """
+        metadir = Path(metadir)
+        if metadir == self.workdir / str(index):
+            self.metadirs.pop(index, None)
+        else:
+            self.metadirs[index] = metadir  # pragma: no cover
+
+    def outdir(self, index: int) -> Path:
+        """Get the output directory of a job
+
+        Args:
+            index: The index of the job
+
+        Returns:
+            The output directory
+        """
+        if self.export_dir is None:
+            return self.metadir(index) / "output"
+        if self.size > 1:
+            # Don't put index if it is a single-job process
+            return self.export_dir / str(index)
+        return self.export_dir
+
+    def get_cmd(self, index: int, script_file: Path) -> Any:
+        """Get the command of a job
+
+        Args:
+            index: The index of the job
+            script_file: The script file of the job
+
+        Returns:
+            The command
+        """
+        kind = self.cmd_kinds[index]
+        if kind == _CMD_INIT:
+            return ""
+        if kind == _CMD_NONE:
+            return []
+        if kind == _CMD_SCRIPT:
+            return self.cmd_prefix + [script_file]
+        return self.cmds[index]  # pragma: no cover
+
+    def set_cmd(self, index: int, cmd: Any, script_file: Path) -> None:
+        """Set the command of a job
+
+        The commands running the script files with the same language are
+        not kept for each job.
+
+        Args:
+            index: The index of the job
+            cmd: The command
+            script_file: The script file of the job
+        """
+        self.cmds.pop(index, None)
+        if isinstance(cmd, str) and not cmd:
+            self.cmd_kinds[index] = _CMD_INIT
+        elif isinstance(cmd, list) and not cmd:
+            self.cmd_kinds[index] = _CMD_NONE
+        elif (
+            isinstance(cmd, list)
+            and cmd[-1] == script_file
+            and (not self.cmd_prefix or cmd[:-1] == self.cmd_prefix)
+        ):
+            self.cmd_prefix = cmd[:-1]
+            self.cmd_kinds[index] = _CMD_SCRIPT
+        else:  # pragma: no cover
+            self.cmd_kinds[index] = _CMD_OTHER
+            self.cmds[index] = cmd
+
+    def output_done(self, index: int) -> bool:
+        """Check whether the output of a job is computed
+
+        Args:
+            index: The index of the job
+
+        Returns:
+            True if it is computed otherwise False
+        """
+        return bool(self.outputs) and any(
+            column[index] is not MISSING for column in self.outputs.values()
+        )
+
+    def set_output(self, index: int, key: str, value: Any) -> None:
+        """Set the value of an output of a job
+
+        Args:
+            index: The index of the job
+            key: The output key
+            value: The value
+        """
+        column = self.outputs.get(key)
+        if column is None:
+            column = self.outputs[key] = [MISSING] * self.size
+        column[index] = value
+
+    def release(self, index: int) -> None:
+        """Release the input and output of a job, computed again when
+        accessed
+
+        Args:
+            index: The index of the job
+        """
+        for column in self.inputs.values():
+            column[index] = MISSING
+        for column in self.outputs.values():
+            column[index] = MISSING
+
+
+class StoreColumn:
+    """A state of the jobs kept in a column of the store, used in place of
+    the attribute of each `Job` object
+
+    Args:
+        column: The name of the column in the store
+        none: The value in the column for None
+    """
+
+    def __init__(self, column: str, none: Any = MISSING) -> None:
+        self.column = column
+        self.none = none
+
+    def __get__(self, job: Any, owner: type | None = None) -> Any:
+        if job is None:
+            return self
+        value = getattr(job._store, self.column)[job.index]
+        return None if value == self.none else value
+
+    def __set__(self, job: Any, value: Any) -> None:
+        getattr(job._store, self.column)[job.index] = (
+            self.none if value is None else value
+        )
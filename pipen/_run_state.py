@@ -0,0 +1,426 @@
+"""Provide RunState class that records the processes finished in previous
+runs, so that a pipeline can be resumed without rebuilding their jobs"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from os import PathLike
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    Sequence,
+    Type,
+)
+
+import rtoml
+
+from .defaults import ProcInputType, ProcOutputType
+from .utils import get_mtime
+
+if TYPE_CHECKING:  # pragma: no cover
+    import pandas
+    from .pipen import Pipen
+    from .proc import Proc
+
+# The class attributes of processes to compute the pipeline fingerprint
+_PROC_FINGERPRINT_KEYS = (
+    "name",
+    "input",
+    "output",
+    "script",
+    "lang",
+    "template",
+    "template_opts",
+    "envs",
+    "plugin_opts",
+    "cache",
+    "dirsig",
+    "dirsig_manifest",
+    "export",
+)
+
+
+def _json_default(obj: Any) -> Any:
+    """Serialize the objects not serializable by json for fingerprints
+
+    Only the objects that can be serialized stably across runs are
+    supported. For the others, `repr()` may embed the addresses of the
+    objects, so a TypeError is raised to make the fingerprint unavailable.
+
+    Raises:
+        TypeError: When the object cannot be serialized stably
+    """
+    import pandas
+
+    if isinstance(obj, pandas.DataFrame):
+        return obj.to_dict("split")
+    if isinstance(obj, PathLike):
+        return os.fspath(obj)
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj, key=repr)
+    if isinstance(obj, type):
+        return f"{obj.__module__}.{obj.__qualname__}"
+    if hasattr(obj, "dtype") and hasattr(obj, "item"):
+        # numpy scalars, e.g. from data frames
+        return obj.item()
+    raise TypeError(
+        f"Object of type {type(obj).__name__} is not supported in "
+        "fingerprints"
+    )
+
+
+def proc_input_files(proc: Proc) -> List[str]:
+    """Get the input files/directories of a process
+
+    Args:
+        proc: The process object, with the input computed
+
+    Returns:
+        The paths of the input files/directories
+    """
+    files = []
+    for inkey, intype in proc.input.type.items():
+        if intype == ProcInputType.VAR:
+            continue
+        for value in proc.input.data[inkey]:
+            if value is None:
+                continue
+            if isinstance(value, (list, tuple)):
+                files.extend(value)
+            else:
+                # Type errors are raised when the jobs are initialized
+                files.append(value)
+    return files
+
+
+def proc_fingerprint(proc: Proc) -> str | None:
+    """Compute the fingerprint of a process from its configurations and
+    the input data
+
+    For processes that don't require other processes, the modification
+    times of the input files are also included, as they are not produced
+    by the pipeline.
+
+    Args:
+        proc: The process object, with the input computed
+
+    Returns:
+        The fingerprint, or None if it cannot be computed (e.g. an input
+        file does not exist, or the input data or configurations have
+        objects that cannot be serialized stably)
+    """
+    dirsig = (
+        proc.pipeline.config.dirsig if proc.dirsig is None else proc.dirsig
+    )
+    input_mtimes: List[float] = []
+    if not proc.requires:
+        try:
+            input_mtimes = [
+                get_mtime(path, dirsig) for path in proc_input_files(proc)
+            ]
+        except (OSError, TypeError):
+            return None
+
+    parts = {
+        "name": proc.name,
+        "input": {
+            "type": proc.input.type,
+            "data": proc.input.data,
+            "mtimes": input_mtimes,
+        },
+        "output": proc.__class__.output,
+        "script": proc._script_source,
+        "lang": proc.lang or proc.pipeline.config.lang,
+        "template": proc.template.__name__,  # type: ignore
+        "template_opts": proc.template_opts,
+        "envs": proc.envs,
+        "plugin_opts": proc.plugin_opts,
+        "export": proc.export,
+        "outdir": str(proc.pipeline.outdir),
+    }
+    return _hash_parts(parts)
+
+
+def _hash_parts(parts: Mapping[str, Any]) -> str | None:
+    """Compute the fingerprint of the parts
+
+    Args:
+        parts: The parts to compute the fingerprint from
+
+    Returns:
+        The fingerprint, or None if any of the parts cannot be serialized
+        stably
+    """
+    try:
+        dumped = json.dumps(parts, sort_keys=True, default=_json_default)
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(dumped.encode()).hexdigest()
+
+
+def pipeline_fingerprint(pipeline: Pipen) -> str | None:
+    """Compute the fingerprint of a pipeline from the definitions of the
+    processes, without instantiating them
+
+    Args:
+        pipeline: The pipeline, with the process relationships built
+
+    Returns:
+        The fingerprint, or None if the definitions have objects that
+        cannot be serialized stably
+    """
+    procs = []
+    for proc in pipeline.procs:
+        requires: Sequence[Type[Proc]] = proc.requires or ()  # type: ignore
+        script = proc.script
+        script_mtime = None
+        if script and script.startswith("file://"):
+            try:
+                script_mtime = proc._resolve_script_file(script).stat().st_mtime
+            except OSError:
+                script_mtime = None
+
+        procs.append(
+            {
+                "requires": [req.name for req in requires],
+                "input_data": None if requires else proc.input_data,
+                "script_mtime": script_mtime,
+                **{key: getattr(proc, key) for key in _PROC_FINGERPRINT_KEYS},
+            }
+        )
+
+    parts = {
+        "config": {
+            key: val
+            for key, val in pipeline.config.items()
+            if key not in ("loglevel", "plugins")
+        },
+        "outdir": str(pipeline.outdir),
+        "procs": procs,
+    }
+    return _hash_parts(parts)
+
+
+def _output_mtimes(
+    proc: Proc,
+    output_data: pandas.DataFrame,
+    output_types: Mapping[str, str],
+) -> Dict[str, float] | None:
+    """Get the modification times of the output files/directories of a
+    process
+
+    Args:
+        proc: The process object
+        output_data: The output data of the process
+        output_types: The types of the outputs
+
+    Returns:
+        The modification times keyed by the paths, or None if any of the
+        output files/directories doesn't exist
+    """
+    dirsig = (
+        proc.pipeline.config.dirsig if proc.dirsig is None else proc.dirsig
+    )
+    mtimes = {}
+    for outkey, outtype in output_types.items():
+        if outtype not in (ProcOutputType.FILE, ProcOutputType.DIR):
+            continue
+        for out in output_data[outkey]:
+            try:
+                mtimes[str(out)] = get_mtime(out, dirsig)
+            except OSError:
+                return None
+    return mtimes
+
+
+class RunState:
+    """The state of the processes finished in the previous runs of a
+    pipeline, persisted in a file in the workdir of the pipeline
+
+    For each finished process, the fingerprint (see `proc_fingerprint()`),
+    the output types, the modification times of the output files and the
+    output data are recorded.
+
+    Args:
+        path: The path to the run state file
+    """
+
+    def __init__(self, path: str | PathLike) -> None:
+        self.path = Path(path)
+        try:
+            state = rtoml.load(self.path)
+        except (FileNotFoundError, rtoml.TomlParsingError):
+            state = {}
+        self.procs: Dict[str, Dict[str, Any]] = state.get("procs", {})
+        # The fingerprint of the pipeline and the modification times of
+        # the input files of the start processes and the output files of
+        # the end processes, recorded when the whole pipeline succeeded
+        self.pipeline: Dict[str, Any] = state.get("pipeline", {})
+
+    def restore_pipeline(self, pipeline: Pipen, fingerprint: str) -> bool:
+        """Restore the output data of all processes if the pipeline is
+        unchanged since the last run
+
+        Args:
+            pipeline: The pipeline
+            fingerprint: The fingerprint of the pipeline in this run
+
+        Returns:
+            True if the pipeline is unchanged and the output data of all
+            processes are restored
+        """
+        import pandas
+
+        if self.pipeline.get("fingerprint") != fingerprint or not all(
+            proc.name in self.procs for proc in pipeline.procs
+        ):
+            return False
+
+        for path, mtime in self.pipeline.get("manifest", {}).items():
+            try:
+                if get_mtime(path, pipeline.config.dirsig) != mtime:
+                    return False
+            except OSError:
+                return False
+
+        for proc in pipeline.procs:
+            state = self.procs[proc.name]
+            proc.output_data = pandas.DataFrame(
+                state["data"],
+                columns=state["columns"],
+            )
+        return True
+
+    def record_pipeline(
+        self,
+        pipeline: Pipen,
+        fingerprint: str,
+        input_files: Iterable[str],
+    ) -> None:
+        """Record the pipeline succeeded and save the run state
+
+        Args:
+            pipeline: The pipeline
+            fingerprint: The fingerprint of the pipeline
+            input_files: The input files/directories of the start processes
+        """
+        files = list(input_files)
+        end_procs = [
+            proc
+            for proc in pipeline.procs
+            if not any(nxt in pipeline.procs for nxt in proc.nexts or ())
+        ]
+        for proc in end_procs:
+            state = self.procs.get(proc.name)
+            if not state:
+                # not recorded, can't restore the pipeline
+                return
+            for outkey, outtype in state["types"].items():
+                if outtype not in (ProcOutputType.FILE, ProcOutputType.DIR):
+                    continue
+                index = state["columns"].index(outkey)
+                files.extend(row[index] for row in state["data"])
+
+        try:
+            manifest = {
+                str(path): get_mtime(path, pipeline.config.dirsig)
+                for path in files
+            }
+        except (OSError, TypeError):
+            return
+
+        self.pipeline = {"fingerprint": fingerprint, "manifest": manifest}
+        self.save()
+
+    def restore(
+        self,
+        proc: Proc,
+        fingerprint: str | None,
+    ) -> pandas.DataFrame | None:
+        """Restore the output data of a process finished in previous runs
+
+        Args:
+            proc: The process object
+            fingerprint: The fingerprint of the process in this run
+
+        Returns:
+            The output data, or None if the process is not finished with
+            the same fingerprint, or any output file/directory is removed
+            or modified since it was recorded.
+        """
+        import pandas
+
+        state = self.procs.get(proc.name)
+        if fingerprint is None or not state or (
+            state.get("fingerprint") != fingerprint
+        ):
+            return None
+
+        output_data = pandas.DataFrame(
+            state["data"],
+            columns=state["columns"],
+        )
+        if _output_mtimes(proc, output_data, state["types"]) != state.get(
+            "mtimes"
+        ):
+            return None
+
+        return output_data
+
+    def record(
+        self,
+        proc: Proc,
+        fingerprint: str | None,
+        output_types: Mapping[str, str],
+    ) -> None:
+        """Record a finished process and save the run state
+
+        Processes with output data not being strings are not recorded.
+
+        Args:
+            proc: The process object
+            fingerprint: The fingerprint of the process
+            output_types: The types of the outputs
+        """
+        output_data = proc.output_data
+        if fingerprint is None or not all(
+            isinstance(value, str)
+            for column in output_data
+            for value in output_data[column]
+        ):
+            self.forget(proc.name)
+            return
+
+        mtimes = _output_mtimes(proc, output_data, output_types)
+        if mtimes is None:
+            self.forget(proc.name)
+            return
+
+        self.procs[proc.name] = {
+            "fingerprint": fingerprint,
+            "types": dict(output_types),
+            "mtimes": mtimes,
+            "columns": list(output_data.columns),
+            "data": output_data.values.tolist(),
+        }
+        self.save()
+
+    def forget(self, name: str) -> None:
+        """Remove a process from the run state and save it
+
+        Args:
+            name: The name of the process
+        """
+        if self.procs.pop(name, None) is not None or self.pipeline:
+            self.pipeline = {}
+            self.save()
+
+    def save(self) -> None:
+        """Save the run state to the file"""
+        rtoml.dump({"pipeline": self.pipeline, "procs": self.procs}, self.path)
@@ -0,0 +1,93 @@
+"""Provide SignatureStore class that keeps the signatures of all jobs of a
+process in one SQLite database (`signature_store="sqlite"`)"""
+from __future__ import annotations
+
+import json
+import sqlite3
+from contextlib import closing
+from os import PathLike
+from pathlib import Path
+from typing import Any, Dict, Mapping
+
+from diot import Diot
+
+from .defaults import SIGNATURES_FLUSH_SIZE
+
+
+class SignatureStore:
+    """The signatures of the jobs of a process, persisted in a SQLite
+    database in the workdir of the process
+
+    Instead of a `job.signature.toml` file for each job, the signatures are
+    loaded all at once when the jobs are initialized, and checked in
+    memory. The new signatures are written in batches of
+    `SIGNATURES_FLUSH_SIZE`, and the rest of them once the process is done.
+    The signatures not written (for example, the pipeline is killed) only
+    make the jobs run again.
+
+    Args:
+        path: The path to the database
+    """
+
+    def __init__(self, path: str | PathLike) -> None:
+        self.path = Path(path)
+        # The signatures in JSON, parsed only when checked
+        self.signatures: Dict[int, str] = {}
+        self._pending: Dict[int, str] = {}
+        if not self.path.is_file():
+            return
+
+        try:
+            with closing(sqlite3.connect(self.path)) as conn:
+                rows = conn.execute(
+                    "SELECT job, signature FROM signatures"
+                ).fetchall()
+        except sqlite3.DatabaseError:
+            # No table created or a corrupted database
+            return
+        self.signatures = dict(rows)
+
+    def __contains__(self, index: int) -> bool:
+        return index in self.signatures
+
+    def get(self, index: int) -> Diot | None:
+        """Get the signature of a job
+
+        Args:
+            index: The index of the job
+
+        Returns:
+            The signature, or None if it is not recorded
+        """
+        signature = self.signatures.get(index)
+        if signature is None:
+            return None
+        return Diot(json.loads(signature))
+
+    def record(self, index: int, signature: Mapping[str, Any]) -> None:
+        """Record the signature of a job, written in batches
+
+        Args:
+            index: The index of the job
+            signature: The signature
+        """
+        self.signatures[index] = self._pending[index] = json.dumps(signature)
+        if len(self._pending) >= SIGNATURES_FLUSH_SIZE:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the signatures recorded but not written"""
+        if not self._pending:
+            return
+
+        with closing(sqlite3.connect(self.path)) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS signatures "
+                "(job INTEGER PRIMARY KEY, signature TEXT NOT NULL)"
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO signatures VALUES (?, ?)",
+                self._pending.items(),
+            )
+            conn.commit()
+        self._pending.clear()
@@ -0,0 +1,58 @@
+"""Run a pipeline, optionally only the processes some targets need."""
+from __future__ import annotations
+
+import sys
+from typing import TYPE_CHECKING
+
+from ._hooks import CLIPlugin
+from ..utils import _to_pipeline
+
+if TYPE_CHECKING:
+    from argx import ArgumentParser
+    from argparse import Namespace
+
+__all__ = ("CLIExecPlugin",)
+
+
+class CLIExecPlugin(CLIPlugin):
+    """Run a pipeline, optionally only the processes some targets need."""
+
+    name = "exec"
+
+    def __init__(
+        self,
+        parser: ArgumentParser,
+        subparser: ArgumentParser,
+    ) -> None:
+        super().__init__(parser, subparser)
+        subparser.add_argument(
+            "pipeline",
+            help=(
+                "The pipeline to run, in the format of "
+                "`<module[.submodule]>:name` or `/path/to/script.py:name`. "
+                "`name` can be a Pipen object or a subclass of Pipen, Proc "
+                "or ProcGroup."
+            ),
+        )
+        subparser.add_argument(
+            "-t",
+            "--target",
+            action="append",
+            default=[],
+            help=(
+                "The name of the process to run, together with the processes "
+                "it requires. Can be used multiple times. "
+                "Run all processes if not provided."
+            ),
+        )
+        subparser.add_argument(
+            "--profile",
+            default="default",
+            help="The profile to use for the run.",
+        )
+
+    def exec_command(self, args: Namespace) -> None:
+        """Run the command"""
+        pipeline = _to_pipeline(args.pipeline)
+        if not pipeline.run(args.profile, targets=args.target or None):
+            sys.exit(1)
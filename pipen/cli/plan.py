@@ -0,0 +1,100 @@
+"""Check which jobs of a pipeline would run, without running anything."""
+from __future__ import annotations
+
+from collections import Counter
+from typing import TYPE_CHECKING, Dict, List
+
+from rich import print
+from rich.table import Table
+
+from ._hooks import CLIPlugin
+from ..utils import _to_pipeline, brief_list
+
+if TYPE_CHECKING:
+    from argx import ArgumentParser
+    from argparse import Namespace
+
+__all__ = ("CLIPlanPlugin",)
+
+
+class CLIPlanPlugin(CLIPlugin):
+    """Check which jobs of a pipeline would run, without running anything."""
+
+    name = "plan"
+
+    def __init__(
+        self,
+        parser: ArgumentParser,
+        subparser: ArgumentParser,
+    ) -> None:
+        super().__init__(parser, subparser)
+        subparser.add_argument(
+            "pipeline",
+            help=(
+                "The pipeline to check, in the format of "
+                "`<module[.submodule]>:name` or `/path/to/script.py:name`. "
+                "`name` can be a Pipen object or a subclass of Pipen, Proc "
+                "or ProcGroup."
+            ),
+        )
+        subparser.add_argument(
+            "-t",
+            "--target",
+            action="append",
+            default=[],
+            help=(
+                "The name of the process to check, together with the "
+                "processes it requires. Can be used multiple times. "
+                "Check all processes if not provided."
+            ),
+        )
+        subparser.add_argument(
+            "--profile",
+            default="default",
+            help="The profile to use.",
+        )
+        subparser.add_argument(
+            "--jobs",
+            action="store_true",
+            default=False,
+            help="Show the reason for each job to run.",
+        )
+
+    def exec_command(self, args: Namespace) -> None:
+        """Run the command"""
+        pipeline = _to_pipeline(args.pipeline)
+        plans = pipeline.plan(args.profile, targets=args.target or None)
+
+        table = Table(title=f"Plan of {pipeline.name}")
+        table.add_column("Process")
+        table.add_column("Jobs", justify="right")
+        table.add_column("To run", justify="right")
+        table.add_column("Cached", justify="right")
+        table.add_column("Reasons")
+        for name, plan in plans.items():
+            reasons = Counter(
+                reason for reason in plan.values() if reason is not None
+            )
+            to_run = sum(reasons.values())
+            table.add_row(
+                name,
+                str(len(plan)),
+                str(to_run),
+                str(len(plan) - to_run),
+                "\n".join(
+                    f"{reason} ({count})"
+                    for reason, count in reasons.most_common()
+                ),
+            )
+        print(table)
+
+        if not args.jobs:
+            return
+
+        for name, plan in plans.items():
+            by_reason: Dict[str, List[int]] = {}
+            for index, reason in plan.items():
+                if reason is not None:
+                    by_reason.setdefault(reason, []).append(index)
+            for reason, indexes in by_reason.items():
+                print(f"{name}: [{brief_list(indexes)}] {reason}")
@@ -0,0 +1,69 @@
+"""Serve pipelines, running them on requests in one long-lived process."""
+from __future__ import annotations
+
+import asyncio
+import os
+from typing import TYPE_CHECKING
+
+from ..defaults import SERVE_SOCKET, SERVE_TOKEN_ENV
+from ._hooks import CLIPlugin
+
+if TYPE_CHECKING:
+    from argx import ArgumentParser
+    from argparse import Namespace
+
+__all__ = ("CLIServePlugin",)
+
+
+class CLIServePlugin(CLIPlugin):
+    """Serve pipelines, running them on requests in one long-lived process."""
+
+    name = "serve"
+
+    def __init__(
+        self,
+        parser: ArgumentParser,
+        subparser: ArgumentParser,
+    ) -> None:
+        super().__init__(parser, subparser)
+        subparser.add_argument(
+            "--socket",
+            help=(
+                "The path to the unix socket to listen on, only accessible "
+                f"by the user [default: {SERVE_SOCKET}]"
+            ),
+        )
+        subparser.add_argument(
+            "--host",
+            help=(
+                "The host to listen on over TCP instead of the unix socket. "
+                "A token is required then (see `--token-file`)."
+            ),
+        )
+        subparser.add_argument(
+            "--port",
+            type=int,
+            default=8765,
+            help="The port to listen on over TCP.",
+        )
+        subparser.add_argument(
+            "--token-file",
+            help=(
+                "The file with the token required to send the requests, "
+                "as `Authorization: Bearer <token>`. "
+                f"The environment variable `{SERVE_TOKEN_ENV}` is used if "
+                "not given."
+            ),
+        )
+
+    def exec_command(self, args: Namespace) -> None:
+        """Run the command"""
+        from ..server import PipenServer
+
+        if args.token_file:
+            with open(args.token_file) as fh:
+                token = fh.read().strip()
+        else:
+            token = os.environ.get(SERVE_TOKEN_ENV)
+        server = PipenServer(args.host, args.port, args.socket, token)
+        asyncio.run(server.serve())
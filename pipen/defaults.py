@@ -21,11 +21,18 @@ CONFIG_FILES = (
 CONFIG = Diot(
     # pipeline level: The logging level
     loglevel="info",
-    # process level: The cache option, True/False/export
+    # process level: The cache option, True/False/force/content
     cache=True,
     # process level: Whether expand directory to check signature
     dirsig=1,
     # process level:
+    # Whether to record manifests of the input directories in the signature
+    # to skip the unchanged directories when walking them next time
+    # Files modified in place in the directories are NOT detected (the
+    # mtime of a directory only changes when entries are added, removed or
+    # renamed), so only enable it for directories with files replaced
+    dirsig_manifest=False,
+    # process level:
     # How to deal with the errors
     # retry, ignore, halt
     # halt to halt the whole pipeline, no submitting new jobs
@@ -42,9 +49,58 @@ CONFIG = Diot(
     # process level:
     # How many jobs to be submitted in a batch
     submission_batch=8,
+    # process level:
+    # Whether to submit a job once the corresponding jobs of the required
+    # processes are done, instead of waiting for the required processes to
+    # be done. Requires `proc_concurrency` > 1 to take effect
+    streaming=False,
+    # process level:
+    # How many jobs to submit together as one scheduler job
+    # Useful for processes with many small jobs, where the overhead of
+    # submitting and polling the jobs dominates
+    bundle_size=1,
+    # process level:
+    # How many jobs in a bundle to run simultaneously, with `xargs -P`
+    bundle_forks=1,
     # pipeline level:
     # The working directory for the pipeline
     workdir="./.pipen",
+    # pipeline level:
+    # How many processes to run simultaneously
+    # Independent processes (all their required processes are done)
+    # are run at the same time
+    proc_concurrency=1,
+    # pipeline level:
+    # Whether to use the job runtimes recorded in previous runs to start
+    # the processes on the longest remaining path and the longest jobs first
+    prioritize=False,
+    # pipeline level:
+    # Whether to resume from the run state of previous runs, so that the
+    # processes finished with the same configurations and inputs are not
+    # run again, and their jobs are not even built
+    resume=False,
+    # pipeline level:
+    # Whether to release the cached data of the jobs (input, output, etc)
+    # once they are not needed, and compute them again only if needed
+    low_memory=False,
+    # pipeline level:
+    # How many worker processes to render the job scripts with
+    # 0 to render them in threads of the main process
+    render_workers=0,
+    # pipeline level:
+    # Where to keep the signatures of the jobs for caching
+    # toml: a job.signature.toml file for each job
+    # sqlite: one database for all jobs of a process
+    signature_store="toml",
+    # pipeline level:
+    # The max number of jobs running at the same time across all processes
+    # None for no limit
+    max_jobs=None,
+    # pipeline level:
+    # The total amounts of resources shared by the jobs of all processes
+    # For example: {"cpu": 64, "mem": "256G"}
+    # The amounts each job consumes are set by `job_resources` of processes
+    resources=None,
     # process level: template engine
     template="liquid",
     # process level: template options
@@ -71,6 +127,31 @@ CONSOLE_DEFAULT_WIDTH = 2048
 # The markup code is included
 # Don't modify this unless the logger formatter is changed
 CONSOLE_WIDTH_SHIFT = 25
+# The file in the workdir of a process to record the job runtimes
+JOB_RUNTIMES_FILE = "proc.runtimes.toml"
+# The file in the workdir of a process to record the digests of job scripts
+SCRIPT_DIGESTS_FILE = "proc.scripts.toml"
+# The database in the workdir of a process to keep the signatures of the jobs
+# with signature_store="sqlite"
+SIGNATURES_FILE = "proc.signatures.db"
+# How many signatures to write to the database at once
+SIGNATURES_FLUSH_SIZE = 256
+# The file in the workdir of a pipeline to record the finished processes
+RUN_STATE_FILE = "run.state.toml"
+# The file in the workdir of a pipeline to cache the content digests of files
+FILE_DIGESTS_FILE = "file.digests.toml"
+# The max number of digests to keep in the file, only the ones used in the
+# last run are kept if exceeded
+FILE_DIGESTS_MAX_ENTRIES = 100_000
+# Files larger than this are memory-mapped and hashed in chunks of this size
+FILE_DIGESTS_CHUNK_SIZE = 8 * 1024 * 1024
+# The max number of paths to cache the stat results (and the resolved
+# directories) for in a run
+STAT_CACHE_SIZE = 65536
+# The unix socket `pipen serve` listens on by default
+SERVE_SOCKET = "~/.pipen/serve.sock"
+# The environment variable with the token for `pipen serve` over TCP
+SERVE_TOKEN_ENV = "PIPEN_SERVE_TOKEN"
 # For pipen scheduler plugins
 SCHEDULER_ENTRY_GROUP = "pipen_sched"
 # For pipen template plugins
@@ -2,43 +2,138 @@
 from __future__ import annotations
 
 import logging
+import os
 import shlex
 import shutil
-from functools import cached_property
-from os import PathLike
 from pathlib import Path
-from typing import TYPE_CHECKING, Any, Dict, Mapping
+from os import PathLike
+from typing import TYPE_CHECKING, Any, Dict, List, Mapping, Sequence, Type
 
 from diot import OrderedDiot
 from xqute import Job as XquteJob
-from xqute.utils import a_read_text
+from xqute.defaults import DEFAULT_JOB_METADIR
+from xqute.utils import a_write_text
 
 from ._job_caching import JobCaching
+from ._job_store import MISSING, JobStore, StoreColumn
 from .defaults import ProcInputType, ProcOutputType
 from .exceptions import (
-    ProcInputTypeError,
     ProcOutputNameError,
     ProcOutputTypeError,
     TemplateRenderingError,
 )
 from .template import Template
-from .utils import logger, strsplit
+from .utils import logger, script_digest, strsplit
 from .pluginmgr import plugin
 
 if TYPE_CHECKING:  # pragma: no cover
+    from xqute import Scheduler
     from .proc import Proc
 
 
-class Job(XquteJob, JobCaching):
-    """The job for pipen"""
+def _make_outdirs(jobs: Sequence[Job]) -> None:
+    """Create the output directories of the jobs and link them to the
+    metadirs, in one pass for all jobs of a process
+
+    The same as the `outdir` property does for each job, but the exported
+    output directories share the same parent, so the entries of the parent
+    are listed once instead of checking each directory. The links in the
+    metadirs are only replaced if they don't point to the output
+    directories.
+
+    Args:
+        jobs: The jobs
+    """
+    listed: Dict[Path, Dict[str, os.DirEntry]] = {}
+    for job in jobs:
+        outdir = job._outdir
+        metaout = job.metadir / "output"
+        if outdir == metaout:
+            # if it is a dead link
+            # when switching a proc from end/nonend to nonend/end
+            if outdir.is_symlink() and not outdir.exists():
+                outdir.unlink()  # pragma: no cover
+            outdir.mkdir(exist_ok=True)
+            job._store.outdir_made[job.index] = 1
+            continue
+
+        parent = outdir.parent
+        if parent not in listed:
+            parent.mkdir(parents=True, exist_ok=True)
+            with os.scandir(parent) as entries:
+                listed[parent] = {entry.name: entry for entry in entries}
+
+        entry = listed[parent].get(outdir.name)
+        if entry is not None and entry.is_symlink() and not entry.is_dir():
+            outdir.unlink()  # pragma: no cover
+            entry = None
+        if entry is None or not entry.is_dir():
+            outdir.mkdir()
+
+        try:
+            target = os.readlink(metaout)
+        except FileNotFoundError:
+            target = None
+        except OSError:
+            # not a link
+            if metaout.is_dir():
+                shutil.rmtree(metaout)
+            else:
+                metaout.unlink()  # pragma: no cover
+            target = None
+
+        if target != str(outdir):
+            if target is not None:
+                metaout.unlink()
+            metaout.symlink_to(outdir)
+        job._store.outdir_made[job.index] = 1
 
-    __slots__ = ("proc", "_output_types", "_outdir")
 
-    def __init__(self, *args: Any, **kwargs: Any) -> None:
-        super().__init__(*args, **kwargs)
+class Job(XquteJob, JobCaching):
+    """The job for pipen
+
+    The job is a view on the data of the jobs of a process kept in columns
+    (see `JobStore`), it only holds the process and the store itself. A
+    store is created for a job created alone.
+    """
+
+    __slots__ = ("proc", "_store")
+
+    # The states managed by xqute
+    cmd = property(
+        lambda self: self._store.get_cmd(self.index, self.script_file),
+        lambda self, cmd: self._store.set_cmd(
+            self.index,
+            cmd,
+            self.script_file,
+        ),
+    )
+    metadir = property(
+        lambda self: self._store.metadir(self.index),
+        lambda self, metadir: self._store.set_metadir(self.index, metadir),
+    )
+    trial_count = StoreColumn("trial_count")
+    prev_status = StoreColumn("prev_status")
+    _jid = StoreColumn("jids")
+    _status = StoreColumn("status")
+    _rc = StoreColumn("rc")
+    _error_retry = StoreColumn("error_retry", none=-1)
+    _num_retries = StoreColumn("num_retries", none=-1)
+
+    def __init__(
+        self,
+        index: int,
+        cmd: str | List[str],
+        metadir: str | PathLike = DEFAULT_JOB_METADIR,
+        error_retry: bool | None = None,
+        num_retries: int | None = None,
+        store: JobStore | None = None,
+    ) -> None:
+        self._store = JobStore(metadir, index + 1) if store is None else store
+        # The index is needed by the states in the store
+        self.index = index  # type: ignore[misc]
         self.proc: Proc = None
-        self._output_types: Dict[str, str] = {}
-        self._outdir = self.metadir / "output"
+        super().__init__(index, cmd, metadir, error_retry, num_retries)
 
     @property
     def script_file(self) -> Path:
@@ -49,14 +144,52 @@ class Job(XquteJob, JobCaching):
         """
         return self.metadir / "job.script"
 
-    @cached_property
+    @property
+    def bundle(self) -> List[Job]:
+        """The jobs submitted together with this one (see `bundle_size`)"""
+        return self._store.bundles.get(self.index, [])
+
+    @bundle.setter
+    def bundle(self, jobs: List[Job]) -> None:
+        if jobs:
+            self._store.bundles[self.index] = jobs
+        else:
+            self._store.bundles.pop(self.index, None)
+
+    @property
+    def _output_types(self) -> Dict[str, str]:
+        """The types of the outputs, the same for all jobs of a process"""
+        return self._store.output_types
+
+    @property
+    def _outdir(self) -> Path:
+        """The output directory, without creating it"""
+        return self._store.outdir(self.index)
+
+    @property
+    def _script_changed(self) -> bool:
+        """Whether the script is changed but not updated (with dry_run)"""
+        return bool(self._store.script_changed[self.index])
+
+    @_script_changed.setter
+    def _script_changed(self, changed: bool) -> None:
+        self._store.script_changed[self.index] = changed
+
+    @property
     def outdir(self) -> Path:
         """Get the path to the output directory
 
+        The output directories of the jobs are usually created by the
+        process in one pass (see `_make_outdirs()`), this creates the one
+        for a single job otherwise.
+
         Returns:
             The path to the job output directory
         """
-        ret = Path(self._outdir)
+        ret = self._outdir
+        if self._store.outdir_made[self.index]:
+            return ret
+
         # if ret is a dead link
         # when switching a proc from end/nonend to nonend/end
         if ret.is_symlink() and not ret.exists():
@@ -70,31 +203,37 @@ class Job(XquteJob, JobCaching):
             elif metaout.is_dir():
                 shutil.rmtree(metaout)
             metaout.symlink_to(ret)
+        self._store.outdir_made[self.index] = 1
         return ret
 
-    @cached_property
+    @property
     def input(self) -> Mapping[str, Any]:
         """Get the input data for this job
 
+        The types of the values are checked when the input data is converted
+        into columns (see `Proc._compute_input_records()`). The paths are
+        normalized when first accessed, and kept in the store, without
+        modifying the input data.
+
         Returns:
             A key-value map, where keys are the input keys
         """
-        import pandas
-
-        ret = self.proc.input.data.iloc[self.index, :].to_dict()
-        # check types
+        store = self._store
+        index = self.index
+        ret = {key: column[index] for key, column in store.records.items()}
         for inkey, intype in self.proc.input.type.items():
 
             if intype == ProcInputType.VAR or ret[inkey] is None:
-                continue  # pragma: no cover, covered actually
+                continue
 
-            if intype in (ProcInputType.FILE, ProcInputType.DIR):
-                if not isinstance(ret[inkey], (str, PathLike)):
-                    raise ProcInputTypeError(
-                        f"[{self.proc.name}] Got {type(ret[inkey])} instead of "
-                        f"PathLike object for input: {inkey + ':' + intype!r}"
-                    )
+            column = store.inputs.get(inkey)
+            if column is None:
+                column = store.inputs[inkey] = [MISSING] * store.size
+            if column[index] is not MISSING:
+                ret[inkey] = column[index]
+                continue
 
+            if intype in (ProcInputType.FILE, ProcInputType.DIR):
                 # we should use it as a string
                 ret[inkey] = plugin.hooks.norm_inpath(
                     self,
@@ -103,29 +242,24 @@ class Job(XquteJob, JobCaching):
                 )
 
             if intype in (ProcInputType.FILES, ProcInputType.DIRS):
-                if isinstance(ret[inkey], pandas.DataFrame):
-                    # // todo: nested dataframe
-                    ret[inkey] = ret[inkey].iloc[0, 0]  # pragma: no cover
-
-                if not isinstance(ret[inkey], (list, tuple)):
-                    raise ProcInputTypeError(
-                        f"[{self.proc.name}] Expected a sequence for input: "
-                        f"{inkey + ':' + intype!r}, got {type(ret[inkey])}"
-                    )
-
-                for i, file in enumerate(ret[inkey]):
-                    ret[inkey][i] = plugin.hooks.norm_inpath(
+                ret[inkey] = [
+                    plugin.hooks.norm_inpath(
                         self,
                         file,
                         intype == ProcInputType.DIRS,
                     )
+                    for file in ret[inkey]
+                ]
+            column[index] = ret[inkey]
 
         return ret
 
-    @cached_property
+    @property
     def output(self) -> Mapping[str, Any]:
         """Get the output data of the job
 
+        The output is rendered when first accessed, and kept in the store.
+
         Returns:
             The key-value map where the keys are the output keys
         """
@@ -133,6 +267,26 @@ class Job(XquteJob, JobCaching):
         if not output_template:
             return {}
 
+        store = self._store
+        index = self.index
+        if not store.output_done(index):
+            self._render_output(output_template)
+
+        return OrderedDiot(
+            [
+                (key, column[index])
+                for key, column in store.outputs.items()
+                if column[index] is not MISSING
+            ]
+        )
+
+    def _render_output(self, output_template: Any) -> None:
+        """Render the output of the job into the store
+
+        Args:
+            output_template: The output template(s) of the process
+        """
+        input = self.input
         data = {
             "job": dict(
                 index=self.index,
@@ -142,8 +296,8 @@ class Job(XquteJob, JobCaching):
                 stderr_file=str(self.stderr_file),
                 jid_file=str(self.jid_file),
             ),
-            "in": self.input,
-            "in_": self.input,
+            "in": input,
+            "in_": input,
             "proc": self.proc,
             "envs": self.proc.envs,
         }
@@ -158,7 +312,7 @@ class Job(XquteJob, JobCaching):
                 f"[{self.proc.name}] Failed to render output."
             ) from exc
 
-        ret = OrderedDiot()
+        ret = {}
         for oput in outputs:
             if ":" not in oput:
                 raise ProcOutputNameError(
@@ -187,16 +341,19 @@ class Job(XquteJob, JobCaching):
                     output_type == ProcOutputType.DIR,
                 )
 
-        return ret
+        for output_name, output_value in ret.items():
+            self._store.set_output(self.index, output_name, output_value)
 
-    @cached_property
+    @property
     def template_data(self) -> Mapping[str, Any]:
         """Get the data for template rendering
 
+        It is not kept, as it is only needed to render the script.
+
         Returns:
             The data for template rendering
         """
-
+        input = self.input
         return {
             "job": dict(
                 index=self.index,
@@ -206,13 +363,93 @@ class Job(XquteJob, JobCaching):
                 stderr_file=str(self.stderr_file),
                 jid_file=str(self.jid_file),
             ),
-            "in": self.input,
-            "in_": self.input,
+            "in": input,
+            "in_": input,
             "out": self.output,
             "proc": self.proc,
             "envs": self.proc.envs,
         }
 
+    async def wrapped_script(self, scheduler: Scheduler) -> PathLike:
+        """Get the wrapped script to submit
+
+        If other jobs are submitted together with this one, the script runs
+        the wrapped scripts of all of them (see `bundle_script()`).
+
+        Args:
+            scheduler: The scheduler
+
+        Returns:
+            The path of the wrapped script
+        """
+        wrapped = await super().wrapped_script(scheduler)
+        if not self.bundle:
+            return wrapped
+
+        scripts = [wrapped]
+        for job in self.bundle:
+            scripts.append(await job.wrapped_script(scheduler))
+        return await self.bundle_script(scheduler, scripts)
+
+    async def bundle_script(
+        self,
+        scheduler: Scheduler,
+        scripts: Sequence[PathLike],
+    ) -> PathLike:
+        """Write the script to run the wrapped scripts of a bundle
+
+        The wrapped scripts are run one by one, or with `xargs -P` if
+        `bundle_forks` > 1. Each of them still updates the status, rc,
+        stdout and stderr files of its own job.
+
+        Args:
+            scheduler: The scheduler
+            scripts: The wrapped scripts of this job and the jobs bundled
+
+        Returns:
+            The path of the script
+        """
+        shell = self.__class__.CMD_WRAPPER_SHELL
+        if self.proc.bundle_forks > 1:
+            quoted = " ".join(shlex.quote(str(script)) for script in scripts)
+            cmd = (
+                f"printf '%s\\0' {quoted} | "
+                f"xargs -0 -n 1 -P {self.proc.bundle_forks} {shell}"
+            )
+        else:
+            cmd = "\n".join(
+                f"{shell} {shlex.quote(str(script))}" for script in scripts
+            )
+
+        # Don't exit on errors, the jobs are failed individually
+        bundle_script = self.metadir / f"job.bundle.{scheduler.name}"
+        await a_write_text(
+            bundle_script,
+            f"{self.shebang(scheduler)}\n\n{cmd}\n",
+        )
+        return bundle_script
+
+    def release_caches(self) -> None:
+        """Release the input and output kept in the store to save memory
+
+        They are computed again when accessed. The output directory is
+        kept, as computing it touches the file system.
+        """
+        self._store.release(self.index)
+
+    def bundled_jid(self, scheduler: Scheduler, index: int) -> int | str:
+        """Get the jid of a job submitted together with this one
+
+        Args:
+            scheduler: The scheduler
+            index: The index of the job in the bundle, 0 for this job
+                itself, and starting from 1 for the jobs in `self.bundle`
+
+        Returns:
+            The jid of the job
+        """
+        return self.jid
+
     def log(
         self,
         level: int | str,
@@ -247,7 +484,7 @@ class Job(XquteJob, JobCaching):
 
         self.proc.log(level, job_index_indicator + msg, *args, logger=logger)
 
-    async def prepare(self, proc: Proc) -> None:
+    async def prepare(self, proc: Proc, dry_run: bool = False) -> None:
         """Prepare the job by given process
 
         Primarily prepare the script, and provide cmd to the job for xqute
@@ -255,25 +492,48 @@ class Job(XquteJob, JobCaching):
 
         Args:
             proc: the process object
+            dry_run: Don't write the script file, but only check whether
+                it is changed.
+        """
+        self._prepare(proc, dry_run)
+
+    def _prepare(
+        self,
+        proc: Proc,
+        dry_run: bool = False,
+        render: bool = True,
+    ) -> None:
+        """Prepare the job by given process, synchronously
+
+        The work is mostly template rendering and file I/O, so it blocks.
+        `Proc._init_jobs()` runs it in a thread pool.
+
+        Args:
+            proc: the process object
+            dry_run: Don't write the script file, but only check whether
+                it is changed.
+            render: Whether to render the script. If False, the script is
+                rendered later by the process in worker processes, and set
+                by `_set_script()`.
         """
         # Attach the process
         self.proc = proc
 
-        if self.proc.export and len(self.proc.jobs) == 1:
-            # Don't put index if it is a single-job process
-            self._outdir = Path(self.proc.pipeline.outdir) / self.proc.name
-
-        elif self.proc.export:
-            self._outdir = (
-                Path(self.proc.pipeline.outdir)
-                / self.proc.name
-                / str(self.index)
-            )
+        if dry_run:
+            # Use the output directory without creating it or linking it
+            # to the metadir (see the outdir property)
+            self._store.outdir_made[self.index] = 1
 
         if not proc.script:
             self.cmd = []
             return
 
+        if not render:
+            # Compute the output in the thread, the script is rendered later
+            # in worker processes (see `Proc._render_scripts()`)
+            self.output
+            return
+
         template_data = self.template_data
         try:
             script = proc.script.render(template_data)
@@ -281,14 +541,87 @@ class Job(XquteJob, JobCaching):
             raise TemplateRenderingError(
                 f"[{self.proc.name}] Failed to render script."
             ) from exc
-        if (
-            self.script_file.is_file()
-            and await a_read_text(self.script_file) != script
-        ):
-            self.log("debug", "Job script updated.")
-            self.script_file.write_text(script)
-        elif not self.script_file.is_file():
-            self.script_file.write_text(script)
+        self._set_script(proc, script, dry_run)
+
+    def _worker_template_data(
+        self,
+        proc_data: Mapping[str, Any],
+    ) -> Mapping[str, Any]:
+        """Get the data to render the script in a worker process
+
+        Args:
+            proc_data: The data of the process to replace the process
+                object, which can't be sent to other processes
+
+        Returns:
+            The data for template rendering
+        """
+        data = dict(self.template_data)
+        data["proc"] = proc_data
+        return data
+
+    def _set_script(
+        self,
+        proc: Proc,
+        script: str,
+        dry_run: bool = False,
+    ) -> None:
+        """Compare the rendered script with the one written in previous
+        runs, and set the command to run it
+
+        The digest recorded for the job is trusted, so the script file is
+        only checked when the digest is missing or different.
+
+        Args:
+            proc: the process object
+            script: The rendered script
+            dry_run: Don't write the script file, but only check whether
+                it is changed.
+        """
+        digest = script_digest(script)
+        recorded = proc._script_digests.get(self.index)
+        exists = changed = recorded != digest
+        if changed:
+            exists = self.script_file.is_file()
+            if exists and recorded is None:
+                # The script was written before the digests are recorded
+                recorded = script_digest(self.script_file.read_text())
+            changed = not exists or recorded != digest
+
+        if dry_run:
+            self._script_changed = changed
+            return
+
+        if changed:
+            if exists:
+                self.log("debug", "Job script updated.")
+            if proc.pipeline.config.low_memory:
+                # Don't keep the scripts of all jobs in memory
+                self.script_file.write_text(script)
+            else:
+                # Written in batches by the process once all jobs
+                # are prepared
+                proc._scripts_to_write.append((self.script_file, script))
+        proc._script_digests[self.index] = digest
 
         lang = proc.lang or proc.pipeline.config.lang
         self.cmd = shlex.split(lang) + [self.script_file]  # type: ignore
+
+
+# The original prepare() of Job, see `_prepare_overridden()`
+_JOB_PREPARE = Job.prepare
+
+
+def _prepare_overridden(job_class: Type[Job]) -> bool:
+    """Check whether `Job.prepare()` is overridden by a subclass or patched
+
+    The jobs are prepared with `Job._prepare()` in a thread pool by the
+    process, unless `prepare()` is overridden, which has to be called then.
+
+    Args:
+        job_class: The job class
+
+    Returns:
+        True if `prepare()` is overridden otherwise False
+    """
+    return job_class.prepare is not _JOB_PREPARE
@@ -2,18 +2,46 @@
 from __future__ import annotations
 
 import asyncio
+import copy
+import heapq
+import signal
 from os import PathLike
 from pathlib import Path
-from typing import Any, ClassVar, Iterable, List, Sequence, Type
+from typing import (
+    Any,
+    Callable,
+    ClassVar,
+    Dict,
+    Iterable,
+    List,
+    Sequence,
+    Set,
+    Tuple,
+    Type,
+)
 
 from diot import Diot
 from rich import box
 from rich.panel import Panel
 from rich.text import Text
 from simpleconf import ProfileConfig
+from simpleconf.utils import config_to_ext, get_loader
 from varname import varname, VarnameException
 
-from .defaults import CONFIG, CONFIG_FILES
+from ._file_digests import FileDigests
+from ._run_state import (
+    RunState,
+    pipeline_fingerprint,
+    proc_fingerprint,
+    proc_input_files,
+)
+from .defaults import (
+    CONFIG,
+    CONFIG_FILES,
+    FILE_DIGESTS_FILE,
+    RUN_STATE_FILE,
+    STAT_CACHE_SIZE,
+)
 from .exceptions import (
     PipenOrProcNameError,
     ProcDependencyError,
@@ -22,16 +50,58 @@ from .exceptions import (
 from .pluginmgr import plugin
 from .proc import Proc
 from .progressbar import PipelinePBar
+from .resource import ResourcePool
 from .utils import (
+    StatCache,
     copy_dict,
     desc_from_docstring,
     get_logpanel_width,
     is_valid_name,
+    load_job_runtimes,
     log_rich_renderable,
     logger,
     pipen_banner,
 )
 
+# The configurations loaded from the configuration files, with the paths
+# as keys and the modification times and the configurations as values
+_CONFIG_FILES_CACHE: Dict[str, Tuple[float, Dict[str, Any]]] = {}
+
+
+def _load_config_files() -> List[Any]:
+    """Load the configurations from the configuration files
+
+    A file is only parsed again when it is modified, so that the files are
+    not parsed for every run in a long-lived process (e.g. `pipen serve`).
+    The configurations from the environment variables are not cached.
+
+    Returns:
+        The configurations by profiles of the existing files, and the
+        environment variable source to be loaded by `ProfileConfig.load()`
+    """
+    configs: List[Any] = []
+    for config_file in CONFIG_FILES:
+        ext = config_to_ext(config_file)
+        if ext == "osenv":
+            configs.append(config_file)
+            continue
+
+        path = Path(config_file).resolve()
+        try:
+            mtime = path.stat().st_mtime
+        except FileNotFoundError:
+            continue
+
+        cached = _CONFIG_FILES_CACHE.get(str(path))
+        if not cached or cached[0] != mtime:
+            cached = (
+                mtime,
+                get_loader(ext).load_with_profiles(path, ignore_nonexist=True),
+            )
+            _CONFIG_FILES_CACHE[str(path)] = cached
+        configs.append(copy.deepcopy(cached[1]))
+    return configs
+
 
 class Pipen:
     """The Pipen class provides interface to assemble and run the pipeline
@@ -42,6 +112,7 @@ class Pipen:
         outdir: The output directory of the results
         procs: The processes
         pbar: The progress bar
+        pool: The pool of job slots and resources shared by the processes
         starts: The start processes
         config: The configurations
         workdir: The workdir for the pipeline
@@ -77,7 +148,26 @@ class Pipen:
     ) -> None:
         """Constructor"""
         self.procs: List[Proc] = None
+        # The targets that self.procs are built for
+        self._procs_targets: Tuple[Type[Proc] | str, ...] | None = None
         self.pbar: PipelinePBar = None
+        self.pool: ResourcePool = None
+        self.run_state: RunState = None
+        # The cached content digests of files for cache="content"
+        self.file_digests: FileDigests = None
+        # The cached stat results of paths for a run
+        self.stat_cache: StatCache = None
+        self._running_procs: List[Proc] = []
+        # The processes resumed from the run state
+        self._resumed_procs: Set[Type[Proc]] = set()
+        # The input files of the start processes, to check if the pipeline
+        # is unchanged in the next run
+        self._input_files: List[str] = []
+        # The handler of the signals, re-installed once the xqute of a
+        # process is built, as xqute takes over the signals. None to let
+        # signals cancel the running processes of this pipeline. Set by the
+        # caller handling the signals itself (e.g. `pipen serve`)
+        self._signal_handler: Callable[[signal.Signals], Any] | None = None
         if name is not None:
             self.name = name
         elif self.__class__.name is not None:
@@ -148,6 +238,8 @@ class Pipen:
             plugins = self.config.plugins
         self.plugin_context = plugin.plugins_context(plugins)
         self.plugin_context.__enter__()
+        # Exited once a run or plan is done, entered again by the next one
+        self._plugin_context_entered = True
 
         # make sure core plugin is enabled
         plugin.get_plugin("core").enable()
@@ -164,11 +256,22 @@ class Pipen:
     def __init_subclass__(cls) -> None:
         cls.PIPELINE_COUNT = 0
 
-    async def async_run(self, profile: str = "default") -> bool:
-        """Run the processes one by one
+    async def async_run(
+        self,
+        profile: str = "default",
+        targets: Sequence[Type[Proc] | str] | None = None,
+    ) -> bool:
+        """Run the processes
+
+        Processes are started as soon as all their required processes are
+        done, with at most `proc_concurrency` processes running at the
+        same time.
 
         Args:
             profile: The default profile to use for the run
+            targets: The processes (or their names) to run. If given, only
+                these processes and the processes they require (directly or
+                indirectly) are run. Other processes are not instantiated.
 
         Returns:
             True if the pipeline ends successfully else False
@@ -181,28 +284,36 @@ class Pipen:
         await self._init()
         logger.setLevel(self.config.loglevel.upper())
         log_rich_renderable(pipen_banner(), "magenta", logger.info)
+        self.pool = ResourcePool(self.config.max_jobs, self.config.resources)
+        self.run_state = RunState(self.workdir / RUN_STATE_FILE)
+        self.file_digests = FileDigests(self.workdir / FILE_DIGESTS_FILE)
+        self._resumed_procs.clear()
+        self.stat_cache = StatCache(STAT_CACHE_SIZE)
+        self._input_files.clear()
         try:
-            self.build_proc_relationships()
+            self.build_proc_relationships(targets)
             self._log_pipeline_info()
             await plugin.hooks.on_start(self)
-            for proc in self.procs:
-                self.pbar.update_proc_running()
-                proc_obj = proc(self)  # type: ignore
-                if proc in self.starts and proc.input_data is None:
-                    proc_obj.log(
-                        "warning",
-                        "This is a start process, "
-                        "but no 'input_data' specified.",
+            fingerprint = (
+                pipeline_fingerprint(self) if self.config.resume else None
+            )
+            if fingerprint is not None and self.run_state.restore_pipeline(
+                self,
+                fingerprint,
+            ):
+                logger.info("")
+                logger.info(
+                    "Pipeline is unchanged since the last run, "
+                    "output data of all processes restored."
+                )
+            else:
+                succeeded = await self._run_procs()
+                if succeeded and fingerprint is not None:
+                    self.run_state.record_pipeline(
+                        self,
+                        fingerprint,
+                        self._input_files,
                     )
-                await proc_obj.init()
-                await proc_obj.run()
-                if proc_obj.succeeded:
-                    self.pbar.update_proc_done()
-                else:
-                    self.pbar.update_proc_error()
-                    succeeded = False
-                    break
-                proc_obj.gc()
 
             logger.info("")
         except Exception:
@@ -211,6 +322,7 @@ class Pipen:
             await plugin.hooks.on_complete(self, succeeded)
         finally:
             self.plugin_context.__exit__()
+            self._plugin_context_entered = False
             if self.pbar:
                 self.pbar.done()
 
@@ -219,6 +331,7 @@ class Pipen:
     def run(
         self,
         profile: str = "default",
+        targets: Sequence[Type[Proc] | str] | None = None,
     ) -> bool:
         """Run the pipeline with the given profile
         This is just a sync wrapper for the async `async_run` function using
@@ -226,11 +339,105 @@ class Pipen:
 
         Args:
             profile: The default profile to use for the run
+            targets: The processes (or their names) to run, together with
+                the processes they require. Run all processes if not given.
 
         Returns:
             True if the pipeline ends successfully else False
         """
-        return asyncio.run(self.async_run(profile))
+        return asyncio.run(self.async_run(profile, targets))
+
+    async def async_plan(
+        self,
+        profile: str = "default",
+        targets: Sequence[Type[Proc] | str] | None = None,
+    ) -> Dict[str, Dict[int, str | None]]:
+        """Check which jobs would run, without running anything
+
+        Nothing is submitted, and the outputs are not cleared. A job is
+        also regarded to run if the corresponding job of a required
+        process is to run (any job of the required process if `input_data`
+        is a callback), since its input will then be newer.
+
+        Args:
+            profile: The default profile to use
+            targets: The processes (or their names) to plan, together with
+                the processes they require. Plan all processes if not given.
+
+        Returns:
+            A dict with process names as keys and dicts as values, with job
+            indexes as keys and the reasons why the jobs would run as values
+            (None for cached jobs)
+        """
+        self.profile = profile
+        self.workdir = Path(self.config.workdir) / self.name
+        self.stat_cache = StatCache(STAT_CACHE_SIZE)
+
+        await self._init()
+        try:
+            logger.setLevel(self.config.loglevel.upper())
+            self.file_digests = FileDigests(self.workdir / FILE_DIGESTS_FILE)
+            self.build_proc_relationships(targets)
+
+            plans: Dict[str, Dict[int, str | None]] = {}
+            for proc in self.procs:
+                proc_obj = proc(self)  # type: ignore
+                proc_obj.stat_cache = self.stat_cache
+                plan = await proc_obj.plan()
+                for req in proc.requires or ():  # type: ignore
+                    req_plan = plans[req.name]
+                    req_size = len(req_plan)
+                    for index, reason in plan.items():
+                        if reason is not None:
+                            continue
+                        if callable(proc.input_data):
+                            running = any(
+                                rsn is not None for rsn in req_plan.values()
+                            )
+                        else:
+                            # No job to run if the required process has none
+                            running = (
+                                req_size > 0
+                                and req_plan[min(index, req_size - 1)]
+                                is not None
+                            )
+                        if running:
+                            plan[index] = f"required job to run: {req.name}"
+
+                to_run = sum(reason is not None for reason in plan.values())
+                proc_obj.log(
+                    "info",
+                    "%s job(s) to run, %s cached.",
+                    to_run,
+                    len(plan) - to_run,
+                )
+                plans[proc.name] = plan
+                proc_obj.gc()
+        finally:
+            self.plugin_context.__exit__()
+            self._plugin_context_entered = False
+
+        return plans
+
+    def plan(
+        self,
+        profile: str = "default",
+        targets: Sequence[Type[Proc] | str] | None = None,
+    ) -> Dict[str, Dict[int, str | None]]:
+        """Check which jobs would run, without running anything
+        This is just a sync wrapper for the async `async_plan` function using
+        `asyncio.run()`
+
+        Args:
+            profile: The default profile to use
+            targets: The processes (or their names) to plan, together with
+                the processes they require. Plan all processes if not given.
+
+        Returns:
+            The reasons why the jobs would run, by process names and job
+            indexes (None for cached jobs)
+        """
+        return asyncio.run(self.async_plan(profile, targets))
 
     def set_data(self, *indata: Any) -> Pipen:
         """Set the input_data for start processes
@@ -301,6 +508,270 @@ class Pipen:
     # In case people forget the "s"
     set_start = set_starts
 
+    async def _run_proc(
+        self,
+        proc: Type[Proc],
+        initialized: asyncio.Event,
+        streaming_requires: Sequence[Proc] = (),
+    ) -> bool:
+        """Instantiate, initialize and run a single process
+
+        Args:
+            proc: The process class
+            initialized: The event to set once the process is initialized
+            streaming_requires: The required processes that are still
+                running, whose jobs the jobs of this process are streamed from
+
+        Returns:
+            True if the process succeeded else False
+        """
+        self.pbar.update_proc_running()
+        proc_obj = proc(self)  # type: ignore
+        proc_obj.stat_cache = self.stat_cache
+        if proc in self.starts and proc.input_data is None:
+            proc_obj.log(
+                "warning",
+                "This is a start process, "
+                "but no 'input_data' specified.",
+            )
+        if streaming_requires:
+            proc_obj.log(
+                "info",
+                "Streaming jobs from: %s",
+                [req.name for req in streaming_requires],
+            )
+        fingerprint = None
+        if self.config.resume:
+            fingerprint = proc_fingerprint(proc_obj)
+            if not proc.requires:
+                self._input_files.extend(proc_input_files(proc_obj))
+            if self._resume(proc_obj, fingerprint):
+                initialized.set()
+                self.pbar.update_proc_done()
+                return True
+
+            # The process is about to run, its outputs are not reliable
+            # anymore
+            self.run_state.forget(proc_obj.name)
+        proc_obj.streaming_requires = list(streaming_requires)
+        await proc_obj.init()
+        self._running_procs.append(proc_obj)
+        self._register_signal_handlers()
+        initialized.set()
+        try:
+            await proc_obj.run()
+        finally:
+            self._running_procs.remove(proc_obj)
+
+        if not proc_obj.succeeded:
+            self.pbar.update_proc_error()
+            return False
+
+        self.pbar.update_proc_done()
+        if self.config.resume:
+            self.run_state.record(
+                proc_obj,
+                fingerprint,
+                proc_obj.jobs[0]._output_types if proc_obj.jobs else {},
+            )
+        proc_obj.gc()
+        return True
+
+    def _resume(self, proc_obj: Proc, fingerprint: str | None) -> bool:
+        """Try to resume a process from the run state
+
+        A process is resumed when `resume` is enabled and caching is not
+        disabled for it, all its required processes are resumed, and it was
+        finished in a previous run with the same fingerprint.
+
+        Args:
+            proc_obj: The process object
+            fingerprint: The fingerprint of the process in this run
+
+        Returns:
+            True if the process is resumed, with its `output_data` restored
+        """
+        cache = (
+            self.config.cache if proc_obj.cache is None else proc_obj.cache
+        )
+        if (
+            not self.config.resume
+            or not cache
+            or not all(
+                req in self._resumed_procs
+                for req in proc_obj.requires or ()  # type: ignore
+            )
+        ):
+            return False
+
+        output_data = self.run_state.restore(proc_obj, fingerprint)
+        if output_data is None:
+            return False
+
+        proc_obj.__class__.output_data = output_data
+        self._resumed_procs.add(proc_obj.__class__)
+        proc_obj.log(
+            "info",
+            "Resumed from the previous run, %s job(s) skipped.",
+            output_data.shape[0],
+        )
+        return True
+
+    async def _run_procs(self) -> bool:
+        """Run the processes following the dependency graph
+
+        A process is started once all its required processes have succeeded,
+        or, with `streaming` enabled, once the running ones of them are
+        initialized.
+        Once a process fails, no more processes will be started, but the
+        running ones are waited to finish.
+
+        Returns:
+            True if all processes succeeded else False
+        """
+        concurrency = max(int(self.config.proc_concurrency or 1), 1)
+        # Keep the order of self.procs, so that processes are started
+        # in the same order as they are run one by one
+        pending: List[Type[Proc]] = list(self.procs)  # type: ignore
+        if self.config.prioritize:
+            priorities = self._proc_priorities()
+            # sort is stable, so the order is kept for the same priorities
+            pending.sort(key=lambda proc: -priorities[proc])
+        done: Set[Type[Proc]] = set()
+        running: Dict[asyncio.Task, Type[Proc]] = {}
+        initialized = asyncio.Event()
+        succeeded = True
+        try:
+            while pending or running:
+                if succeeded:
+                    initialized_procs = {
+                        proc_obj.__class__: proc_obj
+                        for proc_obj in self._running_procs
+                    }
+                    for proc in list(pending):
+                        if len(running) >= concurrency:
+                            break
+
+                        requires: Sequence[Type[Proc]] = (
+                            proc.requires or ()  # type: ignore
+                        )
+                        if all(req in done for req in requires):
+                            streaming_requires = []
+                        elif self._can_stream(proc) and all(
+                            req in done or req in initialized_procs
+                            for req in requires
+                        ):
+                            streaming_requires = [
+                                initialized_procs[req]
+                                for req in requires
+                                if req not in done
+                            ]
+                        else:
+                            continue
+
+                        pending.remove(proc)
+                        task = asyncio.ensure_future(
+                            self._run_proc(
+                                proc,
+                                initialized,
+                                streaming_requires,
+                            )
+                        )
+                        running[task] = proc
+
+                if not running:
+                    break
+
+                initialized.clear()
+                waiter = asyncio.ensure_future(initialized.wait())
+                finished, _ = await asyncio.wait(
+                    [*running, waiter],
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                waiter.cancel()
+                for task in finished:
+                    if task is waiter:
+                        continue
+                    proc = running.pop(task)
+                    if task.result():
+                        done.add(proc)
+                    else:
+                        succeeded = False
+        finally:
+            for task in running:
+                task.cancel()
+
+        return succeeded
+
+    def _proc_priorities(self) -> Dict[Type[Proc], float]:
+        """Estimate the length of the longest remaining path from each
+        process to the end of the pipeline
+
+        The time a process takes is estimated from the job runtimes recorded
+        in previous runs, as the longest job or the total time divided by
+        `forks`, whichever is larger.
+
+        Returns:
+            A dict with the processes as keys and the estimated lengths of
+            the longest remaining paths in seconds as values
+        """
+        priorities: Dict[Type[Proc], float] = {}
+        # self.procs is topologically sorted, so the next processes
+        # are visited first in reverse order
+        for proc in reversed(self.procs):
+            runtimes = load_job_runtimes(self.workdir / proc.name).values()
+            forks = proc.forks or self.config.forks
+            cost = (
+                max(max(runtimes), sum(runtimes) / forks) if runtimes else 0.0
+            )
+            priorities[proc] = cost + max(  # type: ignore
+                (priorities[nxt] for nxt in proc.nexts or () if nxt in priorities),
+                default=0.0,
+            )
+        return priorities
+
+    def _can_stream(self, proc: Type[Proc]) -> bool:
+        """Check if the jobs of a process can be streamed from its
+        required processes
+
+        The jobs are not streamable if the input data is computed from the
+        whole output data of the required processes by a callback.
+
+        Args:
+            proc: The process class
+
+        Returns:
+            True if the jobs can be streamed otherwise False
+        """
+        streaming = (
+            self.config.streaming if proc.streaming is None else proc.streaming
+        )
+        return bool(streaming) and not callable(proc.input_data)
+
+    def _register_signal_handlers(self) -> None:
+        """Let signals cancel all running processes, or call the signal
+        handler set by the caller
+
+        Each `Xqute` object registers the signal handlers for itself only,
+        which replaces the ones registered by other running processes, or
+        by the caller. So this is called once the `Xqute` object of a
+        process is built.
+        """
+        loop = asyncio.get_running_loop()
+        handler = self._signal_handler
+        if handler is None:
+            xqutes = [proc.xqute for proc in self._running_procs]
+
+            def _cancel(sig: signal.Signals) -> None:
+                for xqute in xqutes:
+                    if xqute._cancelling is False:
+                        xqute.cancel(sig)
+
+            handler = _cancel
+
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, handler, sig)
+
     def _log_pipeline_info(self) -> None:
         """Print the information of the pipeline"""
         logger.info("")
@@ -328,16 +799,29 @@ class Pipen:
         for i, plug in enumerate(enabled_plugins):
             logger.info(fmt, "plugins" if i == 0 else "", plug)
         logger.info(fmt, "# procs", len(self.procs))
+        logger.info(fmt, "proc_concurrency", self.config.proc_concurrency)
         logger.info(fmt, "profile", self.profile)
         logger.info(fmt, "outdir", self.outdir)
+        logger.info(fmt, "bundle_forks", self.config.bundle_forks)
+        logger.info(fmt, "bundle_size", self.config.bundle_size)
         logger.info(fmt, "cache", self.config.cache)
         logger.info(fmt, "dirsig", self.config.dirsig)
+        logger.info(fmt, "dirsig_manifest", self.config.dirsig_manifest)
         logger.info(fmt, "error_strategy", self.config.error_strategy)
         logger.info(fmt, "forks", self.config.forks)
         logger.info(fmt, "lang", self.config.lang)
         logger.info(fmt, "loglevel", self.config.loglevel)
+        logger.info(fmt, "low_memory", self.config.low_memory)
+        logger.info(fmt, "max_jobs", self.config.max_jobs)
         logger.info(fmt, "num_retries", self.config.num_retries)
+        logger.info(fmt, "prioritize", self.config.prioritize)
+        logger.info(fmt, "render_workers", self.config.render_workers)
+        for i, (key, val) in enumerate((self.config.resources or {}).items()):
+            logger.info(fmt, "resources" if i == 0 else "", f"{key}={val}")
+        logger.info(fmt, "resume", self.config.resume)
         logger.info(fmt, "scheduler", self.config.scheduler)
+        logger.info(fmt, "signature_store", self.config.signature_store)
+        logger.info(fmt, "streaming", self.config.streaming)
         logger.info(fmt, "submission_batch", self.config.submission_batch)
         logger.info(fmt, "template", self.config.template)
         logger.info(fmt, "workdir", self.workdir)
@@ -361,10 +845,14 @@ class Pipen:
         4. **kwargs from Pipen(..., **kwargs)
         5. Those defined in each Proc class
         """
+        if not self._plugin_context_entered:
+            self.plugin_context.__enter__()
+            self._plugin_context_entered = True
+
         # Then load the configurations from config files
         config = ProfileConfig.load(
             {"default": self.config},
-            *CONFIG_FILES,
+            *_load_config_files(),
             ignore_nonexist=True,
         )
         self.config = ProfileConfig.use_profile(
@@ -384,11 +872,31 @@ class Pipen:
         self.config.plugin_opts.update(self._kwargs.pop("plugin_opts", {}))
         self.config.update(self._kwargs)
 
-    def build_proc_relationships(self) -> None:
-        """Build the proc relationships for the pipeline"""
-        if self.procs:
+    def build_proc_relationships(
+        self,
+        targets: Sequence[Type[Proc] | str] | None = None,
+    ) -> None:
+        """Build the proc relationships for the pipeline
+
+        The relationships are built again if they are built for other
+        targets.
+
+        Args:
+            targets: The processes (or their names) to keep, together with
+                the processes they require. Keep all processes if not given.
+
+        Raises:
+            ProcDependencyError: When a target is not in the pipeline
+        """
+        if isinstance(targets, (str, type)):
+            targets = [targets]
+        targets = tuple(targets or ())
+        if self.procs and targets == self._procs_targets:
             return
 
+        # Built again next time in case of failures
+        self._procs_targets = None
+
         if not self.starts:
             raise ProcDependencyError(
                 "No start processes specified. "
@@ -398,49 +906,115 @@ class Pipen:
         # build proc relationships
         # Allow starts to be set as a tuple
         self.procs = list(self.starts)
-        nexts = set(
-            sum((proc.nexts or [] for proc in self.procs), [])  # type: ignore
-        )
+        added: Set[Type[Proc]] = set(self.procs)  # type: ignore
+        names: Set[str] = {proc.name for proc in self.procs}
+        # The discovered processes that are not added yet, with their
+        # required processes that are not added yet
+        unmet: Dict[Type[Proc], Set[Type[Proc]]] = {}
+        # The processes ready to be added, ordered by (order, name), which
+        # is how we break the ties between them
+        ready: List[Tuple[int, str, int, Type[Proc]]] = []
+        counter = 0
+
+        def sort_key(prc: Type[Proc]) -> Tuple[int, str]:
+            return (prc.order or 0, prc.name)
+
+        def discover(proc: Type[Proc]) -> None:
+            """Visit the next processes of a process that is just added"""
+            nonlocal counter
+            for nxt in proc.nexts or ():
+                if nxt in added:
+                    raise ProcDependencyError(f"Cyclic dependency: {nxt.name}")
+
+                if nxt not in unmet:
+                    unmet[nxt] = set(nxt.requires or ()) - added  # type: ignore
+                elif not unmet[nxt]:
+                    # already ready
+                    continue
+                else:
+                    unmet[nxt].discard(proc)
+
+                if not unmet[nxt]:
+                    heapq.heappush(ready, (*sort_key(nxt), counter, nxt))
+                    counter += 1
+
         logger.debug("")
         logger.debug("Building process relationships:")
         logger.debug("- Start processes: %s", self.procs)
-        while nexts:
-            logger.debug("- Next processes: %s", nexts)
-            # pick up one that can be added to procs
-            for proc in sorted(
-                nexts, key=lambda prc: (prc.order or 0, prc.name)
-            ):
-                if proc in self.procs:
-                    raise ProcDependencyError(
-                        f"Cyclic dependency: {proc.name}"
-                    )
+        for proc in self.procs:
+            discover(proc)  # type: ignore
+
+        while ready:
+            *_, proc = heapq.heappop(ready)
+            del unmet[proc]
+            if proc.name in names:
+                raise PipenOrProcNameError(
+                    f"'{proc.name}' is already used by another process."
+                )
+
+            logger.debug("- Adding process: %s", proc)
+            self.procs.append(proc)  # type: ignore
+            added.add(proc)
+            names.add(proc.name)
+            discover(proc)
 
-                if proc.name in [p.name for p in self.procs]:
+        if unmet:
+            for proc in sorted(unmet, key=sort_key):
+                if proc.name in names:
                     raise PipenOrProcNameError(
                         f"'{proc.name}' is already used by another process."
                     )
+            raise ProcDependencyError(
+                f"No available next processes for {set(unmet)}. "
+                "Did you forget to start with their "
+                "required processes?"
+            )
 
-                # Add proc to self.procs if all their requires
-                # are added to self.procs
-                # Then remove proc from nexts
-                # If there are still procs in nexts
-                # meaning some requires of those procs cannot run before
-                # those procs.
-                if not set(proc.requires) - set(self.procs):  # type: ignore
-                    self.procs.append(proc)  # type: ignore
-                    nexts.remove(proc)
-                    nexts |= set(proc.nexts or ())
-                    break
-            else:
-                if nexts:
-                    raise ProcDependencyError(
-                        f"No available next processes for {nexts}. "
-                        "Did you forget to start with their "
-                        "required processes?"
-                    )
+        if targets:
+            self.procs = self._procs_for_targets(targets)
+        self._procs_targets = targets
 
         self.pbar = PipelinePBar(len(self.procs), self.name.upper())
 
+    def _procs_for_targets(
+        self,
+        targets: Sequence[Type[Proc] | str],
+    ) -> List[Proc]:
+        """Get the processes required to run the targets
+
+        Args:
+            targets: The target processes or their names
+
+        Returns:
+            The target processes and their direct and indirect required
+            processes, in the order of `self.procs`
+
+        Raises:
+            ProcDependencyError: When a target is not in the pipeline
+        """
+        if isinstance(targets, (str, type)):
+            targets = [targets]
+
+        by_name = {proc.name: proc for proc in self.procs}
+        stack = []
+        for target in targets:
+            proc = by_name.get(target if isinstance(target, str) else target.name)
+            if proc is None or (not isinstance(target, str) and proc is not target):
+                raise ProcDependencyError(
+                    f"Target process is not in the pipeline: {target}"
+                )
+            stack.append(proc)
+
+        needed = set()
+        while stack:
+            proc = stack.pop()
+            if proc in needed:
+                continue
+            needed.add(proc)
+            stack.extend(proc.requires or ())  # type: ignore
+
+        return [proc for proc in self.procs if proc in needed]
+
 
 def run(
     name: str,
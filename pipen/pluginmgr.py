@@ -4,6 +4,7 @@ from __future__ import annotations
 import shutil
 from os import PathLike
 from pathlib import Path
+from time import time
 from typing import Any, Dict, TYPE_CHECKING
 
 from simplug import Simplug, SimplugResult, makecall
@@ -12,7 +13,6 @@ from xqute.utils import a_read_text, a_write_text, asyncify
 
 from .defaults import ProcOutputType
 from .exceptions import ProcInputValueError, ProcOutputValueError
-from .utils import get_mtime as _get_mtime
 
 
 if TYPE_CHECKING:  # pragma: no cover
@@ -316,6 +316,9 @@ def _collect_norm_outpath(calls: list[SimplugImplCall]) -> str:
 def norm_outpath(job: Job, outpath: str, is_dir: bool) -> str:
     """Normalize the output path
 
+    The directories should not be created when the process is only
+    planned (`job.proc.dry_run` is True).
+
     Args:
         job: The job
         outpath: The output path
@@ -515,6 +518,9 @@ class PipenMainPlugin:
     async def on_job_submitted(self, job: Job):
         """Update the progress bar when a job is submitted"""
         job.proc.pbar.update_job_submitted()
+        if job.proc.pipeline.config.prioritize:
+            # To record the runtime once the job succeeds
+            job.proc._job_submitted_at[job.index] = time()
 
     @plugin.impl
     async def on_job_started(self, job: Job):
@@ -528,6 +534,7 @@ class PipenMainPlugin:
         job.proc.pbar.update_job_running()
         job.proc.pbar.update_job_succeeded()
         job.status = JobStatus.FINISHED
+        job.proc.notify_job_done(job.index, True)
 
     @plugin.impl
     async def on_job_succeeded(self, job: Job):
@@ -552,10 +559,16 @@ class PipenMainPlugin:
                     "is not generated."
                 )
                 await a_write_text(job.stderr_file, stderr)
+                job.proc.notify_job_done(job.index, False)
                 break
         else:
             await job.cache()
             job.proc.pbar.update_job_succeeded()
+            job.proc.notify_job_done(job.index, True)
+            # Record the runtime for prioritizing the jobs in later runs
+            submitted_at = job.proc._job_submitted_at.get(job.index)
+            if submitted_at is not None:
+                job.proc.job_runtimes[job.index] = time() - submitted_at
 
     @plugin.impl
     async def on_job_failed(self, job: Job):
@@ -564,12 +577,15 @@ class PipenMainPlugin:
         if job.status == JobStatus.RETRYING:
             job.log("debug", "Retrying #%s", job.trial_count + 1)
             job.proc.pbar.update_job_retrying()
+        else:
+            job.proc.notify_job_done(job.index, False)
 
     @plugin.impl
     async def on_job_killed(self, job: Job):
         """Update the status of a killed job"""
         # instead of FINISHED to force the whole pipeline to quit
         job.status = JobStatus.FAILED  # pragma: no cover
+        job.proc.notify_job_done(job.index, False)  # pragma: no cover
 
     @plugin.impl
     def norm_inpath(
@@ -583,7 +599,11 @@ class PipenMainPlugin:
             # Let the plugins handle the protocol
             return None
 
-        return str(Path(inpath).expanduser().resolve())
+        return str(
+            job.proc.stat_cache.resolve_path(
+                Path(inpath).expanduser()
+            )
+        )
 
     @plugin.impl
     def norm_outpath(
@@ -602,9 +622,11 @@ class PipenMainPlugin:
                 f"[{job.proc.name}] Process output should be a relative path: {outpath}"
             )
 
-        out = job.outdir.resolve() / outpath
-        if is_dir:
+        stat_cache = job.proc.stat_cache
+        out = stat_cache.resolve_path(job.outdir) / outpath
+        if is_dir and not job.proc.dry_run:
             out.mkdir(parents=True, exist_ok=True)
+            stat_cache.invalidate(out)
 
         return str(out)
 
@@ -620,7 +642,7 @@ class PipenMainPlugin:
             # Let the plugins handle the protocol
             return None
 
-        return _get_mtime(path, dirsig)
+        return job.proc.stat_cache.get_mtime(path, dirsig)
 
     @plugin.impl
     async def clear_path(self, job: Job, path: str | PathLike, is_dir: bool):
@@ -644,6 +666,8 @@ class PipenMainPlugin:
                 path.mkdir()
         except Exception:  # pragma: no cover
             return False
+        finally:
+            job.proc.stat_cache.invalidate(path)
         return True
 
     @plugin.impl
@@ -653,9 +677,9 @@ class PipenMainPlugin:
             # Let the plugins handle the protocol
             return None
 
-        path = Path(path)
-        if not path.exists():
+        if not job.proc.stat_cache.exists(path):
             return False
+        path = Path(path)
         if is_dir:
             return len(list(path.iterdir())) > 0  # pragma: no cover
         return True
@@ -666,6 +690,26 @@ plugin.register(PipenMainPlugin)
 xqute_plugin = Simplug("xqute")
 
 
+async def _release_job(job: Job) -> None:
+    """Release the slot held by a job from the pipeline-level pool"""
+    if job.proc.pipeline.pool is not None:
+        await job.proc.pipeline.pool.release(job)
+
+
+def _invalidate_job_outputs(job: Job) -> None:
+    """Invalidate the cached stat results of the outputs of a job, as they
+    are written by the job"""
+    for outkey, outtype in job._output_types.items():
+        if outtype in (ProcOutputType.FILE, ProcOutputType.DIR):
+            job.proc.stat_cache.invalidate(job.output[outkey])
+
+
+def _release_job_caches(job: Job) -> None:
+    """Release the cached data of a job once it's done with `low_memory`"""
+    if job.proc.pipeline.config.low_memory:
+        job.release_caches()
+
+
 class XqutePipenPlugin:
     """The plugin for xqute working as proxy for pipen plugin hooks"""
 
@@ -689,12 +733,40 @@ class XqutePipenPlugin:
     @xqute_plugin.impl
     async def on_job_submitting(self, scheduler: Scheduler, job: Job):
         """When a job is being submitted"""
-        return await plugin.hooks.on_job_submitting(job)
+        ret = await plugin.hooks.on_job_submitting(job)
+        if ret is False:
+            return ret
+
+        if job.proc.pipeline.pool is not None:
+            # Wait for a slot from the pipeline-level pool
+            # A bundle takes one slot, held by the job submitted
+            await job.proc.pipeline.pool.acquire(job, job.proc.job_costs)
+
+        bundle = []
+        for bjob in job.bundle:
+            if await plugin.hooks.on_job_submitting(bjob) is not False:
+                await bjob.clean()
+                bundle.append(bjob)
+        job.bundle = bundle
+        return ret
 
     @xqute_plugin.impl
     async def on_job_submitted(self, scheduler: Scheduler, job: Job):
         """When a job is submitted"""
+        if job.bundle:
+            # With array jobs, the jid returned is the one of the array
+            jids = [
+                job.bundled_jid(scheduler, i)
+                for i in range(len(job.bundle) + 1)
+            ]
+            job.jid = jids[0]
         await plugin.hooks.on_job_submitted(job)
+        for i, bjob in enumerate(job.bundle, 1):
+            bjob.jid = jids[i]
+            bjob.status = JobStatus.SUBMITTED
+            await plugin.hooks.on_job_submitted(bjob)
+        # Submitted alone when retried
+        job.bundle = []
 
     @xqute_plugin.impl
     async def on_job_started(self, scheduler: Scheduler, job: Job):
@@ -714,17 +786,37 @@ class XqutePipenPlugin:
     @xqute_plugin.impl
     async def on_job_killed(self, scheduler: Scheduler, job: Job):
         """When a job is killed"""
+        await _release_job(job)  # pragma: no cover
         await plugin.hooks.on_job_killed(job)  # pragma: no cover
 
     @xqute_plugin.impl
     async def on_job_succeeded(self, scheduler: Scheduler, job: Job):
         """When a job is succeeded"""
+        _invalidate_job_outputs(job)
+        await _release_job(job)
         await plugin.hooks.on_job_succeeded(job)
+        _release_job_caches(job)
 
     @xqute_plugin.impl
     async def on_job_failed(self, scheduler: Scheduler, job: Job):
         """When a job is failed"""
+        _invalidate_job_outputs(job)
+        # Also released when retrying, the slot is acquired again when
+        # the job is resubmitted
+        await _release_job(job)
         await plugin.hooks.on_job_failed(job)
+        _release_job_caches(job)
+        # Failed to submit, so are the jobs bundled with it
+        for bjob in job.bundle:
+            await a_write_text(
+                bjob.stderr_file,
+                f"Failed to submit with job #{job.index} as a bundle, "
+                f"see {job.stderr_file}",
+            )
+            await a_write_text(bjob.rc_file, "-2")
+            bjob.status = JobStatus.FAILED
+            await plugin.hooks.on_job_failed(bjob)
+        job.bundle = []
 
     @xqute_plugin.impl
     def on_jobcmd_init(self, scheduler: Scheduler, job: Job):
@@ -4,7 +4,9 @@ from __future__ import annotations
 import asyncio
 import inspect
 import logging
+import os
 from abc import ABC, ABCMeta
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from functools import cached_property
 from os import PathLike
 from pathlib import Path
@@ -14,6 +16,7 @@ from typing import (
     List,
     Mapping,
     Sequence,
+    Tuple,
     Type,
     TYPE_CHECKING,
 )
@@ -22,18 +25,28 @@ from diot import Diot
 from rich import box
 from rich.panel import Panel
 from varname import VarnameException, varname
-from xqute import JobStatus, Xqute
+from xqute import JobErrorStrategy, JobStatus, Xqute
 
-from .defaults import ProcInputType
+from ._job_store import JobStore
+from ._signatures import SignatureStore
+from .defaults import SIGNATURES_FILE, ProcInputType
 from .exceptions import (
+    ConfigurationError,
     ProcInputKeyError,
     ProcInputTypeError,
     ProcScriptFileNotFound,
     PipenOrProcNameError,
+    TemplateRenderingError,
 )
+from .job import _make_outdirs, _prepare_overridden
 from .pluginmgr import plugin
-from .scheduler import get_scheduler
-from .template import Template, get_template_engine
+from .scheduler import ArrayJob, get_scheduler
+from .template import (
+    Template,
+    _init_render_worker,
+    _render_in_worker,
+    get_template_engine,
+)
 from .utils import (
     brief_list,
     copy_dict,
@@ -49,12 +62,27 @@ from .utils import (
     update_dict,
     get_shebang,
     get_base,
+    load_job_runtimes,
+    load_script_digests,
+    save_job_runtimes,
+    save_script_digests,
+    StatCache,
 )
 
 if TYPE_CHECKING:  # pragma: no cover
     from .pipen import Pipen
 
 
+def _write_scripts(scripts: Sequence[Tuple[Path, str]]) -> None:
+    """Write a batch of job scripts
+
+    Args:
+        scripts: The paths and the contents of the scripts
+    """
+    for path, script in scripts:
+        path.write_text(script)
+
+
 class ProcMeta(ABCMeta):
     """Meta class for Proc"""
 
@@ -107,9 +135,18 @@ class Proc(ABC, metaclass=ProcMeta):
             across jobs.
         envs_depth: How deep to update the envs when subclassed.
         cache: Should we detect whether the jobs are cached?
+            Use `"content"` to compare the contents of the files instead of
+            only the modification times.
         dirsig: When checking the signature for caching, whether should we walk
             through the content of the directory? This is sometimes
             time-consuming if the directory is big.
+        dirsig_manifest: Whether to record the manifests of the input
+            directories in the signature, so that the files in the
+            directories without entries added, removed or renamed are not
+            stat-ed again when checking the signature. Files modified in
+            place in those directories are NOT detected, and the jobs are
+            regarded as cached. Only enable it for the directories with
+            files written once or replaced.
         export: When True, the results will be exported to `<pipeline.outdir>`
             Defaults to None, meaning only end processes will export.
             You can set it to True/False to enable or disable exporting
@@ -146,6 +183,18 @@ class Proc(ABC, metaclass=ProcMeta):
         scheduler_opts: The options for the scheduler
         script: The script template for the process
         submission_batch: How many jobs to be submited simultaneously
+        job_resources: The amounts of the resources each job consumes from
+            the pipeline-level `resources`, e.g. `{"cpu": 4, "mem": "16G"}`.
+            Each job also takes one of the pipeline-level `max_jobs` slots.
+        streaming: Whether to submit a job once the corresponding jobs of the
+            required processes are done, instead of waiting for the
+            required processes to be done. It doesn't work when `input_data`
+            is a callback. Requires pipeline-level `proc_concurrency` > 1
+            to take effect.
+        bundle_size: How many jobs to submit together as one scheduler job.
+            The jobs in a bundle still have their own status, rc, stdout
+            and stderr files, so they are cached and tracked separately.
+        bundle_forks: How many jobs in a bundle to run simultaneously.
 
         nexts: Computed from `requires` to build the process relationships
         output_data: The output data (to pass to the next processes)
@@ -155,8 +204,9 @@ class Proc(ABC, metaclass=ProcMeta):
     desc: str = None
     envs: Mapping[str, Any] = None
     envs_depth: int = None
-    cache: bool = None
+    cache: bool | str = None
     dirsig: bool = None
+    dirsig_manifest: bool = None
     export: bool = None
     error_strategy: str = None
     num_retries: int = None
@@ -174,6 +224,10 @@ class Proc(ABC, metaclass=ProcMeta):
     scheduler_opts: Mapping[str, Any] = None
     script: str = None
     submission_batch: int = None
+    job_resources: Mapping[str, Any] = None
+    streaming: bool = None
+    bundle_size: int = None
+    bundle_forks: int = None
 
     nexts: Sequence[Type[Proc]] = None
     output_data: Any = None
@@ -191,7 +245,7 @@ class Proc(ABC, metaclass=ProcMeta):
         desc: str = None,
         envs: Mapping[str, Any] = None,
         envs_depth: int = None,
-        cache: bool = None,
+        cache: bool | str = None,
         export: bool = None,
         error_strategy: str = None,
         num_retries: int = None,
@@ -203,6 +257,10 @@ class Proc(ABC, metaclass=ProcMeta):
         scheduler: str = None,
         scheduler_opts: Mapping[str, Any] = None,
         submission_batch: int = None,
+        job_resources: Mapping[str, Any] = None,
+        streaming: bool = None,
+        bundle_size: int = None,
+        bundle_forks: int = None,
     ) -> Type[Proc]:
         """Create a subclass of Proc using another Proc subclass or Proc itself
 
@@ -213,7 +271,8 @@ class Proc(ABC, metaclass=ProcMeta):
             envs: The arguments of the process, will overwrite parent one
                 The items that are specified will be inherited
             envs_depth: How deep to update the envs when subclassed.
-            cache: Whether we should check the cache for the jobs
+            cache: Whether we should check the cache for the jobs, or
+                `"content"` to compare the contents of the files
             export: When True, the results will be exported to
                 `<pipeline.outdir>`
                 Defaults to None, meaning only end processes will export.
@@ -235,6 +294,13 @@ class Proc(ABC, metaclass=ProcMeta):
             scheduler_opts: The new scheduler options, unspecified items will
                 be inherited.
             submission_batch: How many jobs to be submited simultaneously
+            job_resources: The amounts of the resources each job consumes
+                from the pipeline-level `resources`
+            streaming: Whether to submit a job once the corresponding jobs of
+                the required processes are done
+            bundle_size: How many jobs to submit together as one scheduler
+                job
+            bundle_forks: How many jobs in a bundle to run simultaneously
 
         Returns:
             The new process class
@@ -271,6 +337,10 @@ class Proc(ABC, metaclass=ProcMeta):
             "error_strategy",
             "num_retries",
             "submission_batch",
+            "job_resources",
+            "streaming",
+            "bundle_size",
+            "bundle_forks",
         ):
             if locs[key] is not None:
                 kwargs[key] = locs[key]
@@ -333,8 +403,41 @@ class Proc(ABC, metaclass=ProcMeta):
 
         self.pbar = None
         self.jobs: List[Any] = []
+        # The data of the jobs, kept in columns, with the jobs as views
+        self._job_store: JobStore = None
+        # The digests of the job scripts, and the scripts to write,
+        # updated when the jobs are prepared
+        self._script_digests: Dict[int, str] = {}
+        self._scripts_to_write: List[Tuple[Path, str]] = []
+        # The signatures of the jobs with signature_store="sqlite"
+        self._signatures: SignatureStore = None
+        # The cached stat results of paths for the run, set by the pipeline
+        # running the process, which may not be the one it is bound to
+        self.stat_cache: StatCache = None
         self.xqute = None
+        # The running required processes to stream the jobs from
+        # Set by the pipeline before the process is initialized
+        self.streaming_requires: List[Proc] = []
+        # Whether the process is only planned (see `plan()`), so that
+        # nothing should be created or cleared for the jobs
+        self.dry_run = False
+        # The parsed costs of resources of each job
+        self.job_costs: Dict[str, float] = {}
+        # Whether the jobs are done (succeeded or failed), by job index
+        self._jobs_done: Dict[int, bool] = {}
+        self._jobs_done_waiters: Dict[int, asyncio.Future] = {}
+        # The jobs collected to be submitted as a bundle
+        self._bundle: List[Any] = []
+        self._bundle_size = 1
         self.__class__.workdir = Path(self.pipeline.workdir) / self.name
+        # The job runtimes recorded in previous runs, updated by the
+        # core plugin once jobs succeed, only with `prioritize` enabled
+        self.job_runtimes: Dict[int, float] = (
+            load_job_runtimes(self.workdir)
+            if self.pipeline.config.prioritize
+            else {}
+        )
+        self._job_submitted_at: Dict[int, float] = {}
         # plugins can modify some default attributes
         plugin.hooks.on_proc_create(self)
 
@@ -376,15 +479,28 @@ class Proc(ABC, metaclass=ProcMeta):
 
         if self.submission_batch is None:
             self.submission_batch = self.pipeline.config.submission_batch
+        if self.bundle_size is None:
+            self.bundle_size = self.pipeline.config.bundle_size
+        if self.bundle_forks is None:
+            self.bundle_forks = self.pipeline.config.bundle_forks
 
     async def init(self) -> None:
         """Init all other properties and jobs"""
         import pandas
 
+        # The process may have been planned before
+        self.dry_run = False
+
         scheduler_opts = (
             copy_dict(self.pipeline.config.scheduler_opts, 2) or {}
         )
         scheduler_opts.update(self.scheduler_opts or {})
+        array_jobs = self._check_array_jobs(scheduler_opts)
+        forks = self.forks or self.pipeline.config.forks
+        if not array_jobs:
+            # The jobs in bundles are counted separately by xqute, so that
+            # `forks` limits the number of bundles running at the same time
+            forks *= max(self.bundle_size, 1)
         self.xqute = Xqute(
             self.scheduler,
             job_metadir=self.workdir,
@@ -394,18 +510,31 @@ class Proc(ABC, metaclass=ProcMeta):
             job_num_retries=self.pipeline.config.num_retries
             if self.num_retries is None
             else self.num_retries,
-            scheduler_forks=self.forks or self.pipeline.config.forks,
+            scheduler_forks=forks,
             scheduler_jobprefix=self.name,
             **scheduler_opts,
         )
         # for the plugin hooks to access
         self.xqute.proc = self
+        self._serialize_polling()
+        if self.pipeline.pool is not None:
+            self.job_costs = self.pipeline.pool.costs(self.job_resources)
 
         await plugin.hooks.on_proc_init(self)
         await self._init_jobs()
+        # How many jobs to submit together, see `_put_bundle()`
+        if array_jobs == "proc":
+            self._bundle_size = self.size
+        elif array_jobs == "batch":
+            self._bundle_size = self.submission_batch
+        else:
+            self._bundle_size = self.bundle_size
         self.__class__.output_data = pandas.DataFrame(
             (job.output for job in self.jobs)
         )
+        if self.pipeline.config.low_memory:
+            for job in self.jobs:
+                job.release_caches()
 
     def gc(self):
         """GC process for the process to save memory after it's done"""
@@ -414,6 +543,9 @@ class Proc(ABC, metaclass=ProcMeta):
 
         del self.jobs[:]
         self.jobs = []
+        self._job_store = None
+        self._signatures = None
+        self.stat_cache = None
 
         del self.pbar
         self.pbar = None
@@ -450,16 +582,36 @@ class Proc(ABC, metaclass=ProcMeta):
 
         await plugin.hooks.on_proc_start(self)
 
-        cached_jobs = []
-        for job in self.jobs:
-            if await job.cached:
-                cached_jobs.append(job.index)
-                await plugin.hooks.on_job_cached(job)
+        cached_jobs: List[int] = []
+        try:
+            if self.streaming_requires:
+                await self._stream_jobs(cached_jobs)
             else:
-                await self.xqute.put(job)
-        if cached_jobs:
-            self.log("info", "Cached jobs: [%s]", brief_list(cached_jobs))
-        await self.xqute.run_until_complete()
+                await self._put_jobs(self._prioritized_jobs(), cached_jobs)
+            # The last bundle may not be full
+            await self._put_bundle()
+            if cached_jobs:
+                self.log(
+                    "info",
+                    "Cached jobs: [%s]",
+                    brief_list(sorted(cached_jobs)),
+                )
+            await self.xqute.run_until_complete()
+        finally:
+            for job in self.jobs:
+                # Release the processes streaming from this one
+                if job.index not in self._jobs_done:
+                    self.notify_job_done(job.index, False)
+                # Release the slots held by jobs not finished normally
+                if self.pipeline.pool is not None:
+                    await self.pipeline.pool.release(job)
+
+            if self._job_submitted_at:
+                save_job_runtimes(self.workdir, self.job_runtimes)
+            self.pipeline.file_digests.save()
+            if self._signatures is not None:
+                self._signatures.flush()
+
         self.pbar.done()
         await plugin.hooks.on_proc_done(
             self,
@@ -470,6 +622,36 @@ class Proc(ABC, metaclass=ProcMeta):
             else True,
         )
 
+    def notify_job_done(self, index: int, succeeded: bool) -> None:
+        """Mark a job as done, called by the core plugin
+
+        Args:
+            index: The index of the job
+            succeeded: Whether the job succeeded (or is cached)
+        """
+        self._jobs_done[index] = succeeded
+        waiter = self._jobs_done_waiters.pop(index, None)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(succeeded)
+
+    async def wait_job_done(self, index: int) -> bool:
+        """Wait for a job to be done
+
+        Args:
+            index: The index of the job
+
+        Returns:
+            True if the job succeeded (or is cached) otherwise False
+        """
+        if index in self._jobs_done:
+            return self._jobs_done[index]
+
+        waiter = self._jobs_done_waiters.get(index)
+        if waiter is None:
+            waiter = asyncio.get_running_loop().create_future()
+            self._jobs_done_waiters[index] = waiter
+        return await waiter
+
     # properties
     @cached_property
     def size(self) -> int:
@@ -516,30 +698,527 @@ class Proc(ABC, metaclass=ProcMeta):
 
         return requires  # type: ignore
 
-    async def _init_job(self, worker_id: int) -> None:
-        """A worker to initialize jobs
+    def _prioritized_jobs(self) -> List[Any]:
+        """Get the jobs in the order to put to xqute
+
+        With `prioritize` enabled for the pipeline, jobs that took longer in
+        previous runs are put first (longest-processing-time-first), so that
+        the stragglers don't start last. Jobs without a recorded runtime are
+        regarded as taking the average time.
+
+        Returns:
+            The jobs in order
+        """
+        if not self.pipeline.config.prioritize or not self.job_runtimes:
+            return self.jobs
+
+        default = sum(self.job_runtimes.values()) / len(self.job_runtimes)
+        return sorted(
+            self.jobs,
+            key=lambda job: -self.job_runtimes.get(job.index, default),
+        )
+
+    async def _put_jobs(
+        self,
+        jobs: Sequence[Any],
+        cached_jobs: List[int],
+    ) -> None:
+        """Check if the jobs are cached, and put the ones not cached to
+        xqute in order
+
+        The checks are mostly file stats and reading the signatures, which
+        block, so they are done in a thread pool, while the hooks are called
+        in the running loop (see `Job.not_cached_reason()`). The jobs are
+        put as soon as they are checked, while the checks of the other jobs
+        continue, so that the jobs are submitted without waiting for all the
+        checks. The outputs of the jobs not cached are cleared in order
+        (see `Job._settle_cached()`).
 
         Args:
-            worker_id: The worker id
+            jobs: The jobs
+            cached_jobs: The list to collect the indexes of cached jobs
         """
-        for job in self.jobs:
-            if job.index % self.submission_batch != worker_id:
-                continue
-            await job.prepare(self)
+        if not jobs:
+            return
+
+        loop = asyncio.get_running_loop()
+        futures = [loop.create_future() for _ in jobs]
+        pending = zip(jobs, futures)
+        n_workers = max(min(len(jobs), 32, (os.cpu_count() or 1) + 4), 1)
+
+        async def check(executor: ThreadPoolExecutor) -> None:
+            for job, future in pending:
+                try:
+                    future.set_result(await job.not_cached_reason(executor))
+                except Exception as exc:
+                    future.set_exception(exc)
+
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            workers = [
+                asyncio.create_task(check(executor)) for _ in range(n_workers)
+            ]
+            try:
+                for job, future in zip(jobs, futures):
+                    await self._put_job(
+                        job,
+                        cached_jobs,
+                        await job._settle_cached(await future),
+                    )
+                    # Let xqute submit the jobs put
+                    await asyncio.sleep(0)
+            finally:
+                for worker in workers:
+                    worker.cancel()
+                await asyncio.gather(*workers, return_exceptions=True)
+
+    async def _put_job(
+        self,
+        job: Any,
+        cached_jobs: List[int],
+        cached: bool | None = None,
+    ) -> None:
+        """Check if a job is cached, and put it to xqute if not
+
+        With `bundle_size` > 1 or the scheduler option `array_jobs`, the
+        jobs are collected and put as bundles (see `_put_bundle()`).
+
+        With `low_memory`, the cached data of the job is released
+        afterwards.
+
+        Args:
+            job: The job
+            cached_jobs: The list to collect the indexes of cached jobs
+            cached: Whether the job is cached, if it is checked already
+        """
+        if cached is None:
+            cached = await job.cached
+        if cached:
+            cached_jobs.append(job.index)
+            await plugin.hooks.on_job_cached(job)
+        elif self._bundle_size > 1:
+            self._bundle.append(job)
+            if len(self._bundle) >= self._bundle_size:
+                await self._put_bundle()
+        else:
+            await self.xqute.put(job)
+
+        if self.pipeline.config.low_memory:
+            # Computed again when the job is done
+            job.release_caches()
+
+    async def _put_bundle(self) -> None:
+        """Put the collected jobs to xqute as a bundle
+
+        Only the first job is submitted to the scheduler, and its wrapped
+        script runs the wrapped scripts of all jobs in the bundle, or
+        submits them as an array job (see `Job.wrapped_script()`).
+        The other jobs are added to xqute only to be polled, so their
+        status and hooks are still handled one by one. They are marked
+        submitted once the first job is submitted, by the xqute plugin
+        of pipen.
+        """
+        if not self._bundle:
+            return
+
+        job, *bundled = self._bundle
+        self._bundle = []
+        job.bundle = bundled
+        if bundled:
+            self.log(
+                "debug",
+                "Bundling jobs with job #%s: [%s]",
+                job.index,
+                brief_list([bjob.index for bjob in bundled]),
+            )
+
+        await self.xqute.put(job)
+        for bjob in bundled:
+            # What xqute.put() does, except queuing the job for submission
+            bjob._error_retry = (
+                self.xqute._job_error_strategy == JobErrorStrategy.RETRY
+            )
+            bjob._num_retries = self.xqute._job_num_retries
+            await plugin.hooks.on_job_init(bjob)
+            self.xqute.jobs.append(bjob)
+            await plugin.hooks.on_job_queued(bjob)
+
+    async def _stream_jobs(self, cached_jobs: List[int]) -> None:
+        """Put the jobs once the corresponding jobs of the required
+        processes are done
+
+        Job `i` corresponds to job `i` of each required process, or the last
+        job if the required process has fewer jobs, as the input data is
+        forward-filled (see `_compute_input()`).
+        Jobs with any of the corresponding jobs failed are not put.
 
-    async def _init_jobs(self) -> None:
+        Args:
+            cached_jobs: The list to collect the indexes of cached jobs
+        """
+
+        async def stream_job(job: Any) -> None:
+            for req in self.streaming_requires:
+                if not await req.wait_job_done(min(job.index, req.size - 1)):
+                    return
+            await self._put_job(job, cached_jobs)
+
+        # The jobs of this process are reported done by the on_job_succeeded
+        # and on_job_failed hooks, called when the jobs are polled. xqute
+        # only polls them to submit more jobs, or after all jobs are put, so
+        # they are polled here while no jobs are waiting to be submitted,
+        # for the processes streaming from this one to be notified.
+        feeding = asyncio.ensure_future(
+            asyncio.gather(*(stream_job(job) for job in self.jobs))
+        )
+        halt_on_error = (
+            self.xqute._job_error_strategy == JobErrorStrategy.HALT
+        )
+        try:
+            while not feeding.done():
+                await asyncio.wait([feeding], timeout=1.0)
+                if not feeding.done() and not self.xqute.buffer_queue:
+                    await self.xqute.scheduler.polling_jobs(
+                        self.xqute.jobs,
+                        "all_done",
+                        halt_on_error,
+                    )
+        finally:
+            feeding.cancel()
+        feeding.result()
+
+    def _serialize_polling(self) -> None:
+        """Let the scheduler poll the jobs one round at a time
+
+        The producer of xqute polls the jobs to submit more jobs, while
+        they are also polled to wait for them to complete, or to stream the
+        jobs (see `_stream_jobs()`). A round of polling awaits the hooks
+        before resubmitting a retrying job, so concurrent rounds could call
+        the hooks or retry the job twice.
+        """
+        scheduler = self.xqute.scheduler
+        polling_jobs = scheduler.polling_jobs
+        lock = asyncio.Lock()
+
+        async def serialized_polling_jobs(*args: Any, **kwargs: Any) -> bool:
+            async with lock:
+                return await polling_jobs(*args, **kwargs)
+
+        scheduler.polling_jobs = serialized_polling_jobs
+
+    async def _init_jobs(self, dry_run: bool = False) -> None:
         """Initialize all jobs
 
+        The output directories of the jobs are created in one pass in the
+        thread pool first (see `_make_outdirs()`).
+
+        The jobs are then put into a bounded queue, consumed by
+        `submission_batch` workers. Preparing a job blocks (template
+        rendering), so the workers run it in a thread pool. If
+        `Job.prepare()` is overridden by the job class of the scheduler (or
+        patched), it is awaited in the event loop instead.
+
+        With `render_workers`, the scripts are rendered in worker
+        processes instead (see `_render_scripts()`).
+
+        The scripts are compared with the ones written in previous runs by
+        their digests. The changed ones are written in batches in the
+        thread pool once all jobs are prepared.
+
+        With `signature_store="sqlite"`, the signatures of the jobs are
+        also loaded at once here, to check the caches in memory.
+
         Args:
-            config: The pipeline configuration
+            dry_run: Whether to prepare the jobs without writing the scripts
+
+        Raises:
+            ConfigurationError: When `signature_store` is not valid
         """
 
-        for i in range(self.input.data.shape[0]):
-            job = self.scheduler.job_class(i, "", self.workdir)
-            self.jobs.append(job)
+        records = self._compute_input_records()
+        n_jobs = len(self.input.data)
+        self._job_store = store = JobStore(self.workdir, n_jobs)
+        store.records = records
+        if self.export:
+            store.export_dir = Path(self.pipeline.outdir) / self.name
+        self.jobs = [
+            self.scheduler.job_class(i, "", self.workdir, store=store)
+            for i in range(n_jobs)
+        ]
 
-        await asyncio.gather(
-            *(self._init_job(i) for i in range(self.submission_batch))
+        if not self.jobs:
+            return
+
+        self._script_digests = load_script_digests(self.workdir)
+        signature_store = self.pipeline.config.signature_store
+        if signature_store == "sqlite":
+            self._signatures = SignatureStore(
+                Path(self.workdir) / SIGNATURES_FILE
+            )
+        elif signature_store != "toml":
+            raise ConfigurationError(
+                "Configuration `signature_store` should be 'toml' or "
+                f"'sqlite', got {signature_store!r}"
+            )
+        n_digests = len(self._script_digests)
+        self._scripts_to_write = []
+        n_workers = max(min(self.submission_batch, len(self.jobs)), 1)
+        prepare_overridden = _prepare_overridden(type(self.jobs[0]))
+        render_in_workers = bool(
+            self.script
+            and self.pipeline.config.render_workers
+            and not prepare_overridden
+        )
+        queue: asyncio.Queue = asyncio.Queue(maxsize=n_workers * 2)
+        loop = asyncio.get_running_loop()
+
+        async def feed() -> None:
+            for job in self.jobs:
+                await queue.put(job)
+            for _ in range(n_workers):
+                await queue.put(None)
+
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            if not dry_run:
+                await loop.run_in_executor(executor, _make_outdirs, self.jobs)
+
+            async def work() -> None:
+                while True:
+                    job = await queue.get()
+                    if job is None:
+                        return
+                    if prepare_overridden:
+                        await job.prepare(self, dry_run)
+                        continue
+                    await loop.run_in_executor(
+                        executor,
+                        job._prepare,
+                        self,
+                        dry_run,
+                        not render_in_workers,
+                    )
+
+            tasks = [asyncio.ensure_future(feed())]
+            tasks.extend(
+                asyncio.ensure_future(work()) for _ in range(n_workers)
+            )
+            try:
+                await asyncio.gather(*tasks)
+            finally:
+                for task in tasks:
+                    task.cancel()
+
+            if render_in_workers:
+                await self._render_scripts(executor, dry_run)
+
+            if dry_run:
+                return
+
+            scripts = self._scripts_to_write
+            self._scripts_to_write = []
+            await asyncio.gather(
+                *(
+                    loop.run_in_executor(
+                        executor,
+                        _write_scripts,
+                        scripts[i::n_workers],
+                    )
+                    for i in range(min(n_workers, len(scripts)))
+                )
+            )
+            if scripts or len(self._script_digests) != n_digests:
+                save_script_digests(self.workdir, self._script_digests)
+
+    async def _render_scripts(
+        self,
+        executor: ThreadPoolExecutor,
+        dry_run: bool = False,
+    ) -> None:
+        """Render the scripts of the jobs in `render_workers` worker
+        processes
+
+        The script template is compiled once in each worker process, and
+        the data of the jobs is sent in chunks. Since the process object
+        can't be sent to other processes, `proc` in the data is replaced
+        by its `name`, `desc`, `envs`, `lang`, `size` and `workdir`.
+
+        Args:
+            executor: The thread pool to set the rendered scripts to the jobs
+            dry_run: Don't write the scripts, but only check whether they
+                are changed.
+
+        Raises:
+            TemplateRenderingError: When failed to render the scripts
+        """
+        loop = asyncio.get_running_loop()
+        n_procs = self.pipeline.config.render_workers
+        proc_data = Diot(
+            name=self.name,
+            desc=self.desc,
+            envs=self.envs,
+            lang=self.lang or self.pipeline.config.lang,
+            size=self.size,
+            workdir=str(self.workdir),
+        )
+        # A few chunks for each worker to balance the load
+        chunk_size = max(len(self.jobs) // (n_procs * 4), 1)
+        # Don't build the data of all chunks at the same time
+        semaphore = asyncio.Semaphore(n_procs * 2)
+
+        def set_scripts(jobs: Sequence[Any], scripts: Sequence[str]) -> None:
+            for job, script in zip(jobs, scripts):
+                job._set_script(self, script, dry_run)
+
+        with ProcessPoolExecutor(
+            max_workers=n_procs,
+            initializer=_init_render_worker,  # type: ignore
+            initargs=(  # type: ignore
+                self.template,
+                self._script_source,
+                self.template_opts,
+            ),
+        ) as pool:
+
+            async def render(jobs: Sequence[Any]) -> None:
+                async with semaphore:
+                    data = [job._worker_template_data(proc_data) for job in jobs]
+                    try:
+                        scripts = await loop.run_in_executor(
+                            pool,
+                            _render_in_worker,
+                            data,
+                        )
+                    except Exception as exc:
+                        raise TemplateRenderingError(
+                            f"[{self.name}] Failed to render script "
+                            "in worker processes."
+                        ) from exc
+                await loop.run_in_executor(executor, set_scripts, jobs, scripts)
+
+            await asyncio.gather(
+                *(
+                    render(self.jobs[i:i + chunk_size])
+                    for i in range(0, len(self.jobs), chunk_size)
+                )
+            )
+
+    def _check_array_jobs(self, scheduler_opts: Mapping[str, Any]) -> str:
+        """Check the scheduler option `array_jobs`
+
+        Args:
+            scheduler_opts: The scheduler options
+
+        Returns:
+            `proc` to submit all jobs as one array job, `batch` to submit
+            every `submission_batch` jobs as one array job, or an empty
+            string if array jobs are not enabled or not supported by the
+            scheduler.
+
+        Raises:
+            ConfigurationError: When the value is not valid
+        """
+        array_jobs = scheduler_opts.get("array_jobs") or ""
+        if array_jobs not in ("", "proc", "batch"):
+            raise ConfigurationError(
+                f"[{self.name}] Scheduler option `array_jobs` should be "
+                f"'proc' or 'batch', got {array_jobs!r}"
+            )
+
+        if array_jobs and not is_subclass(self.scheduler.job_class, ArrayJob):
+            self.log(
+                "warning",
+                "Scheduler %r doesn't support array jobs, "
+                "`array_jobs` is ignored.",
+                self.scheduler.name,
+            )
+            return ""
+
+        if array_jobs and self.bundle_size > 1:
+            self.log(
+                "warning",
+                "Jobs are submitted as array jobs, `bundle_size` is ignored.",
+            )
+        return array_jobs
+
+    def _compute_input_records(self) -> Dict[str, List[Any]]:
+        """Convert the input data into columns for the jobs (see
+        `JobStore`), and check the types of the input values
+
+        The conversion is done in one pass, rather than accessing the rows
+        for each job, and the types are checked by columns.
+
+        Returns:
+            The columns of the input data, by input keys
+
+        Raises:
+            ProcInputTypeError: When the type of an input value doesn't
+                match the input type
+        """
+        import pandas
+
+        records = self.input.data.to_dict("list")
+        for inkey, intype in self.input.type.items():
+            if intype in (ProcInputType.FILE, ProcInputType.DIR):
+                for value in records[inkey]:
+                    if value is not None and not isinstance(
+                        value, (str, PathLike)
+                    ):
+                        raise ProcInputTypeError(
+                            f"[{self.name}] Got {type(value)} instead of "
+                            "PathLike object for input: "
+                            f"{inkey + ':' + intype!r}"
+                        )
+
+            elif intype in (ProcInputType.FILES, ProcInputType.DIRS):
+                column = records[inkey]
+                for i, value in enumerate(column):
+                    if value is None:
+                        continue
+                    if isinstance(value, pandas.DataFrame):
+                        # // todo: nested dataframe
+                        value = column[i] = value.iloc[0, 0]
+
+                    if not isinstance(value, (list, tuple)):
+                        raise ProcInputTypeError(
+                            f"[{self.name}] Expected a sequence for input: "
+                            f"{inkey + ':' + intype!r}, got {type(value)}"
+                        )
+
+        return records
+
+    async def plan(self) -> Dict[int, str | None]:
+        """Check which jobs would run, without running anything
+
+        The jobs are built without writing the scripts, and the caches are
+        checked without clearing the outputs. Like `_put_jobs()`, the file
+        stats are done in a thread pool.
+
+        Returns:
+            A dict with job indexes as keys and the reasons why the jobs
+            are not cached as values (None for cached jobs)
+        """
+        import pandas
+
+        self.dry_run = True
+        await self._init_jobs(dry_run=True)
+        self.__class__.output_data = pandas.DataFrame(
+            (job.output for job in self.jobs)
+        )
+        if not self.jobs:
+            return {}
+
+        n_workers = max(min(len(self.jobs), 32, (os.cpu_count() or 1) + 4), 1)
+        semaphore = asyncio.Semaphore(n_workers)
+
+        async def check(job: Any, executor: ThreadPoolExecutor) -> str | None:
+            async with semaphore:
+                return await job.not_cached_reason(executor)
+
+        with ThreadPoolExecutor(max_workers=n_workers) as executor:
+            reasons = await asyncio.gather(
+                *(check(job, executor) for job in self.jobs)
+            )
+
+        return dict(
+            sorted(zip((job.index for job in self.jobs), reasons))
         )
 
     def _compute_input(self) -> Mapping[str, Mapping[str, Any]]:
@@ -644,23 +1323,41 @@ class Proc(ABC, metaclass=ProcMeta):
 
         return self.template(self.output, **self.template_opts)  # type: ignore
 
+    @classmethod
+    def _resolve_script_file(cls, script: str) -> Path:
+        """Resolve the path of the script file from `file://...`
+
+        Relative paths are relative to the file where the class defining
+        the script is.
+
+        Args:
+            script: The script, starting with `file://`
+
+        Returns:
+            The path to the script file
+        """
+        script_file = Path(script[7:])
+        if not script_file.is_absolute():
+            base = get_base(
+                cls,
+                Proc,
+                script,
+                lambda klass: getattr(klass, "script", None),
+            )
+            script_file = Path(inspect.getfile(base)).parent / script_file
+        return script_file
+
     def _compute_script(self) -> Template:
         """Compute the script for jobs to render"""
+        # The script source, used to compute the fingerprint of the process
+        self._script_source: str = None
         if not self.script:
             self.log("warning", "No script specified.")
             return None
 
         script = self.script
         if script.startswith("file://"):
-            script_file = Path(script[7:])
-            if not script_file.is_absolute():
-                base = get_base(
-                    self.__class__,
-                    Proc,
-                    script,
-                    lambda klass: getattr(klass, "script", None),
-                )
-                script_file = Path(inspect.getfile(base)).parent / script_file
+            script_file = self._resolve_script_file(script)
             if not script_file.is_file():
                 raise ProcScriptFileNotFound(
                     f"No such script file: {script_file}"
@@ -672,6 +1369,7 @@ class Proc(ABC, metaclass=ProcMeta):
             self.lang = get_shebang(self.script)
 
         plugin.hooks.on_proc_script_computed(self)
+        self._script_source = self.script
         return self.template(self.script, **self.template_opts)  # type: ignore
 
     def _log_info(self):
@@ -0,0 +1,155 @@
+"""Provide the ResourcePool class, a pipeline-level budget of job slots
+and resources shared by all processes"""
+from __future__ import annotations
+
+import asyncio
+import re
+from typing import Any, Dict, Hashable, Mapping
+
+from .exceptions import ConfigurationError
+
+_AMOUNT_UNITS = {
+    "": 1,
+    "K": 1024,
+    "M": 1024**2,
+    "G": 1024**3,
+    "T": 1024**4,
+    "P": 1024**5,
+}
+
+
+def parse_amount(amount: int | float | str) -> float:
+    """Parse an amount of resource
+
+    Args:
+        amount: The amount, either a number or a string with an optional
+            unit suffix (K, M, G, T or P, case-insensitive, optionally
+            followed by `B`), e.g. `"16G"`, `"512mb"`
+
+    Returns:
+        The parsed amount as a number
+
+    Raises:
+        ConfigurationError: When the amount cannot be parsed
+    """
+    if isinstance(amount, (int, float)) and not isinstance(amount, bool):
+        return float(amount)
+
+    matched = re.match(
+        r"^\s*(\d+(?:\.\d*)?|\.\d+)\s*([KMGTP]?)B?\s*$",
+        str(amount),
+        flags=re.IGNORECASE,
+    )
+    if not matched:
+        raise ConfigurationError(f"Cannot parse resource amount: {amount!r}")
+
+    return float(matched.group(1)) * _AMOUNT_UNITS[matched.group(2).upper()]
+
+
+class ResourcePool:
+    """A pool of job slots and resources shared by all processes of a
+    pipeline
+
+    Each job acquires one slot and its costs of the resources before being
+    submitted, and releases them once it is done.
+
+    Attributes:
+        max_jobs: The max number of jobs running at the same time across
+            processes. `None` for no limit.
+        capacity: The total amounts of the resources
+        available: The available amounts of the resources
+        n_jobs: The number of jobs holding slots
+
+    Args:
+        max_jobs: The max number of jobs running at the same time
+        resources: The total amounts of the resources, e.g.
+            `{"cpu": 64, "mem": "256G"}`
+    """
+
+    def __init__(
+        self,
+        max_jobs: int | None = None,
+        resources: Mapping[str, Any] | None = None,
+    ) -> None:
+        if max_jobs is not None and max_jobs < 1:
+            raise ConfigurationError(
+                f"`max_jobs` should be a positive integer, got {max_jobs}"
+            )
+        self.max_jobs = max_jobs
+        self.capacity: Dict[str, float] = {
+            key: parse_amount(val) for key, val in (resources or {}).items()
+        }
+        self.available = self.capacity.copy()
+        self.n_jobs = 0
+        self._acquired: Dict[Hashable, Dict[str, float]] = {}
+        self._condition: asyncio.Condition = None
+
+    def costs(self, resources: Mapping[str, Any] | None) -> Dict[str, float]:
+        """Parse the costs of a job, and check them against the capacity
+
+        Resources that are not in the pool are not limited, so they are
+        ignored.
+
+        Args:
+            resources: The amounts of the resources a job consumes
+
+        Returns:
+            The parsed costs
+
+        Raises:
+            ConfigurationError: When a job consumes more than the capacity,
+                which will never be able to run.
+        """
+        out = {}
+        for key, val in (resources or {}).items():
+            if key not in self.capacity:
+                continue
+            out[key] = parse_amount(val)
+            if out[key] > self.capacity[key]:
+                raise ConfigurationError(
+                    f"A job requires {val} of {key!r}, which is more than "
+                    "the capacity of the pipeline "
+                    f"({self.capacity[key]:g})."
+                )
+        return out
+
+    def _fits(self, costs: Mapping[str, float]) -> bool:
+        """Check if a job with given costs can acquire the resources now"""
+        if self.max_jobs is not None and self.n_jobs >= self.max_jobs:
+            return False
+        return all(self.available[key] >= val for key, val in costs.items())
+
+    async def acquire(self, key: Hashable, costs: Mapping[str, float]) -> None:
+        """Wait until a slot and the resources are available, and take them
+
+        Args:
+            key: The key to identify the holder, usually the job
+            costs: The costs of the resources, parsed by `costs()`
+        """
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._fits(costs))
+            self.n_jobs += 1
+            for res, val in costs.items():
+                self.available[res] -= val
+            self._acquired[key] = dict(costs)
+
+    async def release(self, key: Hashable) -> None:
+        """Give back the slot and the resources taken by a holder
+
+        It's safe to release a holder that holds nothing.
+
+        Args:
+            key: The key to identify the holder
+        """
+        costs = self._acquired.pop(key, None)
+        if costs is None:
+            return
+
+        async with self._condition:
+            self.n_jobs -= 1
+            for res, val in costs.items():
+                self.available[res] += val
+            self._condition.notify_all()
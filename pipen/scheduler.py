@@ -1,9 +1,13 @@
 """Provide builting schedulers"""
 from __future__ import annotations
 
-from typing import Type
+import shlex
+from abc import ABC, abstractmethod
+from os import PathLike
+from typing import ClassVar, Sequence, Type
 
 from xqute import Scheduler
+from xqute.utils import a_write_text
 from xqute.schedulers.local_scheduler import (
     LocalJob as XquteLocalJob,
     LocalScheduler as XquteLocalScheduler,
@@ -36,18 +40,165 @@ class LocalScheduler(XquteLocalScheduler):
     job_class = LocalJob
 
 
-class SgeJob(XquteSgeJob, Job):
+class ArrayJob(Job, ABC):
+    """Job class for schedulers supporting array jobs
+
+    With the scheduler option `array_jobs`, the jobs submitted together
+    (see `Job.bundle`) are submitted as one array job, with each task
+    running the wrapped script of one job.
+
+    Attributes:
+        ARRAY_TASK_PATTERN: The pattern in the paths of the stdout/stderr
+            files of the array job, replaced with the task id by the
+            scheduler
+        ARRAY_TASK_INDEX: The shell expression of the 0-based index of the
+            task in the script of the array job
+    """
+
+    ARRAY_TASK_PATTERN: ClassVar[str]
+    ARRAY_TASK_INDEX: ClassVar[str]
+
+    @abstractmethod
+    def array_options(self, size: int, forks: int) -> str:
+        """The options of the array job for the scheduler
+
+        Args:
+            size: The number of tasks
+            forks: The max number of tasks running at the same time
+
+        Returns:
+            The option lines to put after the shebang
+        """
+
+    @abstractmethod
+    def array_task_jid(self, index: int) -> str:
+        """The jid of a task of the array job
+
+        Args:
+            index: The 0-based index of the task
+
+        Returns:
+            The jid of the task
+        """
+
+    async def bundle_script(
+        self,
+        scheduler: Scheduler,
+        scripts: Sequence[PathLike],
+    ) -> PathLike:
+        """Write the script of the array job, or of the bundle if
+        `array_jobs` is not enabled
+
+        Args:
+            scheduler: The scheduler
+            scripts: The wrapped scripts of this job and the jobs
+                submitted together
+
+        Returns:
+            The path of the script
+        """
+        if not scheduler.config.get("array_jobs"):
+            return await super().bundle_script(scheduler, scripts)
+
+        # The tasks don't write to the stdout/stderr files of this job
+        shebang = (
+            self.shebang(scheduler)
+            .replace(
+                str(self.stdout_file),
+                str(
+                    self.metadir
+                    / f"job.array.{self.ARRAY_TASK_PATTERN}.stdout"
+                ),
+            )
+            .replace(
+                str(self.stderr_file),
+                str(
+                    self.metadir
+                    / f"job.array.{self.ARRAY_TASK_PATTERN}.stderr"
+                ),
+            )
+        )
+        options = self.array_options(len(scripts), scheduler.config.forks)
+        script_list = "\n".join(
+            f"    {shlex.quote(str(script))}" for script in scripts
+        )
+        array_script = self.metadir / f"job.array.{scheduler.name}"
+        await a_write_text(
+            array_script,
+            f"{shebang}{options}\n\n"
+            f"scripts=(\n{script_list}\n)\n"
+            f"exec {self.__class__.CMD_WRAPPER_SHELL} "
+            f'"${{scripts[{self.ARRAY_TASK_INDEX}]}}"\n',
+        )
+        return array_script
+
+    def bundled_jid(self, scheduler: Scheduler, index: int) -> int | str:
+        """Get the jid of a job submitted together with this one, which is
+        the jid of the task with array jobs
+
+        This job itself gets the jid of the first task, so that killing it
+        or checking if it is running doesn't act on the whole array.
+
+        Args:
+            scheduler: The scheduler
+            index: The index of the job in the bundle, 0 for this job
+                itself, and starting from 1 for the jobs in `self.bundle`
+
+        Returns:
+            The jid of the job
+        """
+        if not scheduler.config.get("array_jobs"):
+            return super().bundled_jid(scheduler, index)
+        return self.array_task_jid(index)
+
+
+class SgeJob(XquteSgeJob, ArrayJob):
     """Job class for SGE scheduler"""
 
+    ARRAY_TASK_PATTERN = "$TASK_ID"
+    ARRAY_TASK_INDEX = "$((SGE_TASK_ID - 1))"
+
+    def array_options(self, size: int, forks: int) -> str:
+        """The options of the array job for qsub"""
+        return f"#$ -t 1-{size}\n#$ -tc {forks}"
+
+    def array_task_jid(self, index: int) -> str:
+        """The jid of a task, with the 1-based task id"""
+        return f"{self.jid}.{index + 1}"
+
 
 class SgeScheduler(XquteSgeScheduler):
     """SGE scheduler"""
     job_class = SgeJob
 
+    async def submit_job(self, job: Job) -> str:
+        """Submit a job to SGE
 
-class SlurmJob(XquteSlurmJob, Job):
+        Args:
+            job: The job
+
+        Returns:
+            The job id, without the task range for array jobs
+        """
+        # Your job-array 613815.1-10:1 (...) has been submitted
+        jid = await super().submit_job(job)
+        return jid.split(".")[0]
+
+
+class SlurmJob(XquteSlurmJob, ArrayJob):
     """Job class for Slurm scheduler"""
 
+    ARRAY_TASK_PATTERN = "%a"
+    ARRAY_TASK_INDEX = "$SLURM_ARRAY_TASK_ID"
+
+    def array_options(self, size: int, forks: int) -> str:
+        """The options of the array job for sbatch"""
+        return f"#SBATCH --array=0-{size - 1}%{forks}"
+
+    def array_task_jid(self, index: int) -> str:
+        """The jid of a task, with the 0-based task id"""
+        return f"{self.jid}_{index}"
+
 
 class SlurmScheduler(XquteSlurmScheduler):
     """Slurm scheduler"""
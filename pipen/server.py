@@ -0,0 +1,539 @@
+"""Provide PipenServer class that runs pipelines on requests, in one
+long-lived event loop"""
+from __future__ import annotations
+
+import asyncio
+import copy
+import hmac
+import json
+import os
+import signal
+from contextlib import nullcontext
+from http import HTTPStatus
+from os import PathLike
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Sequence, Tuple, Type
+
+from diot import Diot
+
+from .defaults import SERVE_SOCKET
+from .exceptions import (
+    ConfigurationError,
+    PipenOrProcNameError,
+    ProcDependencyError,
+)
+from .pipen import Pipen
+from .proc import Proc, ProcMeta
+from .utils import _to_pipeline, copy_dict, is_valid_name, logger
+
+# The options whose items are updated instead of replaced by the
+# configurations of the run requests
+_DICT_OPTIONS = ("plugin_opts", "scheduler_opts", "template_opts")
+
+
+def clone_procs(starts: Sequence[Type[Proc]]) -> Dict[Type[Proc], Type[Proc]]:
+    """Clone the processes that can be reached from the start processes
+
+    Processes are singletons, with the output data and the workdir stored
+    at class level. Cloning them keeps the state of the runs of the same
+    pipeline separate. The clones subclass the original processes, with
+    the same names and the required processes replaced by their clones.
+
+    Args:
+        starts: The start processes
+
+    Returns:
+        The clones with the original processes as keys
+
+    Raises:
+        ProcDependencyError: When there is a cyclic dependency
+    """
+    reached = set()
+    stack = list(starts)
+    while stack:
+        proc = stack.pop()
+        if proc in reached:
+            continue
+        reached.add(proc)
+        stack.extend(proc.nexts or ())
+        stack.extend(proc.requires or ())  # type: ignore
+
+    # The number of the required processes that are not cloned yet
+    unmet = {proc: len(proc.requires or ()) for proc in reached}  # type: ignore
+    ready = [proc for proc, count in unmet.items() if count == 0]
+    clones: Dict[Type[Proc], Type[Proc]] = {}
+    while ready:
+        proc = ready.pop()
+        requires = proc.requires
+        clone = type(proc)(
+            proc.__name__,
+            (proc,),
+            {
+                "requires": (
+                    [clones[req] for req in requires]  # type: ignore
+                    if requires
+                    else None
+                ),
+                "output_data": None,
+                "workdir": None,
+                "__doc__": proc.__doc__,
+                "__module__": proc.__module__,
+            },
+        )
+        clone.name = proc.name
+        clone.__meta__ = proc.__meta__
+        clones[proc] = clone  # type: ignore
+        for nxt in proc.nexts or ():
+            if nxt in unmet and proc in (nxt.requires or ()):  # type: ignore
+                unmet[nxt] -= 1
+                if unmet[nxt] == 0:
+                    ready.append(nxt)
+
+    if len(clones) < len(reached):
+        raise ProcDependencyError(
+            "Cyclic dependency: "
+            f"{sorted(proc.name for proc in reached if proc not in clones)}"
+        )
+    return clones
+
+
+class PipenServer:
+    """A long-lived service that runs pipelines on requests
+
+    The runs are scheduled in the event loop of the service, so several
+    runs can be running at the same time. The pipelines are loaded only
+    once, and the plugins and the parsed configuration files are reused
+    across runs. For each run, a copy of the pipeline is created with its
+    processes cloned (see `clone_procs()`), so that the runs don't share
+    any process state. Runs with the same pipeline name and workdir share
+    the job directories, so they are queued to run one after another.
+
+    The API is served over HTTP, on a unix socket (`~/.pipen/serve.sock`
+    by default) or a TCP port. Anyone who can send requests can run code
+    as the user running the service, so the unix socket is created to be
+    only accessible by the user, and a token is required for TCP, sent
+    as `Authorization: Bearer <token>` with the requests.
+
+    - `POST /runs`: Submit a run, with a JSON object as the body, with
+        keys `pipeline` (the pipeline spec, required, see
+        `pipen.utils.load_pipeline()`), `profile`, `targets`, `name`,
+        `outdir` and `config` (the configurations to override)
+    - `GET /runs`: List the runs
+    - `GET /runs/<id>`: Get a run
+
+    A run has `id`, `pipeline`, `name`, `profile`, `targets`, `status`
+    (one of queued, running, succeeded, failed and error) and `error`.
+
+    Note that the plugins are enabled or disabled as the pipelines are
+    loaded, and they are shared by all runs, so pipelines requiring
+    different plugins should not be served together.
+
+    Args:
+        host: The host to listen on over TCP, instead of the unix socket
+        port: The port to listen on over TCP
+        socket: The path to the unix socket to listen on. If given, `host`
+            and `port` are ignored.
+        token: The token required to send the requests, required for TCP
+
+    Raises:
+        ConfigurationError: When listening on TCP without a token
+    """
+
+    def __init__(
+        self,
+        host: str | None = None,
+        port: int = 8765,
+        socket: str | PathLike | None = None,
+        token: str | None = None,
+    ) -> None:
+        if socket is None and host is None:
+            socket = Path(SERVE_SOCKET).expanduser()
+        if socket is None and not token:
+            raise ConfigurationError(
+                "A token is required to serve pipelines over TCP."
+            )
+        self.host = host
+        self.port = port
+        self.socket = socket
+        self.token = token
+        self.runs: Dict[str, Diot] = {}
+        self.server: asyncio.AbstractServer = None
+        # The pipelines loaded from the specs
+        self._pipelines: Dict[str, Pipen] = {}
+        # The tasks and the pipelines of the runs that are not done
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._running: Dict[str, Pipen] = {}
+        # The locks to queue the runs sharing the same workdir
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # The event to stop serving and the signal causing it, see `serve()`
+        self._stopped: asyncio.Event | None = None
+        self._stop_signal = signal.SIGTERM
+
+    def submit(
+        self,
+        pipeline: str,
+        profile: str = "default",
+        targets: Sequence[str] | None = None,
+        name: str | None = None,
+        outdir: str | PathLike | None = None,
+        config: Mapping[str, Any] | None = None,
+    ) -> Diot:
+        """Submit a run of a pipeline
+
+        Args:
+            pipeline: The pipeline spec, in the format of
+                `<module[.submodule]>:name` or `/path/to/script.py:name`
+            profile: The profile to use for the run
+            targets: The names of the processes to run, together with the
+                processes they require. Run all processes if not given.
+            name: The name of the pipeline for the run. The name of the
+                loaded pipeline is used if not given.
+            outdir: The output directory for the run. The output directory
+                of the loaded pipeline is used if not given.
+            config: The configurations to override for the run
+
+        Returns:
+            The run
+
+        Raises:
+            PipenOrProcNameError: When the name is invalid
+        """
+        if name is not None and not is_valid_name(name):
+            raise PipenOrProcNameError(
+                fr"Invalid pipeline name: {name}, expecting '^[\w.-]$'"
+            )
+
+        if pipeline not in self._pipelines:
+            self._pipelines[pipeline] = _to_pipeline(pipeline)
+        loaded = self._pipelines[pipeline]
+
+        run = Diot(
+            id=str(len(self.runs) + 1),
+            pipeline=pipeline,
+            name=name or loaded.name,
+            profile=profile,
+            targets=list(targets or []),
+            status="queued",
+            error=None,
+        )
+        self.runs[run.id] = run
+        self._tasks[run.id] = asyncio.ensure_future(
+            self._run(run, loaded, outdir, config or {})
+        )
+        return run
+
+    async def wait(self, run_id: str) -> Diot:
+        """Wait for a run to be done
+
+        Args:
+            run_id: The id of the run
+
+        Returns:
+            The run
+        """
+        task = self._tasks.get(run_id)
+        if task:
+            await asyncio.wait([task])
+        return self.runs[run_id]
+
+    async def start(self) -> None:
+        """Start listening for the requests"""
+        if self.socket:
+            socket = Path(self.socket)
+            socket.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            # Create the socket only accessible by the user, rather than
+            # changing the permissions after it is created and listened on
+            umask = os.umask(0o177)
+            try:
+                self.server = await asyncio.start_unix_server(
+                    self._handle,
+                    path=str(socket),
+                )
+            finally:
+                os.umask(umask)
+            logger.info("Serving pipelines on %s", self.socket)
+        else:
+            self.server = await asyncio.start_server(
+                self._handle,
+                host=self.host,
+                port=self.port,
+            )
+            logger.info("Serving pipelines on http://%s:%s", self.host, self.port)
+
+    async def close(self, sig: signal.Signals = signal.SIGTERM) -> None:
+        """Stop listening, cancel the runs that are not done and wait
+        for them
+
+        Args:
+            sig: The signal that causes the cancellation. xqute only kills
+                the jobs submitted when cancelled by a signal, so that the
+                jobs are not left running after the service stops.
+        """
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+        self.cancel(sig)
+        if self._tasks:
+            await asyncio.wait(list(self._tasks.values()))
+
+    def cancel(self, sig: signal.Signals | None = None) -> None:
+        """Cancel the runs that are not done
+
+        Args:
+            sig: The signal that causes the cancellation. The jobs
+                submitted are killed only if it is given.
+        """
+        for run_id, task in self._tasks.items():
+            pipeline = self._running.get(run_id)
+            if not pipeline or not pipeline._running_procs:
+                task.cancel()
+                continue
+            for proc in pipeline._running_procs:
+                if proc.xqute._cancelling is False:
+                    proc.xqute.cancel(sig)
+
+    def _on_signal(self, sig: signal.Signals) -> None:
+        """Handle SIGINT or SIGTERM, also for the runs, whose processes
+        take over the signals
+
+        Stop serving if serving, otherwise cancel the runs.
+
+        Args:
+            sig: The signal
+        """
+        if self._stopped is not None:
+            logger.warning("Got signal %r, stopping the server ...", sig.name)
+            self._stop_signal = sig
+            self._stopped.set()
+        else:
+            self.cancel(sig)
+
+    async def serve(self) -> None:
+        """Start listening and serve until SIGINT or SIGTERM is received"""
+        loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, self._on_signal, sig)
+
+        await self.start()
+        try:
+            await self._stopped.wait()
+        finally:
+            self._stopped = None
+            await self.close(self._stop_signal)
+
+    async def _run(
+        self,
+        run: Diot,
+        loaded: Pipen,
+        outdir: str | PathLike | None,
+        config: Mapping[str, Any],
+    ) -> None:
+        """Run a pipeline with its processes cloned
+
+        Args:
+            run: The run
+            loaded: The pipeline loaded from the spec
+            outdir: The output directory for the run
+            config: The configurations to override for the run
+        """
+        clones: Dict[Type[Proc], Type[Proc]] = {}
+        try:
+            pipeline = self._new_pipeline(run, loaded, outdir, config)
+            clones = clone_procs(loaded.starts)  # type: ignore
+            pipeline.starts = [clones[start] for start in loaded.starts]  # type: ignore
+            workdir = str(Path(pipeline.config.workdir).resolve() / run.name)
+            async with self._locks.setdefault(workdir, asyncio.Lock()):
+                run.status = "running"
+                self._running[run.id] = pipeline
+                succeeded = await pipeline.async_run(
+                    run.profile,
+                    run.targets or None,
+                )
+        except asyncio.CancelledError:
+            run.status = "error"
+            run.error = "Cancelled"
+        except Exception as exc:
+            logger.exception("Run %s of %s failed:", run.id, run.pipeline)
+            run.status = "error"
+            run.error = f"{type(exc).__name__}: {exc}"
+        else:
+            run.status = "succeeded" if succeeded else "failed"
+        finally:
+            self._tasks.pop(run.id, None)
+            self._running.pop(run.id, None)
+            # Release the process objects of the run
+            for clone in clones.values():
+                ProcMeta._INSTANCES.pop(clone, None)
+
+    def _new_pipeline(
+        self,
+        run: Diot,
+        loaded: Pipen,
+        outdir: str | PathLike | None,
+        config: Mapping[str, Any],
+    ) -> Pipen:
+        """Create a copy of a loaded pipeline for a run, without the
+        state of other runs
+
+        Args:
+            run: The run
+            loaded: The pipeline loaded from the spec
+            outdir: The output directory for the run
+            config: The configurations to override for the run
+
+        Returns:
+            The pipeline for the run
+        """
+        pipeline = copy.copy(loaded)
+        pipeline.name = run.name
+        if outdir:
+            pipeline.outdir = Path(outdir).resolve()
+        pipeline.procs = None
+        pipeline.pbar = None
+        pipeline.pool = None
+        pipeline.run_state = None
+        pipeline.file_digests = None
+        pipeline.stat_cache = None
+        pipeline.workdir = None
+        pipeline._running_procs = []
+        pipeline._resumed_procs = set()
+        pipeline._input_files = []
+        # The plugins are enabled or disabled when the pipeline is loaded
+        pipeline.plugin_context = nullcontext()
+        # xqute takes over the signals, hand them back to the server
+        pipeline._signal_handler = self._on_signal
+        pipeline.config = Diot(copy_dict(loaded.config, 3))
+        pipeline._kwargs = copy_dict(loaded._kwargs, 3)  # type: ignore
+        for key, value in config.items():
+            if key in _DICT_OPTIONS:
+                pipeline._kwargs.setdefault(key, {}).update(value)
+            else:
+                pipeline._kwargs[key] = value
+        if "workdir" in config:
+            pipeline.config.workdir = config["workdir"]
+        return pipeline
+
+    async def _handle(
+        self,
+        reader: asyncio.StreamReader,
+        writer: asyncio.StreamWriter,
+    ) -> None:
+        """Handle an HTTP request, one request per connection
+
+        Args:
+            reader: The reader of the connection
+            writer: The writer of the connection
+        """
+        try:
+            method, target, _ = (
+                (await reader.readline()).decode("latin-1").split(" ", 2)
+            )
+            headers = {}
+            while True:
+                line = (await reader.readline()).decode("latin-1")
+                if not line.strip():
+                    break
+                key, _, value = line.partition(":")
+                headers[key.strip().lower()] = value.strip()
+            body = await reader.readexactly(
+                int(headers.get("content-length", 0))
+            )
+        except (ValueError, asyncio.IncompleteReadError):
+            status, payload = HTTPStatus.BAD_REQUEST, {
+                "error": "Malformed request"
+            }
+        else:
+            if self._authorized(headers):
+                status, payload = self._dispatch(
+                    method,
+                    target.split("?", 1)[0].rstrip("/"),
+                    body,
+                )
+            else:
+                status, payload = HTTPStatus.UNAUTHORIZED, {
+                    "error": "Unauthorized"
+                }
+
+        content = json.dumps(payload).encode()
+        writer.write(
+            (
+                f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                "Content-Type: application/json\r\n"
+                f"Content-Length: {len(content)}\r\n"
+                "Connection: close\r\n\r\n"
+            ).encode("latin-1")
+            + content
+        )
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    def _authorized(self, headers: Mapping[str, str]) -> bool:
+        """Check whether a request is authorized by the token
+
+        Args:
+            headers: The headers of the request, with lowercase names
+
+        Returns:
+            True if no token is required or the token matches
+        """
+        if not self.token:
+            return True
+        return hmac.compare_digest(
+            headers.get("authorization", "").encode("latin-1"),
+            f"Bearer {self.token}".encode(),
+        )
+
+    def _dispatch(
+        self,
+        method: str,
+        path: str,
+        body: bytes,
+    ) -> Tuple[HTTPStatus, Any]:
+        """Dispatch a request to the API
+
+        Args:
+            method: The HTTP method
+            path: The path of the request
+            body: The body of the request
+
+        Returns:
+            The status and the payload of the response
+        """
+        parts: List[str] = path.strip("/").split("/")
+        if parts[0] != "runs" or len(parts) > 2:
+            return HTTPStatus.NOT_FOUND, {"error": f"No such path: {path}"}
+
+        if len(parts) == 2:
+            if method != "GET":
+                return HTTPStatus.METHOD_NOT_ALLOWED, {
+                    "error": f"Method not allowed: {method}"
+                }
+            if parts[1] not in self.runs:
+                return HTTPStatus.NOT_FOUND, {
+                    "error": f"No such run: {parts[1]}"
+                }
+            return HTTPStatus.OK, self.runs[parts[1]]
+
+        if method == "GET":
+            return HTTPStatus.OK, list(self.runs.values())
+
+        if method != "POST":
+            return HTTPStatus.METHOD_NOT_ALLOWED, {
+                "error": f"Method not allowed: {method}"
+            }
+
+        try:
+            request = json.loads(body or b"{}")
+            if not isinstance(request, dict) or not isinstance(
+                request.get("pipeline"), str
+            ):
+                raise ValueError("Expecting a JSON object with 'pipeline'")
+            run = self.submit(**request)
+        except Exception as exc:
+            return HTTPStatus.BAD_REQUEST, {
+                "error": f"{type(exc).__name__}: {exc}"
+            }
+        return HTTPStatus.ACCEPTED, run
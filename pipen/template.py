@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from typing import Any, Mapping, Type
+from typing import Any, List, Mapping, Sequence, Type
 
 from liquid import Liquid
 
@@ -148,3 +148,36 @@ def get_template_engine(template: str | Type[Template]) -> Type[Template]:
             return obj
 
     raise NoSuchTemplateEngineError(str(template))
+
+
+# The script template compiled once in each worker process rendering
+# the scripts of the jobs (see `Proc._render_scripts()`)
+_worker_template: Template = None
+
+
+def _init_render_worker(
+    engine: Type[Template],
+    source: str,
+    options: Mapping[str, Any],
+) -> None:
+    """Compile the template in a worker process
+
+    Args:
+        engine: The template engine
+        source: The source of the template
+        options: The options for the template engine
+    """
+    global _worker_template
+    _worker_template = engine(source, **options)
+
+
+def _render_in_worker(data: Sequence[Mapping[str, Any]]) -> List[str]:
+    """Render the template compiled in a worker process
+
+    Args:
+        data: A chunk of data to render the template with
+
+    Returns:
+        The rendered strings
+    """
+    return [_worker_template.render(dat) for dat in data]
@@ -1,12 +1,15 @@
 """Provide some utilities"""
 from __future__ import annotations
 
+import hashlib
+import os
 import re
 import sys
 import importlib
 import importlib.util
 import logging
 import textwrap
+import threading
 import typing
 from itertools import groupby
 from operator import itemgetter
@@ -19,15 +22,18 @@ from typing import (
     Any,
     Callable,
     DefaultDict,
+    Dict,
     Iterable,
     List,
     Mapping,
     Sequence,
+    Set,
     Tuple,
     Type,
 )
 
 import diot
+import rtoml
 import simplug
 from rich.console import Console
 from rich.logging import RichHandler as _RichHandler
@@ -39,7 +45,10 @@ from .defaults import (
     CONSOLE_DEFAULT_WIDTH,
     CONSOLE_WIDTH_WITH_PANEL,
     CONSOLE_WIDTH_SHIFT,
+    JOB_RUNTIMES_FILE,
     LOGGER_NAME,
+    SCRIPT_DIGESTS_FILE,
+    STAT_CACHE_SIZE,
 )
 from .version import __version__
 
@@ -415,6 +424,86 @@ def pipen_banner() -> RenderableType:
     return table
 
 
+def _dir_mtime(
+    path: str,
+    dir_depth: int,
+    manifest: Mapping[str, Any] | None = None,
+    with_manifest: bool = False,
+) -> Tuple[float, Dict[str, Any] | None]:
+    """Get the last modification time of the contents in a directory
+
+    The directory is listed by `os.scandir()`, so that the types of the
+    entries are known without stat-ing them, and each entry is only stat-ed
+    once (without following symbolic links).
+
+    Args:
+        path: The path to the directory
+        dir_depth: The depth (> 0) to check the contents
+        manifest: The manifest of the directory from a previous walk.
+            If the directory is walked to the same depth, and has the same
+            modification time and number of entries as recorded, the
+            entries other than the subdirectories are regarded as unchanged
+            and not stat-ed again. The subdirectories recorded are still
+            checked with their own manifests.
+        with_manifest: Whether to return the manifest of the directory
+
+    Returns:
+        The last modification time of the contents, and the manifest if
+        required, with the depth walked, the modification time (in
+        nanoseconds) and the number of entries of the directory, the last
+        modification time of the entries other than the subdirectories
+        walked, and the manifests of the subdirectories walked.
+    """
+    dir_mtime_ns = os.stat(path).st_mtime_ns if with_manifest else None
+    with os.scandir(path) as it:
+        entries = list(it)
+
+    submanifests = (manifest or {}).get("dirs", {})
+    if (
+        manifest
+        and manifest.get("depth") == dir_depth
+        and manifest.get("mtime_ns") == dir_mtime_ns
+        and manifest.get("entries") == len(entries)
+    ):
+        # No entries added, removed or renamed, only walk the subdirectories
+        file_mtime = manifest["mtime"]
+        subdirs = [
+            (name, os.path.join(path, name)) for name in submanifests
+        ]
+    else:
+        file_mtime = 0.0
+        subdirs = []
+        for entry in entries:
+            if dir_depth > 1 and entry.is_dir():
+                subdirs.append((entry.name, entry.path))
+            else:
+                file_mtime = max(
+                    file_mtime,
+                    entry.stat(follow_symlinks=False).st_mtime,
+                )
+
+    mtime = file_mtime
+    dirs: Dict[str, Any] = {}
+    for name, subdir in subdirs:
+        submtime, dirs[name] = _dir_mtime(
+            subdir,
+            dir_depth - 1,
+            submanifests.get(name),
+            with_manifest,
+        )
+        mtime = max(mtime, submtime)
+
+    if not with_manifest:
+        return mtime, None
+    return mtime, {
+        "depth": dir_depth,
+        "mtime_ns": dir_mtime_ns,
+        "entries": len(entries),
+        "mtime": file_mtime,
+        "dirs": dirs,
+    }
+
+
 def get_mtime(path: str | PathLike, dir_depth: int = 1) -> float:
     """Get the modification time of a path.
     If path is a directory, try to get the last modification time of the
@@ -425,14 +514,295 @@ def get_mtime(path: str | PathLike, dir_depth: int = 1) -> float:
     Returns:
         The last modification time of path
     """
-    path = Path(path)
-    if not path.is_dir() or dir_depth == 0:
-        return path.lstat().st_mtime if path.is_symlink() else path.stat().st_mtime
+    if dir_depth == 0 or not os.path.isdir(path):
+        # The symbolic link itself if path is a symbolic link
+        return os.lstat(path).st_mtime
+
+    return _dir_mtime(os.fspath(path), dir_depth)[0]
+
+
+def get_dir_mtime(
+    path: str | PathLike,
+    dir_depth: int,
+    manifest: Mapping[str, Any] | None = None,
+) -> Tuple[float, Dict[str, Any]]:
+    """Get the last modification time of the contents in a directory, like
+    `get_mtime()`, together with a manifest of the directory to speed up
+    the next call
+
+    The manifest records the modification time and the number of entries
+    of the directory and each subdirectory walked, with the last
+    modification time of the files in them. With the manifest passed, the
+    files in the (sub)directories with the same modification time and
+    number of entries are not stat-ed again. Note that the modification
+    time of a directory changes when entries are added, removed or renamed
+    in it, but not when the files in it are modified in place.
+
+    Args:
+        path: The path to the directory
+        dir_depth: The depth (> 0) to check the contents
+        manifest: The manifest from a previous call
+
+    Returns:
+        The last modification time of the contents and the manifest
+    """
+    mtime, new_manifest = _dir_mtime(
+        os.fspath(path),
+        dir_depth,
+        manifest,
+        with_manifest=True,
+    )
+    return mtime, new_manifest  # type: ignore
 
-    mtime = 0.0
-    for file in path.glob("*"):
-        mtime = max(mtime, get_mtime(file, dir_depth - 1))
-    return mtime
+
+class StatCache:
+    """Cache the results of stat-ing paths during a run of a pipeline
+
+    The same files (e.g. reference files) are usually used by many jobs,
+    and stat-ing them again and again is slow on network file systems.
+    The results are invalidated when the paths are written by pipen (e.g.
+    the outputs of a job are cleared, or generated by the job), together
+    with the results of their parent directories, which depend on the
+    contents, and the paths under them. Each run of a pipeline has its own
+    cache, shared with the processes it runs (see `Proc.stat_cache`).
+
+    Args:
+        maxsize: The max number of paths to cache. The earliest cached ones
+            are dropped when exceeded.
+    """
+
+    def __init__(self, maxsize: int) -> None:
+        self.maxsize = maxsize
+        # The results for each path, with the kinds of the results as keys
+        self._entries: Dict[str, Dict[Any, Any]] = {}
+        # The paths with results cached under each directory, directly or
+        # via their parent directories, to invalidate the whole subtree
+        self._children: Dict[str, Set[str]] = {}
+        # The paths are stat-ed in threads when checking the caches of jobs
+        self._lock = threading.Lock()
+
+    def _link(self, key: str) -> None:
+        """Link a path to its parent directories, with the lock held"""
+        while True:
+            parent = os.path.dirname(key)
+            if parent == key:
+                return
+            children = self._children.setdefault(parent, set())
+            linked = bool(children)
+            children.add(key)
+            if linked:
+                # The parent is linked already
+                return
+            key = parent
+
+    def _unlink(self, key: str) -> None:
+        """Unlink a path from its parent directories if nothing is cached
+        for or under it, with the lock held"""
+        while key not in self._entries and not self._children.get(key):
+            self._children.pop(key, None)
+            parent = os.path.dirname(key)
+            if parent == key:
+                return
+            children = self._children.get(parent)
+            if children is None:  # pragma: no cover
+                return
+            children.discard(key)
+            key = parent
+
+    def _get(self, path: str | PathLike, kind: Any, func: Callable) -> Any:
+        """Get the result from the cache, or compute and cache it
+
+        Args:
+            path: The path
+            kind: The kind of the result
+            func: The function to compute the result, errors are not cached
+
+        Returns:
+            The result
+        """
+        key = os.path.abspath(path)
+        entry = self._entries.get(key)
+        if entry is not None and kind in entry:
+            return entry[kind]
+
+        result = func()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                if len(self._entries) >= self.maxsize:
+                    earliest = next(iter(self._entries))
+                    del self._entries[earliest]
+                    self._unlink(earliest)
+                entry = self._entries[key] = {}
+                self._link(key)
+            entry[kind] = result
+        return result
+
+    def get_mtime(self, path: str | PathLike, dir_depth: int = 1) -> float:
+        """Get the modification time of a path, see `get_mtime()`"""
+        return self._get(
+            path,
+            ("mtime", dir_depth),
+            lambda: get_mtime(path, dir_depth),
+        )
+
+    def get_dir_mtime(
+        self,
+        path: str | PathLike,
+        dir_depth: int,
+        manifest: Mapping[str, Any] | None = None,
+    ) -> Tuple[float, Dict[str, Any]]:
+        """Get the modification time of a directory with its manifest,
+        see `get_dir_mtime()`"""
+        return self._get(
+            path,
+            ("dir_mtime", dir_depth),
+            lambda: get_dir_mtime(path, dir_depth, manifest),
+        )
+
+    def exists(self, path: str | PathLike) -> bool:
+        """Check if a path exists"""
+        return self._get(path, "exists", lambda: os.path.exists(path))
+
+    def islink(self, path: str | PathLike) -> bool:
+        """Check if a path is a symbolic link"""
+        return self._get(path, "islink", lambda: os.path.islink(path))
+
+    def resolve_path(self, path: str | PathLike) -> Path:
+        """Resolve a path like `Path.resolve()`, with the resolved parent
+        directories cached
+
+        Resolving a path stats each of its components, which is slow on
+        network file systems, while paths usually share a few parent
+        directories. So only the last component is checked (whether it is
+        a symbolic link) if the parent directory is resolved before.
+
+        Args:
+            path: The path to resolve
+
+        Returns:
+            The resolved path
+        """
+        path = Path(path)
+        if not path.is_absolute():
+            path = Path.cwd() / path
+        if path.name in ("", "..") or self.islink(path):
+            return path.resolve()
+        parent = path.parent
+        return self._get(parent, "resolved", parent.resolve) / path.name
+
+    def invalidate(self, path: str | PathLike) -> None:
+        """Invalidate the results of a path, its parent directories and the
+        paths under it
+
+        Args:
+            path: The path written
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            stack = [path]
+            while stack:
+                key = stack.pop()
+                self._entries.pop(key, None)
+                stack.extend(self._children.pop(key, ()))
+
+            key = path
+            while True:
+                key = os.path.dirname(key)
+                self._entries.pop(key, None)
+                if os.path.dirname(key) == key:
+                    break
+            self._unlink(path)
+
+    def clear(self) -> None:
+        """Clear the cache"""
+        with self._lock:
+            self._entries.clear()
+            self._children.clear()
+
+
+def load_job_runtimes(proc_workdir: str | PathLike) -> Dict[int, float]:
+    """Load the job runtimes of a process recorded in previous runs
+
+    Args:
+        proc_workdir: The workdir of the process
+
+    Returns:
+        A dict with job indexes as keys and runtimes in seconds as values.
+        Empty if nothing has been recorded.
+    """
+    runtimes_file = Path(proc_workdir) / JOB_RUNTIMES_FILE
+    try:
+        runtimes = rtoml.load(runtimes_file).get("runtimes", {})
+    except (FileNotFoundError, rtoml.TomlParsingError):
+        return {}
+
+    return {int(index): float(runtime) for index, runtime in runtimes.items()}
+
+
+def save_job_runtimes(
+    proc_workdir: str | PathLike,
+    runtimes: Mapping[int, float],
+) -> None:
+    """Save the job runtimes of a process for later runs
+
+    Args:
+        proc_workdir: The workdir of the process
+        runtimes: A dict with job indexes as keys and runtimes in seconds
+            as values
+    """
+    rtoml.dump(
+        {"runtimes": {str(index): rt for index, rt in runtimes.items()}},
+        Path(proc_workdir) / JOB_RUNTIMES_FILE,
+    )
+
+
+def script_digest(script: str) -> str:
+    """Compute the digest of a job script
+
+    Args:
+        script: The content of the script
+
+    Returns:
+        The hex digest
+    """
+    return hashlib.blake2b(script.encode(), digest_size=16).hexdigest()
+
+
+def load_script_digests(proc_workdir: str | PathLike) -> Dict[int, str]:
+    """Load the digests of the job scripts of a process written in
+    previous runs
+
+    Args:
+        proc_workdir: The workdir of the process
+
+    Returns:
+        A dict with job indexes as keys and the digests as values.
+        Empty if nothing has been recorded.
+    """
+    digests_file = Path(proc_workdir) / SCRIPT_DIGESTS_FILE
+    try:
+        digests = rtoml.load(digests_file).get("digests", {})
+    except (FileNotFoundError, rtoml.TomlParsingError):
+        return {}
+
+    return {int(index): digest for index, digest in digests.items()}
+
+
+def save_script_digests(
+    proc_workdir: str | PathLike,
+    digests: Mapping[int, str],
+) -> None:
+    """Save the digests of the job scripts of a process
+
+    Args:
+        proc_workdir: The workdir of the process
+        digests: A dict with job indexes as keys and the digests as values
+    """
+    rtoml.dump(
+        {"digests": {str(index): dg for index, dg in digests.items()}},
+        Path(proc_workdir) / SCRIPT_DIGESTS_FILE,
+    )
 
 
 def is_subclass(obj: Any, cls: type) -> bool:
@@ -617,6 +987,58 @@ def _get_obj_from_spec(spec: str) -> Any:
     return getattr(module, name)
 
 
+def _to_pipeline(
+    obj: str | Type[Proc] | Type[ProcGroup] | Type[Pipen] | Pipen,
+    **kwargs: Any,
+) -> Pipen:
+    """Convert a Pipen, Proc or ProcGroup object to a Pipen object
+
+    Args:
+        obj: The Pipen, Proc or ProcGroup object, or a spec in the format of
+            `part1:part2` to load it. See `load_pipeline()`.
+        kwargs: The kwargs to pass to the Pipen constructor
+
+    Returns:
+        The Pipen object
+
+    Raises:
+        TypeError: If obj or loaded obj is not a Pipen, Proc or ProcGroup
+        object
+    """
+    from .pipen import Pipen
+    from .proc import Proc
+    from .procgroup import ProcGroup
+
+    if isinstance(obj, str):
+        obj = _get_obj_from_spec(obj)
+    if isinstance(obj, Pipen) or (
+        isinstance(obj, type) and issubclass(obj, (Pipen, Proc, ProcGroup))
+    ):
+        pass
+    else:
+        raise TypeError(
+            "Expected a Pipen, Proc, ProcGroup class, or a Pipen object, "
+            f"got {type(obj)}"
+        )
+
+    pipeline = obj
+    if isinstance(obj, type) and issubclass(obj, Proc):
+        kwargs.setdefault("name", f"{obj.name}Pipeline")
+        pipeline = Pipen(**kwargs).set_starts(obj)
+
+    elif isinstance(obj, type) and issubclass(obj, ProcGroup):
+        pipeline = obj().as_pipen(**kwargs)  # type: ignore
+
+    elif isinstance(obj, type) and issubclass(obj, Pipen):
+        # Avoid "pipeline" to be used as pipeline name by varname
+        (pipeline, ) = (obj(**kwargs), )  # type: ignore
+
+    elif isinstance(obj, Pipen):
+        pipeline._kwargs.update(kwargs)
+
+    return pipeline  # type: ignore
+
+
 async def load_pipeline(
     obj: str | Type[Proc] | Type[ProcGroup] | Type[Pipen],
     argv0: str | None = None,
@@ -651,10 +1073,6 @@ async def load_pipeline(
         TypeError: If obj or loaded obj is not a Pipen, Proc or ProcGroup
         object
     """
-    from .pipen import Pipen
-    from .proc import Proc
-    from .procgroup import ProcGroup
-
     old_argv = sys.argv
     if argv0 is None:
         # Set it at runtime to allow LOADING_ARGV0 to be monkey-patched
@@ -665,32 +1083,7 @@ async def load_pipeline(
     sys.argv = [argv0] + list(argv1p)
 
     try:
-        if isinstance(obj, str):
-            obj = _get_obj_from_spec(obj)
-        if isinstance(obj, Pipen) or (
-            isinstance(obj, type) and issubclass(obj, (Pipen, Proc, ProcGroup))
-        ):
-            pass
-        else:
-            raise TypeError(
-                "Expected a Pipen, Proc, ProcGroup class, or a Pipen object, "
-                f"got {type(obj)}"
-            )
-
-        pipeline = obj
-        if isinstance(obj, type) and issubclass(obj, Proc):
-            kwargs.setdefault("name", f"{obj.name}Pipeline")
-            pipeline = Pipen(**kwargs).set_starts(obj)
-
-        elif isinstance(obj, type) and issubclass(obj, ProcGroup):
-            pipeline = obj().as_pipen(**kwargs)  # type: ignore
-
-        elif isinstance(obj, type) and issubclass(obj, Pipen):
-            # Avoid "pipeline" to be used as pipeline name by varname
-            (pipeline, ) = (obj(**kwargs), )  # type: ignore
-
-        elif isinstance(obj, Pipen):
-            pipeline._kwargs.update(kwargs)
+        pipeline = _to_pipeline(obj, **kwargs)
 
         # Initialize the pipeline so that the arguments definied by
         # other plugins (i.e. pipen-args) to take in place.
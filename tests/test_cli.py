@@ -56,3 +56,54 @@ def test_version():
     assert "pipen" in out
     assert "python" in out
     assert "liquidpy" in out
+
+
+def test_exec_targets(tmp_path):
+    script = tmp_path / "pipeline.py"
+    script.write_text(
+        "from pipen import Pipen, Proc\n"
+        "class P1(Proc):\n"
+        "    input = 'a'\n"
+        "    input_data = [1]\n"
+        "    output = 'a:var:{{in.a}}'\n"
+        "class P2(Proc):\n"
+        "    requires = P1\n"
+        "    input = 'a'\n"
+        "    output = 'a:var:{{in.a}}'\n"
+        "class P3(Proc):\n"
+        "    requires = P1\n"
+        "    input = 'a'\n"
+        "    output = 'a:var:{{in.a}}'\n"
+        "pipeline = Pipen(\n"
+        "    name='Pipeline',\n"
+        f"    workdir={str(tmp_path / '.pipen')!r},\n"
+        f"    outdir={str(tmp_path / 'outdir')!r},\n"
+        ").set_starts(P1)\n"
+    )
+    out = cmdoutput(["pipen", "exec", f"{script}:pipeline", "--target", "P2"])
+    assert "# procs         : 2" in out
+    assert "P2: >>> [END]" in out
+    assert "P3: " not in out
+
+    out = cmdoutput(["pipen", "exec", f"{script}:pipeline", "-t", "P4"])
+    assert "Target process is not in the pipeline: P4" in out
+
+
+def test_plan(tmp_path):
+    script = tmp_path / "pipeline.py"
+    script.write_text(
+        "from pipen import Pipen, Proc\n"
+        "class P1(Proc):\n"
+        "    input = 'a'\n"
+        "    input_data = [1, 2]\n"
+        "    output = 'a:var:{{in.a}}'\n"
+        "    script = 'echo {{in.a}}'\n"
+        "pipeline = Pipen(\n"
+        "    name='Pipeline',\n"
+        f"    workdir={str(tmp_path / '.pipen')!r},\n"
+        f"    outdir={str(tmp_path / 'outdir')!r},\n"
+        ").set_starts(P1)\n"
+    )
+    out = cmdoutput(["pipen", "plan", f"{script}:pipeline", "--jobs"])
+    assert "job.rc != 0 (2)" in out
+    assert "P1: [0-1] job.rc != 0" in out
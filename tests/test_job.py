@@ -1,4 +1,5 @@
 from pipen.exceptions import (
+    ConfigurationError,
     ProcInputTypeError,
     ProcOutputNameError,
     ProcOutputTypeError,
@@ -10,7 +11,8 @@ import os
 import time
 from pathlib import Path
 
-from pipen import Proc
+from pipen import Pipen, Proc, plugin
+from pipen._job_store import MISSING
 
 from .helpers import (  # noqa: F401
     ErrorProc,
@@ -142,6 +144,240 @@ def test_check_cached_script_file_newer(caplog, pipen, infile):
     assert "Not cached (script file is newer" in caplog.text
 
 
+@pytest.mark.forked
+def test_script_file_not_checked_if_digest_recorded(pipen, monkeypatch):
+    proc = Proc.from_proc(
+        NormalProc,
+        name="proc_script_not_checked",
+        input_data=[1, 2],
+    )
+    pipen.set_starts(proc).run()
+
+    checked = []
+    is_file = Path.is_file
+
+    def tracked_is_file(path):
+        if path.name == "job.script":
+            checked.append(path)
+        return is_file(path)
+
+    monkeypatch.setattr(Path, "is_file", tracked_is_file)
+    pipen.set_starts(proc).run()
+    assert checked == []
+
+
+@pytest.mark.forked
+def test_script_written_only_if_changed(caplog, pipen):
+    proc = Proc.from_proc(
+        NormalProc,
+        name="proc_script_written",
+        input_data=[1],
+    )
+    pipen.set_starts(proc).run()
+
+    script_file = proc.workdir / "0" / "job.script"
+    mtime = script_file.stat().st_mtime - 10
+    os.utime(script_file, (mtime, mtime))
+    pipen.set_starts(proc).run()
+    # not written again
+    assert script_file.stat().st_mtime == mtime
+    assert "Job script updated" not in caplog.text
+
+    class UpdatedProc(NormalProc):
+        script = "echo {{in.input}} updated"
+
+    proc2 = Proc.from_proc(
+        UpdatedProc,
+        name="proc_script_written",
+        input_data=[1],
+    )
+    pipen.set_starts(proc2).run()
+    assert "Job script updated" in caplog.text
+    assert script_file.read_text() == "echo 1 updated"
+
+
+@pytest.mark.forked
+def test_job_store(tmp_path):
+    import tracemalloc
+    from pipen._job_store import JobStore
+    from pipen.scheduler import LocalJob
+    from xqute.defaults import JobStatus
+
+    n_jobs = 2000
+    store = JobStore(tmp_path, n_jobs)
+    LocalJob(0, "", tmp_path, store=store)
+    tracemalloc.start()
+    jobs = [LocalJob(i, "", tmp_path, store=store) for i in range(n_jobs)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    # the jobs are only views on the store
+    assert size / n_jobs < 300
+    assert all(vars(job) == {} for job in jobs)
+
+    job = jobs[1]
+    job.status = JobStatus.RUNNING
+    job.trial_count += 1
+    job._error_retry = True
+    assert store.status[1] == JobStatus.RUNNING
+    assert job.prev_status == JobStatus.INIT
+    assert job.trial_count == 1 and job._error_retry
+    assert job._num_retries is None
+    assert job.metadir == tmp_path / "1"
+    assert jobs[0].status == JobStatus.INIT
+
+    job.cmd = ["bash", job.script_file]
+    assert job.cmd == ["bash", tmp_path / "1" / "job.script"]
+    assert jobs[2].cmd == ""
+    assert store.cmds == {}
+
+
+@pytest.mark.forked
+def test_low_memory(tmp_path):
+    submitted = []
+
+    class LowMemoryPlugin:
+        @plugin.impl
+        async def on_job_submitted(job):
+            # released once put, and computed again when accessed
+            submitted.append(
+                (
+                    job._store.inputs["in"][job.index] is not MISSING,
+                    job._store.output_done(job.index),
+                    job.input["in"],
+                    job.output["out"],
+                )
+            )
+
+    class LowMemoryProc(Proc):
+        input = "in:file"
+        input_data = [tmp_path / "a.txt", tmp_path / "b.txt"]
+        output = "out:file:{{in.in.split('/')[-1]}}.out"
+        script = "cat {{in.in}} > {{out.out}}"
+
+    (tmp_path / "a.txt").write_text("a")
+    (tmp_path / "b.txt").write_text("b")
+
+    def run_pipeline():
+        pipeline = Pipen(
+            low_memory=True,
+            plugins=[LowMemoryPlugin()],
+            workdir=tmp_path / ".pipen",
+            outdir=tmp_path / "outdir",
+        )
+        assert pipeline.set_starts(LowMemoryProc).run()
+        return pipeline
+
+    pipeline = run_pipeline()
+    outdir = pipeline.outdir / "LowMemoryProc"
+    assert sorted(submitted) == [
+        (False, False, str(tmp_path / "a.txt"), str(outdir / "0" / "a.txt.out")),
+        (False, False, str(tmp_path / "b.txt"), str(outdir / "1" / "b.txt.out")),
+    ]
+    assert (outdir / "0" / "a.txt.out").read_text() == "a"
+
+    # the signatures are recorded, so the jobs are cached
+    submitted.clear()
+    run_pipeline()
+    assert submitted == []
+
+
+@pytest.mark.forked
+def test_check_cached_hooks_in_running_loop(tmp_path):
+    import asyncio
+    import threading
+
+    called = []
+
+    class ThreadPlugin:
+        # called before the core plugin, which handles the local paths
+        priority = -2000
+
+        @plugin.impl
+        def get_mtime(job, path, dirsig):
+            called.append(threading.current_thread())
+            return None
+
+        @plugin.impl
+        async def output_exists(job, path, is_dir):
+            called.append(asyncio.get_running_loop())
+            return None
+
+    class ThreadProc(Proc):
+        input = "in:file"
+        input_data = [tmp_path / f"{i}.txt" for i in range(8)]
+        output = "out:file:{{in.in.split('/')[-1]}}.out"
+        script = "cat {{in.in}} > {{out.out}}"
+
+    for i in range(8):
+        (tmp_path / f"{i}.txt").write_text(str(i))
+
+    # registered for the whole (forked) process, and sorted again by
+    # priority, as the plugins registered later are sorted after the core
+    # plugin
+    plugin.register(ThreadPlugin)
+    plugin.hooks._registry_sorted = False
+
+    def new_pipeline():
+        return Pipen(workdir=tmp_path / ".pipen", outdir=tmp_path / "outdir")
+
+    assert new_pipeline().set_starts(ThreadProc).run()
+
+    # the caches are checked with the hooks called in the running loop
+    called.clear()
+    assert new_pipeline().set_starts(ThreadProc).run()
+    assert called
+    loops = [
+        item for item in called if isinstance(item, asyncio.AbstractEventLoop)
+    ]
+    threads = [item for item in called if isinstance(item, threading.Thread)]
+    assert len(loops) == 8 and len(set(map(id, loops))) == 1
+    assert set(threads) == {threading.main_thread()}
+
+    called.clear()
+    plan = new_pipeline().set_starts(ThreadProc).plan()
+    assert plan["ThreadProc"] == {i: None for i in range(8)}
+    assert called
+    assert set(
+        item for item in called if isinstance(item, threading.Thread)
+    ) == {threading.main_thread()}
+
+
+@pytest.mark.forked
+def test_signature_store_sqlite(caplog, tmp_path, infile):
+    class SqliteSignatureProc(Proc):
+        input = "in:file"
+        input_data = [infile] * 3
+        output = "out:file:{{job.index}}.txt"
+        script = "cat {{in.in}} > {{out.out}}"
+
+    def run_pipeline(proc=SqliteSignatureProc, signature_store="sqlite"):
+        return Pipen(
+            name="pipeline",
+            loglevel="debug",
+            signature_store=signature_store,
+            workdir=tmp_path / ".pipen",
+            outdir=tmp_path / "outdir",
+        ).set_starts(proc).run()
+
+    assert run_pipeline()
+    workdir = tmp_path / ".pipen" / "pipeline" / "SqliteSignatureProc"
+    assert (workdir / "proc.signatures.db").is_file()
+    assert not (workdir / "0" / "job.signature.toml").exists()
+
+    caplog.clear()
+    assert run_pipeline()
+    assert "Cached jobs: [0-2]" in caplog.text
+
+    caplog.clear()
+    os.utime(infile, (infile.stat().st_mtime + 10,) * 2)
+    assert run_pipeline()
+    assert "Not cached (Input file is newer: in)" in caplog.text
+
+    proc = Proc.from_proc(SqliteSignatureProc, name="InvalidSignatureProc")
+    with pytest.raises(ConfigurationError, match="signature_store"):
+        run_pipeline(proc, "json")
+
+
 @pytest.mark.forked
 def test_check_cached_cache_false(caplog, pipen):
     proc = Proc.from_proc(SimpleProc, cache=False)
@@ -201,6 +437,95 @@ def test_check_cached_infile_newer(caplog, pipen, infile):
     assert "Not cached (Input file is newer:" in caplog.text
 
 
+@pytest.mark.forked
+def test_check_cached_content(caplog, pipen, infile):
+    proc = Proc.from_proc(FileInputProc, input_data=[infile], cache="content")
+    pipen.set_starts(proc).run()
+    signature = (proc.workdir / "0" / "job.signature.toml").read_text()
+    assert str(infile) in signature
+
+    # touched, but the content is the same
+    caplog.clear()
+    os.utime(infile, (infile.stat().st_mtime + 10,) * 2)
+    pipen.set_starts(proc).run()
+    assert "Cached jobs: [0]" in caplog.text
+
+    caplog.clear()
+    infile.write_text("in2")
+    os.utime(infile, (infile.stat().st_mtime + 20,) * 2)
+    pipen.set_starts(proc).run()
+    assert "Not cached (Input file is newer:" in caplog.text
+
+    caplog.clear()
+    outfile = pipen.outdir / proc.name / "infile"
+    outfile.write_text("changed")
+    os.utime(outfile, (outfile.stat().st_mtime + 30,) * 2)
+    pipen.set_starts(proc).run()
+    assert "Not cached (Output file is changed: out)" in caplog.text
+    assert outfile.read_text() == "in2"
+
+
+@pytest.mark.forked
+def test_check_cached_dirsig_manifest(caplog, pipen, tmp_path):
+    indir = tmp_path / "indir"
+    indir.mkdir()
+    (indir / "a.txt").write_text("a")
+
+    class DirInputProc(Proc):
+        input = "in:dir"
+        input_data = [indir]
+        output = "out:file:out.txt"
+        script = "ls {{in.in}} > {{out.out}}"
+        dirsig_manifest = True
+
+    pipen.set_starts(DirInputProc).run()
+    signature = (DirInputProc().workdir / "0" / "job.signature.toml").read_text()
+    assert "manifests" in signature
+
+    caplog.clear()
+    pipen.set_starts(DirInputProc).run()
+    assert "Cached jobs: [0]" in caplog.text
+
+    # entries added to the directory
+    caplog.clear()
+    (indir / "b.txt").write_text("b")
+    os.utime(indir / "b.txt", (time.time() + 10,) * 2)
+    pipen.set_starts(DirInputProc).run()
+    assert "Not cached (Input file is newer: in)" in caplog.text
+
+
+def test_file_digests(tmp_path, monkeypatch):
+    from pipen import _file_digests
+    from pipen._file_digests import FileDigests
+
+    monkeypatch.setattr(_file_digests, "FILE_DIGESTS_CHUNK_SIZE", 4)
+    small = tmp_path / "small.txt"
+    small.write_text("abc")
+    large = tmp_path / "large.txt"
+    large.write_text("abcdefghij")
+    digests = FileDigests(tmp_path / "digests.toml")
+    digest = digests.digest(large, 1)
+    assert digest != digests.digest(small, 1)
+    dir_digest = digests.digest(tmp_path, 1)
+    assert dir_digest != digests.digest(tmp_path, 0)
+    digests.save()
+
+    hashed = []
+    hash_file = _file_digests._hash_file
+    monkeypatch.setattr(
+        _file_digests,
+        "_hash_file",
+        lambda path, size: hashed.append(path) or hash_file(path, size),
+    )
+    digests = FileDigests(tmp_path / "digests.toml")
+    # not hashed again
+    assert digests.digest(large, 1) == digest
+    assert hashed == []
+    large.write_text("abcdefghi")
+    assert digests.digest(large, 1) != digest
+    assert hashed == [large]
+
+
 @pytest.mark.forked
 def test_check_cached_infiles_newer(caplog, pipen, infile):
     proc_infile_newer = Proc.from_proc(
@@ -244,6 +569,30 @@ def test_metaout_was_dir(pipen):
     metaout.unlink()
 
 
+@pytest.mark.forked
+def test_outdirs_made_for_all_jobs(pipen):
+    proc = Proc.from_proc(NormalProc, input_data=[1, 2, 3])
+    pipen.set_starts(proc).run()
+    outdirs = [pipen.outdir / proc.name / str(i) for i in range(3)]
+    metaouts = [proc.workdir / str(i) / "output" for i in range(3)]
+    for outdir, metaout in zip(outdirs, metaouts):
+        assert outdir.is_dir()
+        assert metaout.readlink() == outdir
+
+    inode = os.lstat(metaouts[0]).st_ino
+    metaouts[1].unlink()
+    metaouts[1].symlink_to(outdirs[0])
+    metaouts[2].unlink()
+    metaouts[2].mkdir()
+    outdirs[2].rmdir()
+    pipen.set_starts(proc).run()
+    # unchanged links are kept
+    assert os.lstat(metaouts[0]).st_ino == inode
+    for outdir, metaout in zip(outdirs, metaouts):
+        assert outdir.is_dir()
+        assert metaout.readlink() == outdir
+
+
 @pytest.mark.forked
 def test_script_failed_to_render(pipen):
     proc = Proc.from_proc(ScriptRenderErrorProc, input_data=[1])
@@ -306,3 +655,48 @@ def test_wrong_input_type_for_files(pipen):
     proc = Proc.from_proc(FileInputsProc, input_data=[1])
     with pytest.raises(ProcInputTypeError):
         pipen.set_starts(proc).run()
+
+
+@pytest.mark.forked
+def test_prepare_overridden(pipen, monkeypatch):
+    from pipen.job import Job
+
+    prepared = []
+    original = Job.prepare
+
+    async def prepare(self, proc, dry_run=False):
+        prepared.append(self.index)
+        await original(self, proc, dry_run)
+
+    monkeypatch.setattr(Job, "prepare", prepare)
+    proc = Proc.from_proc(NormalProc, input_data=[1, 2])
+    assert pipen.set_starts(proc).run()
+    assert sorted(prepared) == [0, 1]
+
+
+@pytest.mark.forked
+def test_input_records_not_modified(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    Path("infile").write_text("in")
+    done = {}
+
+    class RecordsPlugin:
+        @plugin.impl
+        async def on_proc_done(proc, succeeded):
+            done["records"] = proc._job_store.records
+            done["inputs"] = [dict(job.input) for job in proc.jobs]
+            # nothing is kept in the jobs themselves
+            done["attrs"] = [vars(job) for job in proc.jobs]
+
+    proc = Proc.from_proc(FileInputProc, input_data=["infile"])
+    pipeline = Pipen(
+        name="records_pipeline",
+        plugins=[RecordsPlugin()],
+        workdir=tmp_path / ".pipen",
+        outdir=tmp_path / "outdir",
+    )
+    assert pipeline.set_starts(proc).run()
+    # the paths are normalized in the input of the job only
+    assert done["records"] == {"in": ["infile"]}
+    assert done["inputs"] == [{"in": str(tmp_path / "infile")}]
+    assert done["attrs"] == [{}]
@@ -1,15 +1,21 @@
+import os
+from pathlib import Path
 import pytest
-from pipen import Proc, Pipen, run
+from pipen import Proc, Pipen, plugin, run
 from pipen.exceptions import (
     ProcDependencyError,
     PipenSetDataError,
 )
-from pipen.proc import PipenOrProcNameError
+from pipen.proc import PipenOrProcNameError, ProcMeta
 
 from .helpers import (  # noqa: F401
     ErrorProc,
+    FileInputProc,
+    infile,
+    In2Out1Proc,
     NormalProc,
     SimpleProc,
+    SleepingProc,
     RelPathScriptProc,
     pipen,
     SimplePlugin,
@@ -101,6 +107,232 @@ def test_no_next_procs(pipen):
         pipen.set_starts(proc1).run()
 
 
+@pytest.mark.forked
+def test_proc_relationships_order(pipen):
+    """
+    proc1 --> proc3 --> proc5
+          \\-> proc2 (order=1)
+          \\-> proc4 --/
+    """
+    proc1 = Proc.from_proc(NormalProc, input_data=[1])
+    proc2 = Proc.from_proc(NormalProc, requires=proc1, order=1)
+    proc3 = Proc.from_proc(NormalProc, requires=proc1)
+    proc4 = Proc.from_proc(NormalProc, requires=proc1)
+    proc5 = Proc.from_proc(In2Out1Proc, requires=[proc3, proc4])
+
+    pipen.set_starts(proc1).build_proc_relationships()
+    assert pipen.procs == [proc1, proc3, proc4, proc5, proc2]
+
+
+@pytest.mark.forked
+def test_proc_relationships_large_pipeline(pipen):
+    procs = [Proc.from_proc(NormalProc, "large_proc0", input_data=[1])]
+    for i in range(1, 5000):
+        procs.append(
+            Proc.from_proc(NormalProc, f"large_proc{i}", requires=procs[-1])
+        )
+
+    pipen.set_starts(procs[0]).build_proc_relationships()
+    assert pipen.procs == procs
+
+
+@pytest.mark.forked
+def test_run_targets(pipen):
+    """
+    proc1 --> proc2 --> proc4
+          \\-> proc3
+    """
+    proc1 = Proc.from_proc(NormalProc, input_data=[1])
+    proc2 = Proc.from_proc(NormalProc, requires=proc1)
+    proc3 = Proc.from_proc(NormalProc, requires=proc1)
+    proc4 = Proc.from_proc(NormalProc, requires=proc2)
+
+    assert pipen.set_starts(proc1).run(targets=[proc2])
+    assert pipen.procs == [proc1, proc2]
+    assert proc3 not in ProcMeta._INSTANCES
+    assert proc4 not in ProcMeta._INSTANCES
+
+    with pytest.raises(ProcDependencyError, match="not in the pipeline"):
+        pipen.run(targets=["nosuch"])
+
+    proc5 = Proc.from_proc(NormalProc, input_data=[1])
+    with pytest.raises(ProcDependencyError, match="not in the pipeline"):
+        pipen.run(targets=[proc5])
+
+    # all processes are run again without targets
+    assert pipen.run()
+    assert pipen.procs == [proc1, proc2, proc3, proc4]
+    assert list(pipen.plan(targets=[proc3])) == ["proc1", "proc3"]
+    assert list(pipen.plan()) == ["proc1", "proc2", "proc3", "proc4"]
+
+
+@pytest.mark.forked
+def test_resume(tmp_path):
+    started = []
+
+    class StartedPlugin:
+        @plugin.impl
+        async def on_proc_start(proc):
+            started.append(proc.name)
+
+    def run_pipeline(input_data):
+        proc1 = Proc.from_proc(NormalProc, "proc1", input_data=input_data)
+        proc2 = Proc.from_proc(NormalProc, "proc2", requires=proc1)
+        pipeline = Pipen(
+            name="resume_pipeline",
+            resume=True,
+            plugins=[StartedPlugin()],
+            workdir=tmp_path / ".pipen",
+            outdir=tmp_path / "outdir",
+        )
+        assert pipeline.set_starts(proc1).run()
+        return proc2.output_data
+
+    output_data = run_pipeline([1, 2])
+    assert started == ["proc1", "proc2"]
+    assert (tmp_path / ".pipen" / "resume_pipeline" / "run.state.toml").is_file()
+
+    started.clear()
+    assert run_pipeline([1, 2]).equals(output_data)
+    assert started == []
+
+    # input changed
+    started.clear()
+    assert run_pipeline([1, 3]).output.tolist() == ["1", "3"]
+    assert started == ["proc1", "proc2"]
+
+
+@pytest.mark.forked
+def test_resume_unchanged_pipeline(tmp_path, infile, caplog):
+    proc1 = Proc.from_proc(FileInputProc, input_data=[str(infile)])
+    proc2 = Proc.from_proc(FileInputProc, requires=proc1)
+
+    def run_pipeline():
+        pipeline = Pipen(
+            name="unchanged_pipeline",
+            resume=True,
+            workdir=tmp_path / ".pipen",
+            outdir=tmp_path / "outdir",
+        )
+        caplog.clear()
+        assert pipeline.set_starts(proc1).run()
+        return pipeline
+
+    run_pipeline()
+    output_data = proc2.output_data
+    assert "Pipeline is unchanged" not in caplog.text
+
+    proc2.output_data = None
+    run_pipeline()
+    assert "Pipeline is unchanged" in caplog.text
+    assert proc2.output_data.equals(output_data)
+
+    # input file touched
+    os.utime(infile, (infile.stat().st_mtime + 10,) * 2)
+    run_pipeline()
+    assert "Pipeline is unchanged" not in caplog.text
+    assert "Resumed from the previous run" not in caplog.text
+
+    # output file of the end process removed
+    Path(output_data.out[0]).unlink()
+    run_pipeline()
+    assert "Pipeline is unchanged" not in caplog.text
+    assert "Resumed from the previous run" in caplog.text
+
+    # output file of the start process modified
+    outfile = Path(proc1.output_data.out[0])
+    os.utime(outfile, (outfile.stat().st_mtime + 10,) * 2)
+    run_pipeline()
+    assert "Resumed from the previous run" not in caplog.text
+
+
+@pytest.mark.forked
+def test_no_resume_no_run_state(tmp_path):
+    proc1 = Proc.from_proc(NormalProc, "proc1", input_data=[1])
+    pipeline = Pipen(
+        name="no_resume_pipeline",
+        workdir=tmp_path / ".pipen",
+        outdir=tmp_path / "outdir",
+    )
+    assert pipeline.set_starts(proc1).run()
+    assert not (
+        tmp_path / ".pipen" / "no_resume_pipeline" / "run.state.toml"
+    ).exists()
+
+
+def test_fingerprint_unstable_objects():
+    from pipen._run_state import _hash_parts
+
+    assert _hash_parts({"a": Path("/x"), "b": {2, 1}}) == _hash_parts(
+        {"a": "/x", "b": [1, 2]}
+    )
+    assert _hash_parts({"a": Pipen}) is not None
+    assert _hash_parts({"a": object()}) is None
+    assert _hash_parts({"a": lambda: None}) is None
+
+
+@pytest.mark.forked
+def test_plan(pipen):
+    proc1 = Proc.from_proc(NormalProc, input_data=[1, 2])
+    Proc.from_proc(NormalProc, "proc2", requires=proc1)
+
+    pipen.set_starts(proc1)
+    plans = pipen.plan()
+    assert plans == {
+        "proc1": {0: "job.rc != 0", 1: "job.rc != 0"},
+        "proc2": {0: "job.rc != 0", 1: "job.rc != 0"},
+    }
+    # scripts are not written
+    assert not (proc1.workdir / "0" / "job.script").exists()
+
+    assert pipen.run()
+    plans = pipen.plan()
+    assert plans == {"proc1": {0: None, 1: None}, "proc2": {0: None, 1: None}}
+
+    # a changed job makes the corresponding job of next process run
+    (proc1.workdir / "1" / "job.rc").write_text("1")
+    plans = pipen.plan()
+    assert plans == {
+        "proc1": {0: None, 1: "job.rc != 0"},
+        "proc2": {0: None, 1: "required job to run: proc1"},
+    }
+
+
+@pytest.mark.forked
+def test_plan_dry_run(pipen_with_plugin):
+    class DProc1(Proc):
+        input = "a"
+        input_data = [1, 2]
+        output = "out:var:{{in.a}}"
+        script = "echo {{in.a}}"
+
+    class DProc2(Proc):
+        input = "a"
+        input_data = []
+        output = "out:var:{{in.a}}"
+        script = "echo {{in.a}}"
+
+    class DProc3(Proc):
+        requires = [DProc1, DProc2]
+        input = "a, b"
+        output = "outdir:dir:{{in.a}}.dir"
+        script = "touch {{out.outdir}}/file"
+
+    pipen_with_plugin.set_starts(DProc1, DProc2)
+    plans = pipen_with_plugin.plan()
+    assert plans["DProc3"] == {0: "job.rc != 0", 1: "job.rc != 0"}
+    # the output directories are not created
+    assert not Path(pipen_with_plugin.outdir).exists()
+    # the plugins of the pipeline are disabled after planning
+    assert "simpleplugin" not in plugin.get_enabled_plugin_names()
+
+    assert pipen_with_plugin.run()
+    plans = pipen_with_plugin.plan()
+    # the required process planned no jobs
+    assert plans["DProc2"] == {}
+    assert plans["DProc3"] == {0: None, 1: None}
+
+
 @pytest.mark.forked
 def test_plugins_are_pipeline_dependent(pipen, pipen_with_plugin, caplog):
     simproc = Proc.from_proc(SimpleProc)
@@ -220,3 +452,246 @@ def test_run2():
         script = "touch {{out.c}}"
 
     assert run("MyPipe", RProc1)
+
+
+@pytest.mark.forked
+def test_proc_concurrency(tmp_path):
+    """
+    proc1 --> proc2
+          \\-> proc3
+    """
+    events = []
+
+    class EventPlugin:
+        @plugin.impl
+        async def on_proc_start(proc):
+            events.append(("start", proc.name))
+
+        @plugin.impl
+        async def on_proc_done(proc, succeeded):
+            events.append(("done", proc.name))
+
+    proc1 = Proc.from_proc(NormalProc, input_data=[1])
+    Proc.from_proc(SimpleProc, "proc2", requires=proc1)
+    Proc.from_proc(SimpleProc, "proc3", requires=proc1)
+
+    pipeline = Pipen(
+        name="concurrent_pipeline",
+        proc_concurrency=2,
+        plugins=[EventPlugin()],
+        workdir=tmp_path / ".pipen",
+        outdir=tmp_path / "outdir",
+    )
+    assert pipeline.set_starts(proc1).run()
+    assert events[:2] == [("start", "proc1"), ("done", "proc1")]
+    # proc2 and proc3 are running at the same time
+    assert set(events[2:4]) == {("start", "proc2"), ("start", "proc3")}
+    assert set(events[4:]) == {("done", "proc2"), ("done", "proc3")}
+
+
+@pytest.mark.forked
+def test_prioritize(tmp_path):
+    submitted = []
+
+    class SubmittedPlugin:
+        @plugin.impl
+        async def on_job_submitted(job):
+            submitted.append(job.index)
+
+    proc = Proc.from_proc(
+        SleepingProc,
+        input_data=[0, 1],
+        forks=1,
+        cache=False,
+    )
+
+    def run_pipeline():
+        pipeline = Pipen(
+            name="prioritize_pipeline",
+            prioritize=True,
+            plugins=[SubmittedPlugin()],
+            workdir=tmp_path / ".pipen",
+            outdir=tmp_path / "outdir",
+        )
+        assert pipeline.set_starts(proc).run()
+        return pipeline
+
+    # no runtimes recorded, jobs submitted in order
+    pipeline = run_pipeline()
+    assert submitted == [0, 1]
+    assert pipeline._proc_priorities()[proc] > 0
+
+    # the longer job is submitted first
+    submitted.clear()
+    run_pipeline()
+    assert submitted == [1, 0]
+
+    # runtimes not recorded without prioritize
+    proc2 = Proc.from_proc(SleepingProc, input_data=[0], cache=False)
+    pipeline = Pipen(
+        name="no_prioritize_pipeline",
+        workdir=tmp_path / ".pipen",
+        outdir=tmp_path / "outdir",
+    )
+    assert pipeline.set_starts(proc2).run()
+    assert not (proc2.workdir / "proc.runtimes.toml").exists()
+
+
+@pytest.mark.forked
+def test_proc_concurrency_failed_proc(tmp_path):
+    proc1 = Proc.from_proc(NormalProc, input_data=[1])
+    proc2 = Proc.from_proc(ErrorProc, requires=proc1)
+    proc3 = Proc.from_proc(SimpleProc, requires=proc1)
+    proc4 = Proc.from_proc(NormalProc, requires=proc2)
+
+    pipeline = Pipen(
+        name="concurrent_pipeline_failed",
+        proc_concurrency=4,
+        workdir=tmp_path / ".pipen",
+        outdir=tmp_path / "outdir",
+    )
+    assert not pipeline.set_starts(proc1).run()
+    assert proc3.output_data is not None
+    assert proc4.output_data is None
+
+
+@pytest.mark.forked
+def test_streaming(tmp_path):
+    events = []
+
+    class EventPlugin:
+        @plugin.impl
+        async def on_job_submitted(job):
+            events.append(("submitted", job.proc.name, job.index))
+
+        @plugin.impl
+        async def on_job_succeeded(job):
+            events.append(("succeeded", job.proc.name, job.index))
+
+    class SProc1(Proc):
+        input = "time"
+        input_data = [0, 3]
+        output = "out:var:{{in.time}}"
+        script = "sleep {{in.time}}"
+
+    class SProc2(Proc):
+        requires = SProc1
+        input = "time"
+        output = "out:var:{{in.time}}"
+        script = "echo {{in.time}}"
+
+    pipeline = Pipen(
+        name="streaming_pipeline",
+        proc_concurrency=2,
+        streaming=True,
+        forks=2,
+        plugins=[EventPlugin()],
+        workdir=tmp_path / ".pipen",
+        outdir=tmp_path / "outdir",
+    )
+    assert pipeline.set_starts(SProc1).run()
+    # job 0 of SProc2 is submitted before job 1 of SProc1 is done
+    assert events.index(("submitted", "SProc2", 0)) < events.index(
+        ("succeeded", "SProc1", 1)
+    )
+    assert ("succeeded", "SProc2", 1) in events
+    assert SProc2.output_data.equals(SProc1.output_data)
+
+
+@pytest.mark.forked
+def test_streaming_chain(tmp_path):
+    class SCProc1(Proc):
+        input = "time"
+        input_data = [0, 5]
+        output = "out:var:{{in.time}}"
+        script = (
+            "sleep {{in.time}}; "
+            f"if [ -e {tmp_path}/c0 ]; then touch {tmp_path}/overlapped; fi"
+        )
+
+    class SCProc2(Proc):
+        requires = SCProc1
+        input = "time"
+        output = "out:var:{{in.time}}"
+        script = "echo {{in.time}}"
+
+    class SCProc3(Proc):
+        requires = SCProc2
+        input = "time"
+        output = "out:var:{{in.time}}"
+        script = f"touch {tmp_path}/c{{{{in.time}}}}"
+
+    pipeline = Pipen(
+        name="streaming_pipeline_chain",
+        proc_concurrency=3,
+        streaming=True,
+        forks=2,
+        workdir=tmp_path / ".pipen",
+        outdir=tmp_path / "outdir",
+    )
+    assert pipeline.set_starts(SCProc1).run()
+    # job 0 of SCProc3 is done before job 1 of SCProc1 is done
+    assert (tmp_path / "overlapped").is_file()
+    assert (tmp_path / "c5").is_file()
+
+
+@pytest.mark.forked
+def test_streaming_retry(tmp_path):
+    trials = tmp_path / "trials"
+    trials.mkdir()
+
+    class SRProc1(Proc):
+        input = "time"
+        input_data = [0, 2]
+        output = "out:var:{{in.time}}"
+        script = "sleep {{in.time}}"
+
+    class SRProc2(Proc):
+        requires = SRProc1
+        input = "time"
+        output = "out:var:{{in.time}}"
+        script = f"echo 1 >> {trials}/{{{{in.time}}}}; exit 1"
+        error_strategy = "retry"
+        num_retries = 2
+
+    pipeline = Pipen(
+        name="streaming_pipeline_retry",
+        proc_concurrency=2,
+        streaming=True,
+        forks=2,
+        workdir=tmp_path / ".pipen",
+        outdir=tmp_path / "outdir",
+    )
+    assert not pipeline.set_starts(SRProc1).run()
+    # each job is retried exactly num_retries times
+    assert (trials / "0").read_text() == "1\n" * 3
+    assert (trials / "2").read_text() == "1\n" * 3
+
+
+@pytest.mark.forked
+def test_streaming_failed_job(tmp_path):
+    class SFProc1(Proc):
+        input = "code"
+        input_data = [0, 1]
+        output = "out:var:{{in.code}}"
+        script = "exit {{in.code}}"
+
+    class SFProc2(Proc):
+        requires = SFProc1
+        input = "code"
+        output = "out:var:{{in.code}}"
+        script = "echo {{in.code}}"
+
+    pipeline = Pipen(
+        name="streaming_pipeline_failed",
+        proc_concurrency=2,
+        streaming=True,
+        workdir=tmp_path / ".pipen",
+        outdir=tmp_path / "outdir",
+    )
+    assert not pipeline.set_starts(SFProc1).run()
+    # job 1 of SFProc2 is never submitted
+    assert (tmp_path / ".pipen" / pipeline.name / "SFProc2" / "0" / "job.rc").is_file()
+    assert not (
+        tmp_path / ".pipen" / pipeline.name / "SFProc2" / "1" / "job.rc"
+    ).is_file()
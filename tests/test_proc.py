@@ -2,7 +2,7 @@ import os
 import pytest
 
 import pandas
-from pipen import Proc
+from pipen import Pipen, Proc
 from pipen.exceptions import (
     ProcInputKeyError,
     ProcInputTypeError,
@@ -152,6 +152,96 @@ def test_cached_run(caplog, pipen):
     assert caplog.text.count("Cached jobs:") == 1
 
 
+@pytest.mark.forked
+def test_check_caches_concurrently(caplog, pipen):
+    class ConcurrentCachedProc(Proc):
+        input = "a"
+        input_data = list(range(20))
+        output = "out:file:{{in.a}}.txt"
+        script = "echo {{in.a}} > {{out.out}}"
+
+    assert pipen.set_start(ConcurrentCachedProc).run()
+    outdir = pipen.outdir / "ConcurrentCachedProc"
+    (outdir / "3" / "3.txt").unlink()
+    (outdir / "11" / "11.txt").unlink()
+
+    caplog.clear()
+    assert pipen.set_start(ConcurrentCachedProc).run()
+    assert "Cached jobs: [0-2, 4-10, 12-19]" in caplog.text
+    assert "[03/19] Not cached (Output file removed: out)" in caplog.text
+    assert (outdir / "3" / "3.txt").read_text() == "3\n"
+    assert (outdir / "11" / "11.txt").read_text() == "11\n"
+
+
+@pytest.mark.forked
+def test_init_jobs(pipen):
+    proc = Proc.from_proc(
+        NormalProc,
+        input_data=list(range(20)),
+        submission_batch=3,
+    )
+    ret = pipen.set_start(proc).run()
+    assert ret
+    assert proc.output_data.output.tolist() == [str(i) for i in range(20)]
+    for i in range(20):
+        script = pipen.workdir / proc.name / str(i) / "job.script"
+        assert script.read_text() == f"echo {i}"
+
+
+@pytest.mark.forked
+def test_render_scripts_in_workers(tmp_path):
+    class RenderInWorkersProc(Proc):
+        input = "input:var"
+        input_data = list(range(10))
+        envs = {"x": "a"}
+        script = "echo {{in.input}} {{proc.name}} {{envs.x}} {{job.index}}"
+
+    pipeline = Pipen(
+        render_workers=2,
+        workdir=tmp_path / ".pipen",
+        outdir=tmp_path / "outdir",
+    ).set_start(RenderInWorkersProc)
+    assert pipeline.run()
+    for i in range(10):
+        script = pipeline.workdir / "RenderInWorkersProc" / str(i) / "job.script"
+        assert script.read_text() == f"echo {i} RenderInWorkersProc a {i}"
+
+
+@pytest.mark.forked
+@pytest.mark.parametrize("bundle_forks", [1, 2])
+def test_bundle_jobs(tmp_path, bundle_forks):
+    class BundleProc(Proc):
+        input = "input:var"
+        input_data = list(range(7))
+        output = "outfile:file:{{in.input}}.txt"
+        script = (
+            "[[ {{in.input}} -ne 4 ]] || exit 1; "
+            "echo {{in.input}} > {{out.outfile}}"
+        )
+        bundle_size = 3
+
+    pipeline = Pipen(
+        bundle_forks=bundle_forks,
+        workdir=tmp_path / ".pipen",
+        outdir=tmp_path / "outdir",
+    ).set_start(BundleProc)
+    assert not pipeline.run()
+
+    workdir = pipeline.workdir / "BundleProc"
+    for i in range(7):
+        # Only the first job of each bundle is submitted
+        assert (workdir / str(i) / "job.bundle.local").is_file() == (
+            i in (0, 3)
+        )
+        # But each job has its own rc file
+        assert (workdir / str(i) / "job.rc").read_text().strip() == (
+            "1" if i == 4 else "0"
+        )
+        if i != 4:
+            outfile = tmp_path / "outdir" / "BundleProc" / str(i) / f"{i}.txt"
+            assert outfile.read_text() == f"{i}\n"
+
+
 def test_proc_is_singleton(pipen):
     pipen.workdir = ".pipen/"
     os.makedirs(pipen.workdir, exist_ok=True)
@@ -0,0 +1,101 @@
+import asyncio
+
+import pytest
+
+from pipen import Pipen, Proc
+from pipen.exceptions import ConfigurationError
+from pipen.resource import ResourcePool, parse_amount
+
+
+def test_parse_amount():
+    assert parse_amount(2) == 2.0
+    assert parse_amount(0.5) == 0.5
+    assert parse_amount("8") == 8.0
+    assert parse_amount("1K") == 1024.0
+    assert parse_amount("2g") == 2.0 * 1024**3
+    assert parse_amount("1.5 GB") == 1.5 * 1024**3
+    with pytest.raises(ConfigurationError):
+        parse_amount("abc")
+    with pytest.raises(ConfigurationError):
+        parse_amount("1X")
+
+
+def test_pool_costs():
+    pool = ResourcePool(resources={"cpu": 4, "mem": "8G"})
+    assert pool.costs({"cpu": 2, "mem": "1G", "gpu": 1}) == {
+        "cpu": 2.0,
+        "mem": 1024.0**3,
+    }
+    assert pool.costs(None) == {}
+    with pytest.raises(ConfigurationError, match="more than the capacity"):
+        pool.costs({"cpu": 8})
+
+    with pytest.raises(ConfigurationError):
+        ResourcePool(max_jobs=0)
+
+
+@pytest.mark.asyncio
+async def test_pool_max_jobs():
+    pool = ResourcePool(max_jobs=2)
+    await pool.acquire(1, {})
+    await pool.acquire(2, {})
+    waiting = asyncio.ensure_future(pool.acquire(3, {}))
+    await asyncio.sleep(0.1)
+    assert not waiting.done()
+
+    await pool.release(1)
+    await asyncio.wait_for(waiting, 1)
+    assert pool.n_jobs == 2
+
+    # releasing a holder that holds nothing
+    await pool.release(1)
+    assert pool.n_jobs == 2
+
+
+@pytest.mark.asyncio
+async def test_pool_resources():
+    pool = ResourcePool(resources={"cpu": 4})
+    await pool.acquire(1, {"cpu": 3.0})
+    waiting = asyncio.ensure_future(pool.acquire(2, {"cpu": 2.0}))
+    await pool.acquire(3, {"cpu": 1.0})
+    await asyncio.sleep(0.1)
+    assert not waiting.done()
+    assert pool.available == {"cpu": 0.0}
+
+    await pool.release(1)
+    await asyncio.wait_for(waiting, 1)
+    assert pool.available == {"cpu": 1.0}
+
+
+@pytest.mark.forked
+def test_max_jobs_across_procs(tmp_path):
+    class RPProc1(Proc):
+        input = "a"
+        input_data = [1, 2]
+        output = "out:file:{{in.a}}.txt"
+        script = """
+            start=$(date +%s%N)
+            sleep 1
+            echo "$start $(date +%s%N)" > {{out.out}}
+        """
+
+    class RPProc2(RPProc1):
+        input_data = [3, 4]
+
+    pipeline = Pipen(
+        name="resource_pipeline",
+        proc_concurrency=2,
+        forks=2,
+        max_jobs=1,
+        workdir=tmp_path / ".pipen",
+        outdir=tmp_path / "outdir",
+    )
+    assert pipeline.set_starts(RPProc1, RPProc2).run()
+
+    intervals = sorted(
+        tuple(map(int, outfile.read_text().split()))
+        for outfile in (tmp_path / "outdir").glob("*/*/*.txt")
+    )
+    assert len(intervals) == 4
+    for (_, end), (start, _) in zip(intervals, intervals[1:]):
+        assert end <= start
@@ -1,7 +1,10 @@
+import os
+
 import pytest
 
 from pipen.scheduler import (
     get_scheduler,
+    ArrayJob,
     LocalScheduler,
     SgeScheduler,
     SshScheduler,
@@ -38,3 +41,104 @@ def test_get_scheduler():
 
     with pytest.raises(NoSuchSchedulerError):
         get_scheduler("nosuchscheduler")
+
+
+FAKE_SBATCH = """#!/bin/bash
+echo "$1" >> {calls}
+range=$(sed -n 's/^#SBATCH --array=\\([0-9]*-[0-9]*\\).*/\\1/p' "$1")
+range=${{range:-0-0}}
+for i in $(seq ${{range%-*}} ${{range#*-}}); do
+    SLURM_ARRAY_TASK_ID=$i bash "$1" > /dev/null 2>&1 &
+done
+echo "Submitted batch job $$"
+"""
+
+FAKE_QSUB = """#!/bin/bash
+echo "$1" >> {calls}
+range=$(sed -n 's/^#\\$ -t \\([0-9]*-[0-9]*\\).*/\\1/p' "$1")
+range=${{range:-1-1}}
+for i in $(seq ${{range%-*}} ${{range#*-}}); do
+    SGE_TASK_ID=$i bash "$1" > /dev/null 2>&1 &
+done
+echo "Your job-array $$.$range:1 (\\"job\\") has been submitted"
+"""
+
+
+@pytest.mark.forked
+@pytest.mark.parametrize(
+    "scheduler,fake_submit,array_jobs,n_calls,task_jids",
+    [
+        (
+            "slurm",
+            {"sbatch": FAKE_SBATCH},
+            "proc",
+            1,
+            {0: "_0", 1: "_1", 4: "_4"},
+        ),
+        # the last job is submitted alone
+        ("sge", {"qsub": FAKE_QSUB}, "batch", 3, {0: ".1", 1: ".2", 4: ""}),
+    ],
+)
+def test_array_jobs(
+    tmp_path,
+    monkeypatch,
+    scheduler,
+    fake_submit,
+    array_jobs,
+    n_calls,
+    task_jids,
+):
+    from pipen import Pipen, Proc, plugin
+
+    jids = {}
+
+    class JidPlugin:
+        @plugin.impl
+        async def on_job_submitted(job):
+            jids[job.index] = str(job.jid)
+
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    calls = tmp_path / "calls.txt"
+    fakes = {"squeue": "exit 1", "scancel": "", "qstat": "exit 1", "qdel": ""}
+    for name, content in fakes.items():
+        (bindir / name).write_text(f"#!/bin/bash\n{content}\n")
+    for name, content in fake_submit.items():
+        (bindir / name).write_text(content.format(calls=calls))
+    for exe in bindir.iterdir():
+        exe.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{bindir}:{os.environ['PATH']}")
+
+    class ArrayProc(Proc):
+        input = "a"
+        input_data = list(range(5))
+        output = "outfile:file:{{in.a}}.txt"
+        script = "echo {{in.a}} > {{out.outfile}}"
+        submission_batch = 2
+
+    pipeline = Pipen(
+        scheduler=scheduler,
+        scheduler_opts={"array_jobs": array_jobs},
+        plugins=[JidPlugin],
+        workdir=tmp_path / ".pipen",
+        outdir=tmp_path / "outdir",
+    ).set_start(ArrayProc)
+    assert pipeline.run()
+
+    # each job gets the jid of its own task, including the first one
+    for index, suffix in task_jids.items():
+        jid = jids[index]
+        assert jid.isdigit() if not suffix else jid.endswith(suffix)
+
+    assert len(calls.read_text().splitlines()) == n_calls
+    for i in range(5):
+        outfile = tmp_path / "outdir" / "ArrayProc" / str(i) / f"{i}.txt"
+        assert outfile.read_text() == f"{i}\n"
+
+
+def test_array_job_abstract(tmp_path):
+    class NoArrayJob(ArrayJob):
+        ...
+
+    with pytest.raises(TypeError, match="abstract"):
+        NoArrayJob(0, "", tmp_path)
@@ -0,0 +1,268 @@
+import asyncio
+import json
+import os
+import signal
+
+import pytest
+
+from pipen import Proc
+from pipen.proc import ProcMeta
+from pipen.server import PipenServer, clone_procs
+from pipen.exceptions import ConfigurationError, ProcDependencyError
+
+
+async def _request(socket, method, path, payload=None):
+    reader, writer = await asyncio.open_unix_connection(str(socket))
+    body = b"" if payload is None else json.dumps(payload).encode()
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode()
+        + body
+    )
+    await writer.drain()
+    response = await reader.read()
+    writer.close()
+    head, _, content = response.partition(b"\r\n\r\n")
+    return int(head.split()[1]), json.loads(content)
+
+
+def test_clone_procs():
+    class P1(Proc):
+        """Process 1"""
+        input_data = [1]
+
+    class P2(Proc):
+        requires = P1
+
+    class P3(Proc):
+        requires = [P1, P2]
+
+    clones = clone_procs([P1])
+    assert set(clones) == {P1, P2, P3}
+    assert clones[P3].name == "P3"
+    assert clones[P3].requires == [clones[P1], clones[P2]]
+    assert clones[P1].nexts == [clones[P2], clones[P3]]
+    assert clones[P1].input_data == [1]
+    assert clones[P1].__doc__ == "Process 1"
+    # the original processes are not affected
+    assert P1.nexts == [P2, P3]
+    assert P3.requires == [P1, P2]
+
+    class P4(Proc):
+        requires = P1
+
+    P4.requires = [P4]
+    with pytest.raises(ProcDependencyError, match="Cyclic dependency"):
+        clone_procs([P1])
+
+
+@pytest.mark.forked
+def test_serve(tmp_path):
+    script = tmp_path / "pipeline.py"
+    script.write_text(
+        "from pipen import Proc\n"
+        "class P1(Proc):\n"
+        "    input = 'a'\n"
+        "    input_data = [1, 2]\n"
+        "    output = 'a:file:{{in.a}}.txt'\n"
+        "    script = 'sleep .5; echo {{in.a}} > {{out.a}}'\n"
+        "class P2(Proc):\n"
+        "    requires = P1\n"
+        "    input = 'a:file'\n"
+        "    output = \"a:file:{{in.a.split('/')[-1]}}\"\n"
+        "    script = 'cat {{in.a}} > {{out.a}}'\n"
+    )
+    socket = tmp_path / "pipen.sock"
+    config = {"workdir": str(tmp_path / ".pipen")}
+
+    async def main():
+        server = PipenServer(socket=socket)
+        await server.start()
+        try:
+            runs = []
+            for name in ("Run1", "Run2", "Run2"):
+                status, run = await _request(
+                    socket,
+                    "POST",
+                    "/runs",
+                    {
+                        "pipeline": f"{script}:P1",
+                        "name": name,
+                        "outdir": str(tmp_path / name),
+                        "config": config,
+                    },
+                )
+                assert status == 202
+                runs.append(run)
+
+            # The runs of Run1 and the first Run2 are running together
+            await asyncio.sleep(.3)
+            status, listed = await _request(socket, "GET", "/runs")
+            assert status == 200
+            assert [run["status"] for run in listed] == [
+                "running",
+                "running",
+                "queued",
+            ]
+
+            for run in runs:
+                await server.wait(run["id"])
+
+            status, run = await _request(socket, "GET", "/runs/3")
+            assert status == 200
+            assert run["status"] == "succeeded"
+
+            status, _ = await _request(socket, "GET", "/runs/4")
+            assert status == 404
+            status, out = await _request(
+                socket, "POST", "/runs", {"pipeline": "no.such:module"}
+            )
+            assert status == 400
+            assert "ModuleNotFoundError" in out["error"]
+        finally:
+            await server.close()
+
+    before = len(ProcMeta._INSTANCES)
+    asyncio.run(main())
+    assert len(ProcMeta._INSTANCES) == before
+    for name in ("Run1", "Run2"):
+        assert (tmp_path / name / "P2" / "0" / "1.txt").read_text() == "1\n"
+        assert (tmp_path / name / "P2" / "1" / "2.txt").read_text() == "2\n"
+
+
+@pytest.mark.forked
+def test_serve_stopped_by_signal(tmp_path):
+    script = tmp_path / "pipeline.py"
+    script.write_text(
+        "from pipen import Proc\n"
+        "class P1(Proc):\n"
+        "    input = 'a'\n"
+        "    input_data = [1]\n"
+        "    output = 'a:var:{{in.a}}'\n"
+        "    script = 'echo {{in.a}}'\n"
+    )
+    socket = tmp_path / "pipen.sock"
+
+    async def main():
+        server = PipenServer(socket=socket)
+        serving = asyncio.ensure_future(server.serve())
+        while server.server is None:
+            await asyncio.sleep(.1)
+
+        status, run = await _request(
+            socket,
+            "POST",
+            "/runs",
+            {
+                "pipeline": f"{script}:P1",
+                "outdir": str(tmp_path / "outdir"),
+                "config": {"workdir": str(tmp_path / ".pipen")},
+            },
+        )
+        assert status == 202
+        run = await server.wait(run["id"])
+        assert run["status"] == "succeeded"
+
+        # the processes of the run took over the signals
+        os.kill(os.getpid(), signal.SIGTERM)
+        await asyncio.wait_for(serving, 5)
+
+    asyncio.run(main())
+
+
+@pytest.mark.forked
+def test_serve_default_socket(tmp_path, monkeypatch):
+    monkeypatch.setenv("HOME", str(tmp_path))
+    socket = tmp_path / ".pipen" / "serve.sock"
+
+    async def main():
+        server = PipenServer()
+        await server.start()
+        try:
+            # only accessible by the user
+            assert socket.stat().st_mode & 0o777 == 0o600
+            status, runs = await _request(socket, "GET", "/runs")
+            assert status == 200
+            assert runs == []
+        finally:
+            await server.close()
+
+    asyncio.run(main())
+
+
+@pytest.mark.forked
+def test_serve_tcp_token():
+    with pytest.raises(ConfigurationError, match="token is required"):
+        PipenServer(host="127.0.0.1")
+
+    async def request(port, headers):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(
+            f"GET /runs HTTP/1.1\r\n{headers}Content-Length: 0\r\n\r\n".encode()
+        )
+        await writer.drain()
+        response = await reader.read()
+        writer.close()
+        return int(response.split()[1])
+
+    async def main():
+        server = PipenServer(host="127.0.0.1", port=0, token="secret")
+        await server.start()
+        try:
+            port = server.server.sockets[0].getsockname()[1]
+            assert await request(port, "") == 401
+            assert await request(port, "Authorization: Bearer wrong\r\n") == 401
+            assert await request(port, "Authorization: Bearer secret\r\n") == 200
+        finally:
+            await server.close()
+
+    asyncio.run(main())
+
+
+@pytest.mark.forked
+def test_close_kills_jobs(tmp_path, monkeypatch):
+    from pipen.scheduler import LocalScheduler
+
+    killed = []
+    kill_job = LocalScheduler.kill_job
+
+    async def record_kill_job(self, job):
+        killed.append(job.index)
+        await kill_job(self, job)
+
+    monkeypatch.setattr(LocalScheduler, "kill_job", record_kill_job)
+    script = tmp_path / "pipeline.py"
+    script.write_text(
+        "from pipen import Proc\n"
+        "class P1(Proc):\n"
+        "    input = 'a'\n"
+        "    input_data = [1]\n"
+        "    script = 'sleep 10'\n"
+    )
+    socket = tmp_path / "pipen.sock"
+    workdir = tmp_path / ".pipen"
+
+    async def main():
+        server = PipenServer(socket=socket)
+        await server.start()
+        status, run = await _request(
+            socket,
+            "POST",
+            "/runs",
+            {
+                "pipeline": f"{script}:P1",
+                "outdir": str(tmp_path / "outdir"),
+                "config": {"workdir": str(workdir)},
+            },
+        )
+        assert status == 202
+        while not list(workdir.glob("*/P1/0/job.jid")):
+            await asyncio.sleep(.1)
+        await asyncio.sleep(.5)
+
+        await asyncio.wait_for(server.close(), 10)
+        assert server.runs[run["id"]]["status"] in ("failed", "error")
+
+    asyncio.run(main())
+    # the job is killed rather than left running
+    assert killed == [0]
@@ -1,3 +1,4 @@
+import os
 import pytest
 import pipen
 from pathlib import Path
@@ -6,6 +7,7 @@ from pipen.utils import (
     desc_from_docstring,
     get_logger,
     get_mtime,
+    get_dir_mtime,
     get_shebang,
     ignore_firstline_dedent,
     strsplit,
@@ -15,6 +17,12 @@ from pipen.utils import (
     get_marked,
     _get_obj_from_spec,
     load_pipeline,
+    load_job_runtimes,
+    load_script_digests,
+    save_job_runtimes,
+    save_script_digests,
+    script_digest,
+    StatCache,
 )
 from pipen.proc import Proc
 from pipen.procgroup import ProcGroup
@@ -43,6 +51,43 @@ def test_get_mtime_dir():
     assert mtime > 0
 
 
+@pytest.mark.forked
+def test_get_dir_mtime(tmp_path):
+    indir = tmp_path / "indir"
+    subdir = indir / "sub"
+    subdir.mkdir(parents=True)
+    (indir / "a.txt").touch()
+    (subdir / "b.txt").touch()
+    os.utime(indir / "a.txt", (100, 100))
+    os.utime(subdir / "b.txt", (200, 200))
+    os.utime(subdir, (50, 50))
+    os.utime(indir, (50, 50))
+
+    mtime, manifest = get_dir_mtime(indir, 2)
+    assert mtime == 200 == get_mtime(indir, 2)
+    assert manifest["entries"] == 2
+    assert manifest["mtime"] == 100
+    assert manifest["dirs"]["sub"]["mtime"] == 200
+    assert get_dir_mtime(indir, 2, manifest) == (mtime, manifest)
+
+    # modified in place, not detected with the manifest
+    os.utime(indir / "a.txt", (300, 300))
+    assert get_dir_mtime(indir, 2, manifest)[0] == 200
+    assert get_dir_mtime(indir, 2)[0] == 300
+    # manifest from a different depth is not used
+    assert get_dir_mtime(indir, 1, manifest)[0] == 300
+    # walked again once the directory is touched
+    os.utime(indir, (60, 60))
+    assert get_dir_mtime(indir, 2, manifest)[0] == 300
+
+    # new files in a subdirectory are detected
+    (subdir / "c.txt").touch()
+    os.utime(subdir / "c.txt", (400, 400))
+    mtime, manifest2 = get_dir_mtime(indir, 2, manifest)
+    assert mtime == 400
+    assert manifest2["dirs"]["sub"]["entries"] == 2
+
+
 @pytest.mark.forked
 def test_desc_from_docstring():
     class Base:
@@ -119,6 +164,112 @@ def test_truncate_text():
     assert truncate_text("abcd", 2) == "a…"
 
 
+@pytest.mark.forked
+def test_job_runtimes(tmp_path):
+    assert load_job_runtimes(tmp_path) == {}
+    save_job_runtimes(tmp_path, {0: 1.5, 1: 2.0})
+    assert load_job_runtimes(tmp_path) == {0: 1.5, 1: 2.0}
+
+    (tmp_path / "proc.runtimes.toml").write_text("invalid toml")
+    assert load_job_runtimes(tmp_path) == {}
+
+
+@pytest.mark.forked
+def test_script_digests(tmp_path):
+    assert load_script_digests(tmp_path) == {}
+    digests = {0: script_digest("echo 1"), 1: script_digest("echo 2")}
+    assert digests[0] != digests[1]
+    save_script_digests(tmp_path, digests)
+    assert load_script_digests(tmp_path) == digests
+
+    (tmp_path / "proc.scripts.toml").write_text("invalid toml")
+    assert load_script_digests(tmp_path) == {}
+
+
+def test_resolve_path(tmp_path, monkeypatch):
+    cache = StatCache(100)
+    real = tmp_path / "real"
+    real.mkdir()
+    (tmp_path / "link").symlink_to(real)
+    (real / "a.txt").write_text("a")
+    (real / "b.txt").symlink_to(real / "a.txt")
+
+    assert cache.resolve_path(tmp_path / "link" / "a.txt") == real / "a.txt"
+    # the last component is always checked
+    assert cache.resolve_path(tmp_path / "link" / "b.txt") == real / "a.txt"
+    assert cache.resolve_path(tmp_path / "link" / "..") == tmp_path.resolve()
+    monkeypatch.chdir(tmp_path)
+    assert cache.resolve_path("link/a.txt") == real / "a.txt"
+
+    # parent directories are cached until invalidated
+    (tmp_path / "link").unlink()
+    (tmp_path / "link").symlink_to(tmp_path)
+    assert cache.resolve_path(tmp_path / "link" / "a.txt") == real / "a.txt"
+    cache.invalidate(tmp_path / "link")
+    assert cache.resolve_path(tmp_path / "link" / "a.txt") == tmp_path / "a.txt"
+
+
+def test_stat_cache(tmp_path):
+    cache = StatCache(3)
+    afile = tmp_path / "a.txt"
+    assert not cache.exists(afile)
+    afile.write_text("a")
+    # cached until invalidated
+    assert not cache.exists(afile)
+    cache.invalidate(afile)
+    assert cache.exists(afile)
+
+    mtime = cache.get_mtime(afile)
+    dir_mtime = cache.get_mtime(tmp_path, 1)
+    os.utime(afile, (mtime + 10,) * 2)
+    assert cache.get_mtime(afile) == mtime
+    assert cache.get_mtime(tmp_path, 1) == dir_mtime
+    # the parent directories are invalidated too
+    cache.invalidate(afile)
+    assert cache.get_mtime(afile) == mtime + 10
+    assert cache.get_mtime(tmp_path, 1) == mtime + 10
+
+    # the earliest cached path is dropped
+    assert not cache.islink(tmp_path / "b")
+    assert not cache.islink(tmp_path / "c")
+    assert list(cache._entries) == [
+        str(tmp_path),
+        str(tmp_path / "b"),
+        str(tmp_path / "c"),
+    ]
+    cache.clear()
+    assert cache._entries == {}
+    assert cache._children == {}
+
+
+def test_stat_cache_invalidate_subtree(tmp_path):
+    cache = StatCache(100)
+    subdir = tmp_path / "sub" / "dir"
+    subdir.mkdir(parents=True)
+    afile = subdir / "a.txt"
+    afile.write_text("a")
+    other = tmp_path / "other.txt"
+    other.write_text("o")
+
+    assert cache.exists(afile)
+    assert cache.exists(other)
+    # the paths under a directory cleared are invalidated
+    afile.unlink()
+    cache.invalidate(tmp_path / "sub")
+    assert not cache.exists(afile)
+    assert str(other) in cache._entries
+
+    # evicted paths are unlinked from their parent directories
+    cache = StatCache(1)
+    cache.exists(afile)
+    cache.exists(other)
+    assert list(cache._entries) == [str(other)]
+    assert str(tmp_path / "sub") not in cache._children
+    cache.invalidate(other)
+    assert cache._entries == {}
+    assert cache._children == {}
+
+
 @pytest.mark.forked
 def test_mark():
     @mark(a=1)